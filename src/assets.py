@@ -0,0 +1,96 @@
+import os
+import json
+from copy_dir import file_digest, place_file
+from files import write_json
+
+# hex digits of the content hash put into fingerprinted names
+FINGERPRINT_LENGTH = 10
+
+
+# images/tom.png -> images/tom.<hash>.png
+def fingerprinted_path(rel_path, digest):
+    root, ext = os.path.splitext(rel_path)
+    return f'{root}.{digest[:FINGERPRINT_LENGTH]}{ext}'
+
+
+def url_for_path(rel_path):
+    return '/' + rel_path.replace(os.sep, '/')
+
+
+class AssetPipeline:
+    # places a content hashed copy of every static file next to the original, so it can be cached forever,
+    # hashes are kept in state_path and only recomputed for files whose size/mtime changed
+    def __init__(self, static_dir, dest_dir, state_path=None, link_mode='copy'):
+        self.static_dir = static_dir
+        self.dest_dir = dest_dir
+        self.state_path = state_path
+        self.link_mode = link_mode
+        self.files = {}
+        self.hashed = 0
+        self.placed = 0
+        self.removed = 0
+        self.load()
+
+    def load(self):
+        if self.state_path is None or not os.path.exists(self.state_path):
+            return
+        with open(self.state_path, 'r') as f:
+            self.files = json.load(f).get('files', {})
+
+    def file_hash(self, rel_path, source_file):
+        stat = os.stat(source_file)
+        entry = self.files.get(rel_path)
+        if entry is not None and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+            return entry['hash']
+        self.hashed += 1
+        return file_digest(source_file)
+
+    def run(self):
+        seen = set()
+        if os.path.isdir(self.static_dir):
+            for dir_path, _, file_names in os.walk(self.static_dir):
+                for file in file_names:
+                    source_file = os.path.join(dir_path, file)
+                    rel_path = os.path.relpath(source_file, self.static_dir)
+                    seen.add(rel_path)
+                    self.place(rel_path, source_file)
+
+        for rel_path in list(self.files):
+            if rel_path not in seen:
+                self.remove_fingerprinted(self.files.pop(rel_path))
+        return self.mapping()
+
+    def place(self, rel_path, source_file):
+        digest = self.file_hash(rel_path, source_file)
+        fingerprinted = fingerprinted_path(rel_path, digest)
+        old_entry = self.files.get(rel_path)
+        if old_entry is not None and old_entry['fingerprinted'] != fingerprinted:
+            self.remove_fingerprinted(old_entry)
+
+        destination_file = os.path.join(self.dest_dir, fingerprinted)
+        if not os.path.exists(destination_file):
+            os.makedirs(os.path.dirname(destination_file), exist_ok=True)
+            place_file(source_file, destination_file, self.link_mode)
+            self.placed += 1
+        stat = os.stat(source_file)
+        self.files[rel_path] = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'hash': digest,
+                                'fingerprinted': fingerprinted}
+
+    def remove_fingerprinted(self, entry):
+        destination_file = os.path.join(self.dest_dir, entry['fingerprinted'])
+        if os.path.exists(destination_file):
+            os.remove(destination_file)
+            self.removed += 1
+
+    # {original url: fingerprinted url}, what templates rewrite href/src with
+    def mapping(self):
+        return {url_for_path(rel_path): url_for_path(entry['fingerprinted'])
+                for rel_path, entry in sorted(self.files.items())}
+
+    def save(self, manifest_path=None):
+        if manifest_path is not None:
+            write_json(manifest_path, self.mapping(), indent=2)
+        write_json(self.state_path, {'files': self.files})
+
+    def summary(self):
+        return f'Fingerprinted {len(self.files)} assets, hashed {self.hashed}, placed {self.placed}, removed {self.removed}'
@@ -0,0 +1,458 @@
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+import tracemalloc
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+import block
+import inline
+from nodes import TextNode, TextType, LeafNode, ParentNode
+from block import (markdown_to_html_node, block_to_block_type, BLOCK_RENDERERS, BlockType, markdown_to_blocks,
+    markdown_to_html)
+from gen import generate_pages_recursive, generate_pages_parallel, split_front_matter
+from pipeline import AsyncPipeline
+from document import Document
+from search import SearchIndex, page_terms
+from renderer import Renderer
+from cache import RenderCache
+from corpus import CorpusGenerator, DEFAULT_BLOCK_MIX
+from inline import (split_nodes_image, split_nodes_link, extract_markdown_links, extract_markdown_images,
+    text_node_to_html_node, text_to_textnodes, scan_inline, parse_inline)
+
+
+def best_time(func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+# one paragraph with thousands of links and images, time per link has to stay flat if splitting is linear
+def bench_links(sizes=(1000, 2000, 4000, 8000, 16000)):
+    for size in sizes:
+        text = ' '.join(f'see [link {i}](https://example.com/{i}) and ![image {i}](/images/{i}.png)' for i in range(size))
+        nodes = [TextNode(text, TextType.TEXT)]
+        elapsed = best_time(lambda: split_nodes_image(split_nodes_link(nodes)))
+        print(f'links {size:>6}: {elapsed * 1000:8.1f} ms, {elapsed / size * 1e6:6.2f} us per link')
+
+
+def link_corpus(size, seed=0):
+    rng = random.Random(seed)
+    forms = [
+        '[plain link {i}](https://example.com/{i})',
+        '[query {i}](https://example.com/search?q={i}&page=2#results)',
+        '[юникод {i}](/docs/{i}#section)',
+        '![image {i}](/images/{i}.png?v=3)',
+        '[array[{i}]](/api/array)',
+        'not a link [{i}] (/nowhere) and [[[ unclosed {i}',
+    ]
+    words = ['lorem', 'ipsum', 'dolor', 'sit', 'amet', '**bold**', '_it_']
+    parts = []
+    for i in range(size):
+        parts.append(rng.choice(forms).format(i=i))
+        parts.extend(rng.choice(words) for _ in range(rng.randint(1, 8)))
+    return ' '.join(parts)
+
+
+# regex extraction over a large mixed corpus, including near-misses that make patterns backtrack
+def bench_extract(size=200000):
+    text = link_corpus(size)
+    elapsed = best_time(lambda: (extract_markdown_links(text), extract_markdown_images(text)))
+    matches = len(extract_markdown_links(text)) + len(extract_markdown_images(text))
+    print(f'extract {len(text) / 1e6:.1f} MB, {matches} matches: {elapsed * 1000:.1f} ms, '
+          f'{len(text) / elapsed / 1e6:.1f} MB/s')
+    # long runs of brackets must not blow up
+    for size in (10000, 100000):
+        text = '[' * size + 'a](/x' + '[a' * size
+        elapsed = best_time(lambda: extract_markdown_links(text))
+        print(f'extract brackets {size:>6}: {elapsed * 1000:.1f} ms')
+
+
+# subclasses without __slots__ get a __dict__ again, which is how the nodes looked before
+class DictTextNode(TextNode):
+    pass
+
+
+class DictLeafNode(LeafNode):
+    pass
+
+
+class DictParentNode(ParentNode):
+    pass
+
+
+# node classes the parser builds trees with, before and after __slots__
+NODE_CLASSES = {
+    '__dict__': (DictTextNode, DictLeafNode, DictParentNode),
+    '__slots__': (TextNode, LeafNode, ParentNode),
+}
+
+
+def bytes_per_node(make_node, count=100000):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    nodes = [make_node(i) for i in range(count)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    # the list holding the nodes isn't part of their size, text values are shared between them
+    nodes_size = sum(stat.size_diff for stat in after.compare_to(before, 'filename')) - sys.getsizeof(nodes)
+    return nodes_size / count
+
+
+def site_corpus(copies):
+    content_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'content')
+    pages = []
+    for dir_path, _, file_names in os.walk(content_dir):
+        for file in sorted(file_names):
+            with open(os.path.join(dir_path, file), 'r') as f:
+                pages.append(f.read())
+    return '\n\n'.join(pages * copies)
+
+
+def bench_memory(copies=200):
+    text = 'x' * 20
+    for name, make_node in [
+        ('TextNode with __dict__', lambda i: DictTextNode(text, TextType.TEXT)),
+        ('TextNode with __slots__', lambda i: TextNode(text, TextType.TEXT)),
+        ('LeafNode with __dict__', lambda i: DictLeafNode('b', text)),
+        ('LeafNode with __slots__', lambda i: LeafNode('b', text)),
+    ]:
+        print(f'{name:<24}: {bytes_per_node(make_node):6.1f} bytes per node')
+
+    # every parse runs in a new process, ru_maxrss is the peak of the whole process and would
+    # otherwise still hold whatever was built before
+    for kind in NODE_CLASSES:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            size, before, after = executor.submit(corpus_peak_rss, kind, copies).result()
+        print(f'corpus {size / 1e6:.1f} MB with {kind:<9}: peak RSS {before / 1e3:.1f} MB before parsing, '
+              f'{after / 1e3:.1f} MB after (+{(after - before) / 1e3:.1f} MB)')
+
+
+# peak RSS of this process in kilobytes; ru_maxrss (kilobytes on linux) survives exec, a spawned child
+# reports its parent's peak there, VmHWM starts over, so it is used wherever there is a /proc
+def peak_rss():
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+# runs in a fresh process: the parsing modules get the node classes of kind, then the corpus is parsed once
+def corpus_peak_rss(kind, copies):
+    text_node, leaf_node, parent_node = NODE_CLASSES[kind]
+    inline.TextNode, inline.LeafNode, inline.ParentNode = text_node, leaf_node, parent_node
+    block.LeafNode, block.ParentNode = leaf_node, parent_node
+    markdown = site_corpus(copies)
+    before = peak_rss()
+    node = markdown_to_html_node(markdown)
+    after = peak_rss()
+    return len(markdown), before, after
+
+
+# the if/elif chain text_node_to_html_node() used to be, kept here as the baseline
+def text_node_to_html_node_chain(text_node):
+    if text_node.text_type == TextType.TEXT:
+        return LeafNode(tag=None, value=text_node.text, props=None)
+    elif text_node.text_type == TextType.BOLD:
+        return LeafNode('b', text_node.text)
+    elif text_node.text_type == TextType.ITALIC:
+        return LeafNode('i', text_node.text)
+    elif text_node.text_type == TextType.CODE:
+        return LeafNode('code', text_node.text)
+    elif text_node.text_type == TextType.LINK:
+        return LeafNode('a', text_node.text, {'href': text_node.url})
+    elif text_node.text_type == TextType.IMAGE:
+        return LeafNode('img', text_node.text, {'src': text_node.url, 'alt': text_node.text})
+
+
+def block_renderer_chain(block_type):
+    if block_type == BlockType.PARAGRAPH:
+        return BLOCK_RENDERERS[BlockType.PARAGRAPH]
+    elif block_type == BlockType.HEADING:
+        return BLOCK_RENDERERS[BlockType.HEADING]
+    elif block_type == BlockType.CODE:
+        return BLOCK_RENDERERS[BlockType.CODE]
+    elif block_type == BlockType.QUOTE:
+        return BLOCK_RENDERERS[BlockType.QUOTE]
+    elif block_type == BlockType.UNORDERED_LIST:
+        return BLOCK_RENDERERS[BlockType.UNORDERED_LIST]
+    elif block_type == BlockType.ORDERED_LIST:
+        return BLOCK_RENDERERS[BlockType.ORDERED_LIST]
+
+
+def bench_dispatch(copies=100):
+    text_nodes = text_to_textnodes(site_corpus(1).replace('\n', ' ')) * copies
+    for name, convert in [('if/elif chain', text_node_to_html_node_chain), ('dispatch table', text_node_to_html_node)]:
+        elapsed = best_time(lambda: [convert(text_node) for text_node in text_nodes])
+        print(f'inline {name:<15}: {elapsed / len(text_nodes) * 1e9:6.0f} ns per node')
+
+    block_types = [block_to_block_type(block) for block in site_corpus(copies).split('\n\n') if block.strip()]
+    for name, lookup in [('if/elif chain', block_renderer_chain), ('dispatch table', BLOCK_RENDERERS.get)]:
+        elapsed = best_time(lambda: [lookup(block_type) for block_type in block_types])
+        print(f'block {name:<16}: {elapsed / len(block_types) * 1e9:6.0f} ns per block')
+
+
+# terms of every page, a full index build and the shards it writes, then an incremental update of one page
+def bench_search(pages=2000, page_size=8000):
+    with tempfile.TemporaryDirectory() as root:
+        paths = CorpusGenerator(seed=0).write_tree(os.path.join(root, 'content'), pages, 2, page_size)
+        documents = []
+        for path in paths:
+            with open(path, 'r') as f:
+                documents.append(Document(split_front_matter(f.read())[1]))
+        corpus_bytes = sum(len(document.markdown.encode('utf-8')) for document in documents)
+
+        start = time.perf_counter()
+        page_term_sets = [page_terms(document.title, document.blocks, document.block_types) for document in documents]
+        elapsed = time.perf_counter() - start
+        print(f'search terms {len(paths)} pages: {elapsed * 1000:.1f} ms, {corpus_bytes / elapsed / 1e6:.1f} MB/s')
+
+        dest_dir = os.path.join(root, 'public')
+        state_path = os.path.join(root, 'search.json')
+        search_index = SearchIndex(state_path, dest_dir)
+        start = time.perf_counter()
+        for i, (document, terms) in enumerate(zip(documents, page_term_sets)):
+            search_index.record(paths[i], f'/page-{i}.html', document.title, terms)
+        search_index.write()
+        elapsed = time.perf_counter() - start
+        search_index.save()
+        search_dir = search_index.search_dir
+        sizes = sorted(os.path.getsize(os.path.join(search_dir, name)) for name in os.listdir(search_dir)
+                       if name not in ('docs.json', 'index.json'))
+        print(f'search index build: {elapsed * 1000:.1f} ms, {len(search_index.postings)} terms in {len(sizes)} '
+              f'shards, {sum(sizes) / 1e6:.2f} MB total, shard median {sizes[len(sizes) // 2] / 1e3:.1f} kB, '
+              f'max {sizes[-1] / 1e3:.1f} kB, docs.json {os.path.getsize(os.path.join(search_dir, "docs.json")) / 1e3:.1f} kB')
+
+        search_index = SearchIndex(state_path, dest_dir)
+        start = time.perf_counter()
+        terms = dict(page_term_sets[0], incremental=1)
+        search_index.record(paths[0], '/page-0.html', documents[0].title, terms)
+        search_index.write()
+        elapsed = time.perf_counter() - start
+        print(f'search index update of 1 page: {elapsed * 1000:.1f} ms, rewrote {search_index.written} of '
+              f'{len(sizes) + 2} files')
+
+
+# many small documents the way a service embedding the renderer gets them, plain markdown_to_html() calls
+# against Renderer.render_many() serial, on threads and on processes, the cache case renders every document twice
+def bench_renderer(sizes=(1000, 10000, 100000), doc_size=600):
+    generator = CorpusGenerator(seed=0)
+    for size in sizes:
+        markdowns = [generator.page(f'Doc {i}', doc_size) for i in range(size)]
+        # pools are made once and warmed up, a service keeps them between requests
+        renderers = {executor: Renderer(workers=0, executor=executor) for executor in ('thread', 'process')}
+        for renderer in renderers.values():
+            renderer.render_many(markdowns[:10])
+        cases = [
+            ('markdown_to_html', 1, lambda: [markdown_to_html(markdown) for markdown in markdowns]),
+            ('serial', 1, lambda: Renderer().render_many(markdowns)),
+            ('serial chunks', 1, lambda: [''.join(chunks) for chunks in Renderer().render_many(markdowns, 'chunks')]),
+            ('serial cache', 2, lambda: Renderer(RenderCache()).render_many(markdowns * 2)),
+            ('threads', 1, lambda: renderers['thread'].render_many(markdowns)),
+            ('processes', 1, lambda: renderers['process'].render_many(markdowns)),
+        ]
+        for name, passes, func in cases:
+            elapsed = best_time(func, 1 if size >= 100000 else 3)
+            print(f'render {size:>6} docs {name:<16}: {elapsed * 1000:8.1f} ms, {size * passes / elapsed:8.0f} docs/s')
+        for renderer in renderers.values():
+            renderer.close()
+
+
+# whole content tree builds, serial, on worker processes and through the async pipeline which also prints
+# the queue depths it saw, a full read queue means rendering is the bottleneck, an empty one means reading is
+def bench_pipeline(pages=1000, page_size=8000):
+    with tempfile.TemporaryDirectory() as root:
+        content_dir = os.path.join(root, 'content')
+        CorpusGenerator(seed=0).write_tree(content_dir, pages, 2, page_size)
+        template_path = os.path.join(root, 'template.html')
+        with open(template_path, 'w') as f:
+            f.write('<html><head><title>{{ Title }}</title></head><body>{{ Content }}</body></html>')
+        dest_dir = os.path.join(root, 'public')
+        pipelines = []
+
+        def run_pipeline():
+            pipelines.append(AsyncPipeline(template_path, ''))
+            pipelines[-1].run(content_dir, dest_dir)
+
+        for name, func in [
+            ('serial', lambda: generate_pages_recursive(content_dir, template_path, dest_dir, '')),
+            ('parallel', lambda: generate_pages_parallel(content_dir, template_path, dest_dir, '')),
+            ('async', run_pipeline),
+        ]:
+            with redirect_stdout(io.StringIO()):
+                elapsed = best_time(func)
+            print(f'build {pages} pages {name:<8}: {elapsed * 1000:8.1f} ms, {pages / elapsed:7.1f} pages/s')
+        print(min(pipelines, key=lambda pipeline: pipeline.seconds).summary())
+
+
+# delimiter heavy input that makes naive emphasis matching quadratic, time per character has to stay flat
+# as the input grows; the regular corpus is timed against the old flat scan_inline() too
+def bench_inline(sizes=(1000, 10000, 100000)):
+    cases = {
+        'run of *': lambda n: '*' * n,
+        'run of _': lambda n: '_' * n,
+        'openers *a': lambda n: '*a' * n,
+        'closers a*': lambda n: 'a*' * n,
+        'snake_case': lambda n: 'a_' * n,
+        'mixed **a _b': lambda n: '**a _b ' * n,
+        'nested *a ... a*': lambda n: '*a ' * n + 'b' + ' a*' * n,
+        'backticks': lambda n: '` `` ' * n,
+        'brackets': lambda n: '[a](' * n,
+    }
+    for name, make_text in cases.items():
+        for size in sizes:
+            text = make_text(size)
+            elapsed = best_time(lambda: [text_node_to_html_node(node).to_html() for node in parse_inline(text)])
+            print(f'inline {name:<17} {size:>6}: {elapsed * 1000:8.1f} ms, {elapsed / len(text) * 1e9:6.0f} ns per char')
+
+    blocks = [block for block in site_corpus(200).split('\n\n') if block.strip() and not block.startswith('```')]
+    corpus_bytes = sum(len(block.encode('utf-8')) for block in blocks)
+    for name, parse in [('scan_inline', scan_inline), ('parse_inline', parse_inline)]:
+        elapsed = best_time(lambda: [parse(block) for block in blocks])
+        print(f'inline corpus {name:<12}: {elapsed * 1000:8.1f} ms, {corpus_bytes / elapsed / 1e6:5.1f} MB/s')
+
+
+BENCHMARKS = {
+    'links': bench_links,
+    'extract': bench_extract,
+    'memory': bench_memory,
+    'dispatch': bench_dispatch,
+    'search': bench_search,
+    'renderer': bench_renderer,
+    'pipeline': bench_pipeline,
+    'inline': bench_inline,
+}
+
+
+# throughput of every pipeline stage over a synthetic corpus, results are comparable between runs
+# with the same corpus options (same seed gives the same corpus)
+def run_suite(args):
+    results = {'options': {'pages': args.pages, 'page_size': args.page_size, 'link_density': args.link_density,
+                           'depth': args.depth, 'seed': args.seed, 'block_mix': args.block_mix}, 'benchmarks': {}}
+    with tempfile.TemporaryDirectory() as root:
+        content_dir = os.path.join(root, 'content')
+        generator = CorpusGenerator(args.block_mix, args.link_density, args.seed)
+        paths = generator.write_tree(content_dir, args.pages, args.depth, args.page_size)
+        markdowns = []
+        for path in paths:
+            with open(path, 'r') as f:
+                markdowns.append(f.read())
+        corpus_bytes = sum(len(markdown.encode('utf-8')) for markdown in markdowns)
+        blocks = [block for markdown in markdowns for block in markdown_to_blocks(markdown)]
+        inline_blocks = [block for block in blocks if not block.startswith('```')]
+        inline_bytes = sum(len(block.encode('utf-8')) for block in inline_blocks)
+
+        def record(name, elapsed, size, unit):
+            results['benchmarks'][name] = {'seconds': elapsed, 'throughput': size / elapsed, 'unit': unit}
+
+        record('markdown_to_blocks', best_time(lambda: [markdown_to_blocks(m) for m in markdowns], args.repeat),
+               corpus_bytes / 1e6, 'MB/s')
+        record('text_to_textnodes', best_time(lambda: [text_to_textnodes(b) for b in inline_blocks], args.repeat),
+               inline_bytes / 1e6, 'MB/s')
+        record('markdown_to_html', best_time(lambda: [markdown_to_html(m) for m in markdowns], args.repeat),
+               corpus_bytes / 1e6, 'MB/s')
+
+        template_path = os.path.join(root, 'template.html')
+        with open(template_path, 'w') as f:
+            f.write('<html><head><title>{{ Title }}</title></head><body>{{ Content }}</body></html>')
+        dest_dir = os.path.join(root, 'public')
+        with redirect_stdout(io.StringIO()):
+            elapsed = best_time(lambda: generate_pages_recursive(content_dir, template_path, dest_dir, '/base'),
+                                args.repeat)
+        record('generate_pages_recursive', elapsed, len(paths), 'pages/s')
+
+    for name, result in results['benchmarks'].items():
+        print(f'{name:<26}: {result["seconds"] * 1000:9.1f} ms, {result["throughput"]:9.2f} {result["unit"]}')
+    return results
+
+
+# benchmarks slower than the baseline by more than threshold (0.1 = 10% less throughput)
+def find_regressions(results, baseline, threshold):
+    regressions = []
+    for name, result in results['benchmarks'].items():
+        if name not in baseline['benchmarks']:
+            continue
+        base_throughput = baseline['benchmarks'][name]['throughput']
+        change = result['throughput'] / base_throughput - 1
+        print(f'{name:<26}: {change * 100:+6.1f}% vs baseline')
+        if change < -threshold:
+            regressions.append(name)
+    return regressions
+
+
+# 'paragraph=6,code=3' -> {'paragraph': 6, 'code': 3}, block kinds left out don't appear in the corpus
+def parse_block_mix(text):
+    block_mix = {}
+    for part in text.split(','):
+        kind, _, weight = part.partition('=')
+        kind = kind.strip()
+        if kind not in DEFAULT_BLOCK_MIX:
+            raise ValueError(f'Unknown block kind in parse_block_mix(): {kind}')
+        block_mix[kind] = float(weight)
+        if block_mix[kind] < 0:
+            raise ValueError(f'Negative weight in parse_block_mix(): {part}')
+    if not any(weight > 0 for weight in block_mix.values()):
+        raise ValueError(f'No block kind has a weight in parse_block_mix(): {text}')
+    return block_mix
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='benchmarks of the site generator')
+    parser.add_argument('names', nargs='*', help=f'benchmarks to run: suite, {", ".join(BENCHMARKS)} (default: all '
+                                                  'but suite)')
+    parser.add_argument('--pages', type=int, default=200, help='suite: pages in the synthetic corpus')
+    parser.add_argument('--page-size', type=int, default=8000, help='suite: characters per page')
+    parser.add_argument('--link-density', type=float, default=0.05, help='suite: share of words that are links')
+    parser.add_argument('--block-mix', type=parse_block_mix, default=DEFAULT_BLOCK_MIX,
+                        help='suite: relative weights of block kinds, like paragraph=6,heading=2,code=1 '
+                             f'(kinds: {", ".join(DEFAULT_BLOCK_MIX)})')
+    parser.add_argument('--depth', type=int, default=2, help='suite: max dir nesting of the content tree')
+    parser.add_argument('--seed', type=int, default=0, help='suite: corpus random seed')
+    parser.add_argument('--repeat', type=int, default=5, help='suite: runs per benchmark, the best one counts')
+    parser.add_argument('--save', help='suite: write results as json to this path')
+    parser.add_argument('--baseline', help='suite: compare with results saved by --save earlier')
+    parser.add_argument('--threshold', type=float, default=0.1, help='suite: allowed throughput drop vs baseline')
+    return parser.parse_args(argv)
+
+
+# usage: python3 src/bench.py [benchmark names...], runs everything but the suite by default
+#        python3 src/bench.py suite --save baseline.json, later: python3 src/bench.py suite --baseline baseline.json
+if __name__ == '__main__':
+    args = parse_args(sys.argv[1:])
+    names = args.names or list(BENCHMARKS)
+    for name in names:
+        if name != 'suite' and name not in BENCHMARKS:
+            raise ValueError(f'Unknown benchmark: {name}, available: suite, {", ".join(BENCHMARKS)}')
+
+    for name in names:
+        if name != 'suite':
+            BENCHMARKS[name]()
+            continue
+        results = run_suite(args)
+        if args.save:
+            with open(args.save, 'w') as f:
+                json.dump(results, f, indent=2)
+        if args.baseline:
+            with open(args.baseline, 'r') as f:
+                baseline = json.load(f)
+            if baseline['options'] != results['options']:
+                print(f'Warning: baseline was made with different options: {baseline["options"]}')
+            regressions = find_regressions(results, baseline, args.threshold)
+            if regressions:
+                print(f'Regressions: {", ".join(regressions)}')
+                sys.exit(1)
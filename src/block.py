@@ -1,6 +1,7 @@
 from enum import Enum
 from nodes import LeafNode, ParentNode, TextType
 from inline import text_to_textnodes, text_node_to_html_node
+from profiling import profiled
 
 
 class BlockType(Enum):
@@ -12,7 +13,15 @@ class BlockType(Enum):
     ORDERED_LIST = 6
 
 
+# (detector, block_type) pairs of registered block types, checked before the built in ones
+BLOCK_DETECTORS = []
+
+
 def block_to_block_type(block_text):
+    for detector, block_type in BLOCK_DETECTORS:
+        if detector(block_text):
+            return block_type
+
     if block_text.split() and '#' in block_text.split()[0]:
         return BlockType.HEADING
     elif block_text.startswith('```\n') and block_text.endswith('```'):
@@ -27,7 +36,40 @@ def block_to_block_type(block_text):
         return BlockType.PARAGRAPH
 
 
+FENCE = '```'
+
+
+# blocks of a stream of lines (a file object works), lazily and holding only the current block,
+# blank lines inside a ``` fence belong to the code block instead of splitting it
+def iter_blocks(lines):
+    block_lines = []
+    in_fence = False
+    for line in lines:
+        line = line.rstrip('\n')
+        if not line and not in_fence:
+            block = '\n'.join(block_lines).strip()
+            if block:
+                yield block
+            block_lines = []
+            continue
+
+        if in_fence:
+            in_fence = FENCE not in line
+        elif line.lstrip().startswith(FENCE) and line.count(FENCE) % 2:
+            in_fence = True
+        block_lines.append(line)
+
+    block = '\n'.join(block_lines).strip()
+    if block:
+        yield block
+
+
+@profiled('markdown_to_blocks')
 def markdown_to_blocks(markdown):
+    # without fences plain splitting gives the same blocks and is a lot faster
+    if FENCE in markdown:
+        return list(iter_blocks(markdown.split('\n')))
+
     blocks = markdown.split('\n\n')
     filtered_blocks = []
     for block in blocks:
@@ -116,25 +158,83 @@ def markdown_ordered_list_to_html(block):
     return parent_node
 
 
-def markdown_to_html(markdown):
-    blocks = markdown_to_blocks(markdown)
+# block type -> function turning the block text into an html node
+BLOCK_RENDERERS = {
+    BlockType.PARAGRAPH: markdown_paragraph_block_to_html,
+    BlockType.HEADING: markdown_header_block_to_html,
+    BlockType.CODE: markdown_code_block_to_html,
+    BlockType.QUOTE: markdown_quote_block_to_html,
+    BlockType.UNORDERED_LIST: markdown_unordered_list_to_html,
+    BlockType.ORDERED_LIST: markdown_ordered_list_to_html,
+}
+
+
+# block_type can be anything hashable (a string like 'table' is fine),
+# without a detector only the renderer of an existing type is replaced
+def register_block_type(block_type, renderer, detector=None):
+    BLOCK_RENDERERS[block_type] = renderer
+    if detector is not None:
+        BLOCK_DETECTORS.append((detector, block_type))
+
+
+def block_to_html_node(block, block_type=None):
+    if block_type is None:
+        block_type = block_to_block_type(block)
+    renderer = BLOCK_RENDERERS.get(block_type)
+    if renderer is None:
+        raise ValueError(f'Invalid BlockType in markdown_to_html(): {block_type}')
+    return renderer(block)
+
+
+def cached_block_html(block, cache, block_type=None):
+    block_html = cache.get('block', block)
+    if block_html is None:
+        block_html = block_to_html_node(block, block_type).to_html()
+        cache.put('block', block, block_html)
+    return block_html
+
+
+# with a RenderCache given, blocks seen before come back as already rendered html,
+# block_types can be passed when the caller already knows them
+def blocks_to_html_node(blocks, cache=None, block_types=None):
     div_children = []
+    for i, block in enumerate(blocks):
+        block_type = block_types[i] if block_types is not None else None
+        if cache is None:
+            div_children.append(block_to_html_node(block, block_type))
+            continue
+        # tagless leaf writes its value as is
+        div_children.append(LeafNode(None, cached_block_html(block, cache, block_type)))
+
+    div_parent = ParentNode('div', children=div_children, props=None)
+    return div_parent
+
+
+def markdown_to_html_node(markdown, cache=None):
+    return blocks_to_html_node(markdown_to_blocks(markdown), cache)
+
+
+def markdown_to_html(markdown, cache=None):
+    if cache is None:
+        return markdown_to_html_node(markdown).to_html()
+    html = cache.get('document', markdown)
+    if html is None:
+        html = markdown_to_html_node(markdown, cache).to_html()
+        cache.put('document', markdown, html)
+    return html
+
+
+# same html as markdown_to_html() as a stream of chunks, blocks are rendered one at a time as they come,
+# so with iter_blocks() over a file memory doesn't grow with the file size
+def iter_blocks_html(blocks, cache=None):
+    yield '<div>'
     for block in blocks:
-        block_type = block_to_block_type(block)
-        if block_type == BlockType.PARAGRAPH:
-            div_children.append(markdown_paragraph_block_to_html(block))
-        elif block_type == BlockType.HEADING:
-            div_children.append(markdown_header_block_to_html(block))
-        elif block_type == BlockType.CODE:
-            div_children.append(markdown_code_block_to_html(block))
-        elif block_type == BlockType.QUOTE:
-            div_children.append(markdown_quote_block_to_html(block))
-        elif block_type == BlockType.UNORDERED_LIST:
-            div_children.append(markdown_unordered_list_to_html(block))
-        elif block_type == BlockType.ORDERED_LIST:
-            div_children.append(markdown_ordered_list_to_html(block))
+        if cache is None:
+            yield from block_to_html_node(block).iter_html()
         else:
-            raise ValueError(f'Invalid BlockType in markdown_to_html(): {block_type}')
+            yield cached_block_html(block, cache)
+    yield '</div>'
 
-    div_parent = ParentNode('div', children=div_children, props=None)
-    return div_parent.to_html()
+
+def markdown_file_to_html(f, cache=None):
+    return iter_blocks_html(iter_blocks(f), cache)
@@ -0,0 +1,50 @@
+import os
+import time
+import tempfile
+import unittest
+from gen import collect_pages
+
+
+class BuildTestCase(unittest.TestCase):
+    # base of tests running whole builds: a temp dir with content/, public/, cache/ and template.html,
+    # content/ is left for every test class to fill with write() and write_posts()
+    template_html = '<title>{{ Title }}</title><body>{{ Content }}</body>'
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.content = os.path.join(self.root, 'content')
+        self.dest = os.path.join(self.root, 'public')
+        self.cache = os.path.join(self.root, 'cache')
+        self.template = os.path.join(self.root, 'template.html')
+        os.makedirs(self.content)
+        self.write(self.template, self.template_html)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    # relative paths are inside content/, the mtime is moved ahead since some filesystems keep it
+    # so coarse that a quick rewrite wouldn't look changed
+    def write(self, path, text):
+        path = os.path.join(self.content, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(text)
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+
+    def write_posts(self, count):
+        for i in range(count):
+            self.write(os.path.join('blog', f'post{i}.md'), f'# post {i}\n\n[home](/index.html) and _italic_ {i}')
+
+    def read(self, *parts):
+        with open(os.path.join(self.dest, *parts)) as f:
+            return f.read()
+
+    # {source path relative to content/: html} of every generated page in dest
+    def read_tree(self, dest):
+        tree = {}
+        for src, path in collect_pages(self.content, dest):
+            if os.path.exists(path):
+                with open(path) as f:
+                    tree[os.path.relpath(src, self.content)] = f.read()
+        return tree
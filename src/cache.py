@@ -0,0 +1,87 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+# bump when rendering changes, so html cached on disk by an older version isn't reused,
+# build manifests saved by an older version rebuild every page too
+CACHE_VERSION = 2
+
+
+class RenderCache:
+    # rendered html keyed by a hash of the markdown it came from, LRU bounded in memory,
+    # optionally backed by a dir of files that survives between builds
+    # max_size is the total length of html kept in memory, whole documents can be big
+    def __init__(self, max_size=64 * 1024 * 1024, disk_dir=None, namespace=''):
+        self.max_size = max_size
+        self.size = 0
+        self.disk_dir = disk_dir
+        self.settings = (max_size, disk_dir, namespace)
+        # callers registering their own renderers should pass a namespace naming them
+        self.namespace = f'{CACHE_VERSION}:{namespace}'
+        self.entries = OrderedDict()
+        self.hits = {'block': 0, 'document': 0}
+        self.misses = {'block': 0, 'document': 0}
+        # the LRU order and size are shared by every thread rendering with this cache
+        self.lock = threading.Lock()
+
+    def key(self, kind, text):
+        return hashlib.sha256(f'{self.namespace}:{kind}:{text}'.encode('utf-8')).hexdigest()
+
+    def disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key + '.html')
+
+    def get(self, kind, text):
+        key = self.key(kind, text)
+        with self.lock:
+            html = self.entries.get(key)
+            if html is not None:
+                self.entries.move_to_end(key)
+        if html is None and self.disk_dir is not None and os.path.exists(self.disk_path(key)):
+            with open(self.disk_path(key), 'r') as f:
+                html = f.read()
+            self.remember(key, html)
+
+        with self.lock:
+            if html is None:
+                self.misses[kind] += 1
+            else:
+                self.hits[kind] += 1
+        return html
+
+    def put(self, kind, text, html):
+        key = self.key(kind, text)
+        self.remember(key, html)
+        if self.disk_dir is not None:
+            path = self.disk_path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'w') as f:
+                f.write(html)
+            os.replace(tmp_path, path)
+
+    def remember(self, key, html):
+        with self.lock:
+            if key in self.entries:
+                self.size -= len(self.entries[key])
+            self.entries[key] = html
+            self.entries.move_to_end(key)
+            self.size += len(html)
+            while self.size > self.max_size and self.entries:
+                _, evicted_html = self.entries.popitem(last=False)
+                self.size -= len(evicted_html)
+
+    def counts(self):
+        return {kind: (self.hits[kind], self.misses[kind]) for kind in self.hits}
+
+    def counts_since(self, counts):
+        return {kind: (self.hits[kind] - hits, self.misses[kind] - misses) for kind, (hits, misses) in counts.items()}
+
+    # merges counters of caches living in worker processes
+    def add_counts(self, counts):
+        for kind, (hits, misses) in counts.items():
+            self.hits[kind] += hits
+            self.misses[kind] += misses
+
+    def summary(self):
+        return ', '.join(f'{kind} cache {self.hits[kind]} hits / {self.misses[kind]} misses' for kind in self.hits)
@@ -1,9 +1,12 @@
 import os
 import sys
+import json
 import shutil
+import hashlib
 
 sys.path.append('../site_gen')
 from root import ROOT_DIR
+from files import write_json
 
 
 def copy_source_dir_to_destination(source, destination):
@@ -36,6 +39,112 @@ def copy_source_dir_to_destination(source, destination):
             shutil.copyfile(source_file_path, destination_file)
 
 
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_synced(source_file, destination_file, checksum=False):
+    if not os.path.exists(destination_file):
+        return False
+    source_stat = os.stat(source_file)
+    destination_stat = os.stat(destination_file)
+    # hardlinked on a previous sync
+    if (source_stat.st_dev, source_stat.st_ino) == (destination_stat.st_dev, destination_stat.st_ino):
+        return True
+    if source_stat.st_size != destination_stat.st_size:
+        return False
+    if checksum:
+        return file_digest(source_file) == file_digest(destination_file)
+    return source_stat.st_mtime_ns == destination_stat.st_mtime_ns
+
+
+# linux FICLONE ioctl, shares blocks on copy-on-write filesystems (btrfs, xfs)
+FICLONE = 0x40049409
+
+
+def reflink_file(source_file, destination_file):
+    import fcntl
+    with open(source_file, 'rb') as src, open(destination_file, 'wb') as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    shutil.copystat(source_file, destination_file)
+
+
+# link_mode: 'copy', 'hardlink' or 'reflink', linking falls back to copying across filesystems
+def place_file(source_file, destination_file, link_mode='copy'):
+    if os.path.lexists(destination_file):
+        os.remove(destination_file)
+    if link_mode == 'hardlink':
+        try:
+            os.link(source_file, destination_file)
+            return
+        except OSError:
+            pass
+    elif link_mode == 'reflink':
+        try:
+            reflink_file(source_file, destination_file)
+            return
+        except (OSError, ImportError):
+            if os.path.exists(destination_file):
+                os.remove(destination_file)
+    elif link_mode != 'copy':
+        raise ValueError(f'Unknown link_mode in place_file(): {link_mode}')
+    # copy2 keeps mtime, so the next sync can compare by size/mtime
+    shutil.copy2(source_file, destination_file)
+
+
+# copies only new or changed files, generated pages in destination are left alone;
+# files synced previously (listed in state_path) that are gone from source get removed
+def sync_source_dir_to_destination(source, destination, state_path=None, checksum=False, link_mode='copy'):
+    full_source_path = os.path.join(ROOT_DIR, source)
+    full_destination_path = os.path.join(ROOT_DIR, destination)
+    stats = {'copied': 0, 'copied_bytes': 0, 'skipped': 0, 'skipped_bytes': 0, 'removed': 0}
+    if not os.path.exists(full_source_path):
+        return stats
+    if not os.path.isdir(full_source_path):
+        raise ValueError(f'source isnt a dir in sync_source_dir_to_destination(): {full_source_path}')
+
+    synced_files = []
+    for dir_path, dir_names, file_names in os.walk(full_source_path):
+        dir_names.sort()
+        relative_dir = os.path.relpath(dir_path, full_source_path)
+        destination_dir = os.path.normpath(os.path.join(full_destination_path, relative_dir))
+        os.makedirs(destination_dir, exist_ok=True)
+        for file in sorted(file_names):
+            source_file = os.path.join(dir_path, file)
+            destination_file = os.path.join(destination_dir, file)
+            synced_files.append(os.path.normpath(os.path.join(relative_dir, file)))
+            size = os.path.getsize(source_file)
+            if is_synced(source_file, destination_file, checksum):
+                stats['skipped'] += 1
+                stats['skipped_bytes'] += size
+            else:
+                place_file(source_file, destination_file, link_mode)
+                stats['copied'] += 1
+                stats['copied_bytes'] += size
+
+    if state_path is not None:
+        if os.path.exists(state_path):
+            with open(state_path, 'r') as f:
+                previous_files = json.load(f)
+            for relative_file in set(previous_files) - set(synced_files):
+                destination_file = os.path.join(full_destination_path, relative_file)
+                if os.path.exists(destination_file):
+                    os.remove(destination_file)
+                stats['removed'] += 1
+        write_json(state_path, synced_files)
+
+    return stats
+
+
+def sync_summary(stats):
+    return (f'Copied {stats["copied"]} files ({stats["copied_bytes"]} bytes), '
+            f'skipped {stats["skipped"]} ({stats["skipped_bytes"]} bytes), removed {stats["removed"]}')
+
+
 # test
 if __name__ == '__main__':
     source = os.path.join(ROOT_DIR, 'static')
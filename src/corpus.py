@@ -0,0 +1,78 @@
+import os
+import random
+
+BLOCK_KINDS = ('paragraph', 'heading', 'code', 'quote', 'unordered_list', 'ordered_list')
+DEFAULT_BLOCK_MIX = {'paragraph': 6, 'heading': 2, 'code': 1, 'quote': 1, 'unordered_list': 1, 'ordered_list': 1}
+# no '-' anywhere, unordered lists split their items on it
+WORDS = ('lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing', 'elit', 'sed', 'do',
+         'eiusmod', 'tempor', 'incididunt', 'labore', 'magna', 'aliqua', 'Glorfindel', 'Rivendell', 'Bombadil')
+
+
+class CorpusGenerator:
+    # synthetic markdown the renderer understands: every block kind, inline markup and links
+    def __init__(self, block_mix=None, link_density=0.05, seed=0):
+        self.block_mix = block_mix or DEFAULT_BLOCK_MIX
+        self.link_density = link_density
+        self.rng = random.Random(seed)
+        self.counter = 0
+
+    def inline_text(self, word_count):
+        words = []
+        for _ in range(word_count):
+            self.counter += 1
+            roll = self.rng.random()
+            word = self.rng.choice(WORDS)
+            if roll < self.link_density * 0.8:
+                words.append(f'[{word} {self.counter}](https://example.com/docs/{word}/{self.counter}?page=2#top)')
+            elif roll < self.link_density:
+                words.append(f'![{word} image](/images/{word}{self.counter}.png)')
+            elif roll < self.link_density + 0.03:
+                words.append(f'**{word} {self.rng.choice(WORDS)}**')
+            elif roll < self.link_density + 0.05:
+                words.append(f'_{word}_')
+            elif roll < self.link_density + 0.06:
+                words.append(f'`{word}()`')
+            else:
+                words.append(word)
+        return ' '.join(words)
+
+    def block(self, kind):
+        rng = self.rng
+        if kind == 'paragraph':
+            return self.inline_text(rng.randint(20, 80))
+        elif kind == 'heading':
+            return '#' * rng.randint(2, 6) + ' ' + self.inline_text(rng.randint(2, 8))
+        elif kind == 'code':
+            lines = [f'{rng.choice(WORDS)} = {rng.randint(0, 1000)}' for _ in range(rng.randint(2, 12))]
+            return '```\n' + '\n'.join(lines) + '```'
+        elif kind == 'quote':
+            return '> ' + self.inline_text(rng.randint(10, 40))
+        elif kind == 'unordered_list':
+            return '\n'.join('- ' + self.inline_text(rng.randint(3, 12)) for _ in range(rng.randint(2, 8)))
+        elif kind == 'ordered_list':
+            return '\n'.join(f'{i}. ' + self.inline_text(rng.randint(3, 12)) for i in range(1, rng.randint(3, 9)))
+        raise ValueError(f'Unknown block kind in CorpusGenerator.block(): {kind}')
+
+    def page(self, title, page_size=4000):
+        kinds = list(self.block_mix)
+        weights = [self.block_mix[kind] for kind in kinds]
+        blocks = [f'# {title}']
+        size = len(blocks[0])
+        while size < page_size:
+            block = self.block(self.rng.choices(kinds, weights)[0])
+            blocks.append(block)
+            size += len(block) + 2
+        return '\n\n'.join(blocks)
+
+    # writes pages spread over nested dirs, depth levels deep, returns their paths
+    def write_tree(self, root, pages=100, depth=2, page_size=4000, fanout=4):
+        paths = []
+        for i in range(pages):
+            parts = [f'section{self.rng.randrange(fanout)}' for _ in range(self.rng.randint(0, depth))]
+            dir_path = os.path.join(root, *parts, f'page{i}')
+            os.makedirs(dir_path, exist_ok=True)
+            path = os.path.join(dir_path, 'index.md')
+            with open(path, 'w') as f:
+                f.write(self.page(f'Page {i}', page_size))
+            paths.append(path)
+        return paths
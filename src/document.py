@@ -0,0 +1,63 @@
+from block import BlockType, markdown_to_blocks, block_to_block_type, blocks_to_html_node
+from inline import extract_markdown_links, extract_markdown_images
+
+
+def title_from_blocks(blocks):
+    for block in blocks:
+        if block.startswith('#') and len(block) > 1 and block[1] != '#':
+            return block[1:].strip()
+    return ''
+
+
+class Document:
+    # markdown split into blocks once, title, headings, links, images and the rendered body
+    # are all taken from the same blocks
+    def __init__(self, markdown, blocks=None):
+        self.markdown = markdown
+        self.blocks = blocks if blocks is not None else markdown_to_blocks(markdown)
+        self._block_types = None
+
+    @property
+    def block_types(self):
+        if self._block_types is None:
+            self._block_types = [block_to_block_type(block) for block in self.blocks]
+        return self._block_types
+
+    @property
+    def title(self):
+        return title_from_blocks(self.blocks)
+
+    # (level, raw markdown text) of every heading
+    @property
+    def headings(self):
+        headings = []
+        for block, block_type in zip(self.blocks, self.block_types):
+            if block_type != BlockType.HEADING:
+                continue
+            level = len(block) - len(block.lstrip('#'))
+            headings.append((level, block[level:].strip()))
+        return headings
+
+    # (text, url) pairs, code blocks are skipped since nothing in them is rendered as a link
+    @property
+    def links(self):
+        return [link for block in self.inline_blocks() for link in extract_markdown_links(block)]
+
+    @property
+    def images(self):
+        return [image for block in self.inline_blocks() for image in extract_markdown_images(block)]
+
+    def inline_blocks(self):
+        return [block for block, block_type in zip(self.blocks, self.block_types) if block_type != BlockType.CODE]
+
+    def html_node(self, cache=None):
+        return blocks_to_html_node(self.blocks, cache, self.block_types)
+
+    def to_html(self, cache=None):
+        if cache is None:
+            return self.html_node().to_html()
+        html = cache.get('document', self.markdown)
+        if html is None:
+            html = self.html_node(cache).to_html()
+            cache.put('document', self.markdown, html)
+        return html
@@ -0,0 +1,14 @@
+import os
+import json
+
+
+# data as json into path by way of a temporary file next to it, so a crash mid-write never leaves half
+# a file behind, missing parent dirs are made
+def write_json(path, data, **dump_options):
+    dir_path = os.path.dirname(path)
+    if dir_path:
+        os.makedirs(dir_path, exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, **dump_options)
+    os.replace(tmp_path, path)
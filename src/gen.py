@@ -1,49 +1,245 @@
 import os
-from block import markdown_to_blocks, markdown_to_html
+import re
+from concurrent.futures import ProcessPoolExecutor
+from block import iter_blocks, markdown_file_to_html
+from document import Document, title_from_blocks
+from manifest import text_hash, file_text_hash
+from cache import RenderCache
+from profiling import PROFILER, profiled
+from images import current_image_info, use_image_info
+from search import page_terms
+from template import Template
+
+# pages at least this big (in bytes) are rendered straight from the file a block at a time
+STREAM_THRESHOLD = 8 * 1024 * 1024
+FRONT_MATTER_FENCE = '---'
+
+
+# yaml-ish scalars: quoted or bare strings, true/false, integers and [a, b] lists
+def parse_front_matter_value(value):
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'':
+        return value[1:-1]
+    if value.startswith('[') and value.endswith(']'):
+        return [parse_front_matter_value(item) for item in value[1:-1].split(',') if item.strip()]
+    if value.lower() in ('true', 'yes'):
+        return True
+    if value.lower() in ('false', 'no'):
+        return False
+    if re.fullmatch(r'-?\d+', value):
+        return int(value)
+    return value
+
+
+# key: value lines between the --- fences, a key with no value takes the "- item" lines below it as a list
+def parse_front_matter(lines):
+    metadata = {}
+    list_key = None
+    for line in lines:
+        line = line.rstrip('\n')
+        if not line.strip() or line.lstrip().startswith('#'):
+            continue
+        if list_key is not None and line.lstrip().startswith('- '):
+            metadata[list_key].append(parse_front_matter_value(line.lstrip()[2:]))
+            continue
+        if ':' not in line:
+            raise ValueError(f'Invalid front matter line in parse_front_matter(): {line}')
+        key, value = line.split(':', 1)
+        key = key.strip()
+        if value.strip():
+            metadata[key] = parse_front_matter_value(value)
+            list_key = None
+        else:
+            metadata[key] = []
+            list_key = key
+    return metadata
+
+
+# (metadata, markdown after the front matter), markdown without front matter comes back whole
+def split_front_matter(markdown):
+    if not markdown.startswith(FRONT_MATTER_FENCE + '\n'):
+        return {}, markdown
+    lines = markdown.split('\n')
+    for i in range(1, len(lines)):
+        if lines[i].rstrip() == FRONT_MATTER_FENCE:
+            return parse_front_matter(lines[1:i]), '\n'.join(lines[i + 1:])
+    raise ValueError(f'Unclosed front matter in split_front_matter(): {markdown[:80]}')
+
+
+# same as split_front_matter() for an open file, leaves it right after the front matter
+def read_front_matter(f):
+    if f.readline().rstrip('\n') != FRONT_MATTER_FENCE:
+        f.seek(0)
+        return {}
+    lines = []
+    for line in iter(f.readline, ''):
+        if line.rstrip() == FRONT_MATTER_FENCE:
+            return parse_front_matter(lines)
+        lines.append(line)
+    raise ValueError(f'Unclosed front matter in read_front_matter(): {f.name}')
+
+
+def is_hidden_draft(metadata, site_index):
+    return bool(metadata.get('draft')) and (site_index is None or not site_index.drafts)
+
+
+# html of a fresh page is only reused when the index still has its metadata
+def is_fresh_page(from_path, dest_path, manifest, site_index):
+    if manifest is None or not manifest.is_fresh(from_path, dest_path):
+        return False
+    return site_index is None or site_index.has_page(from_path)
+
+
+# a page turned into a draft (watch mode) mustn't stay listed
+def skip_draft(from_path, site_index):
+    print(f'Skipping draft {from_path}')
+    if site_index is not None:
+        site_index.remove(from_path)
+
+
+def skip_page(from_path, manifest, site_index):
+    manifest.skip(from_path)
+    if site_index is not None:
+        site_index.keep(from_path)
 
 
 def extract_title(markdown):
-    blocks = markdown_to_blocks(markdown)
-    title = ''
-    for block in blocks:
-        if block.startswith('#') and len(block) > 1 and block[1] != '#':
-            title = block[1:].strip()
-            break
+    return document_title(Document(markdown))
 
+
+@profiled('extract_title')
+def document_title(document):
+    title = document.title
     if not title:
-        raise ValueError(f'No h1 title provided in: {markdown}')
-    
+        raise ValueError(f'No h1 title provided in: {document.markdown}')
+
     return title
 
 
-def generate_page(from_path, template_path, dest_path, basepath):
-    print(f'Generating page from {from_path} to {dest_path} using {template_path}')
-    with open(from_path, 'r') as f:
-        markdown_text = f.read()
+def indexes_search(site_index):
+    return site_index is not None and site_index.search is not None
 
-    content_title = extract_title(markdown_text)
-    content_parent_node_html = markdown_to_html(markdown_text)
 
-    with open(template_path, 'r') as f:
-        html_template = f.read()
+# a title in the front matter wins over the h1
+def page_title(metadata, document):
+    if metadata.get('title'):
+        return str(metadata['title'])
+    return document_title(document)
 
-    html_template = html_template.replace('{{ Title }}', content_title)
-    html_template = html_template.replace('{{ Content }}', content_parent_node_html)
-    # fixing paths for native deploying
-    if basepath:
-        html_template = html_template.replace('href="', f'href="{basepath}')
-        html_template = html_template.replace('src="', f'src="{basepath}')
 
+# template values are streamed straight into the output file
+# the page is rendered into a temporary file next to dest_path that replaces it once complete,
+# a render error part-way leaves the previous page in place instead of a truncated one
+def write_page(dest_path, template, **values):
     dest_parent_dir = os.path.abspath(os.path.join(dest_path, os.pardir))
     if not os.path.exists(dest_parent_dir):
-        os.mkdir(dest_parent_dir)
-    with open(dest_path, 'w') as f:
-        f.write(html_template)
+        os.makedirs(dest_parent_dir, exist_ok=True)
+    tmp_path = f'{dest_path}.{os.getpid()}.tmp'
+    try:
+        if PROFILER.enabled:
+            # streaming mixes rendering into writing, profiled builds render first to time them apart
+            with PROFILER.stage('template_render'):
+                html = template.render(**values)
+            with PROFILER.stage('write'):
+                with open(tmp_path, 'w') as f:
+                    f.write(html)
+        else:
+            with open(tmp_path, 'w') as f:
+                template.render_to(f, **values)
+        os.replace(tmp_path, dest_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+# template is the compiled template_path shared by a whole build, compiled here when not given,
+# with site_index given the page's title, url and front matter are recorded in it
+def generate_page(from_path, template_path, dest_path, basepath, manifest=None, template=None, cache=None,
+                  site_index=None):
+    if is_fresh_page(from_path, dest_path, manifest, site_index):
+        skip_page(from_path, manifest, site_index)
+        return
+
+    print(f'Generating page from {from_path} to {dest_path} using {template_path}')
+    if template is None:
+        template = Template.from_file(template_path, basepath)
+    if os.path.getsize(from_path) >= STREAM_THRESHOLD:
+        with open(from_path, 'r') as f:
+            metadata = read_front_matter(f)
+        if is_hidden_draft(metadata, site_index):
+            skip_draft(from_path, site_index)
+            return
+        with PROFILER.page(from_path):
+            title = generate_page_streamed(from_path, dest_path, template, cache)
+            terms = streamed_terms(from_path, title) if indexes_search(site_index) else None
+        if manifest is not None:
+            manifest.record(from_path, dest_path, file_text_hash(from_path))
+        if site_index is not None:
+            site_index.record(from_path, dest_path, title, metadata, terms)
+        return
+
+    with PROFILER.page(from_path):
+        with PROFILER.stage('read'):
+            with open(from_path, 'r') as f:
+                markdown_text = f.read()
+
+        metadata, body = split_front_matter(markdown_text)
+        if is_hidden_draft(metadata, site_index):
+            skip_draft(from_path, site_index)
+            return
+        # blocks are split once, title and body both come from the same document
+        document = Document(body)
+        content_title = page_title(metadata, document)
+        with PROFILER.stage('markdown_to_html'):
+            if cache is not None:
+                # cached html is a whole string already, nothing to stream
+                content = document.to_html(cache)
+            else:
+                content = document.html_node().iter_html()
+        if PROFILER.enabled and not isinstance(content, str):
+            with PROFILER.stage('to_html'):
+                content = ''.join(content)
+
+        write_page(dest_path, template, Title=content_title, Content=content)
+        terms = None
+        if indexes_search(site_index):
+            with PROFILER.stage('search_terms'):
+                terms = page_terms(content_title, document.blocks, document.block_types)
 
+    if manifest is not None:
+        manifest.record(from_path, dest_path, text_hash(markdown_text))
+    if site_index is not None:
+        site_index.record(from_path, dest_path, content_title, metadata, terms)
+
+
+# the file is read twice, once up to the title, then block by block while the page is written,
+# so a huge page never is in memory as a whole, returns the title
+def generate_page_streamed(from_path, dest_path, template, cache=None):
+    with open(from_path, 'r') as f:
+        metadata = read_front_matter(f)
+        body_start = f.tell()
+        title = str(metadata['title']) if metadata.get('title') else title_from_blocks(iter_blocks(f))
+        if not title:
+            raise ValueError(f'No h1 title provided in: {from_path}')
+        f.seek(body_start)
+        write_page(dest_path, template, Title=title, Content=markdown_file_to_html(f, cache))
+    return title
 
-def generate_pages_recursive(dir_path_content, template_path, dest_dir_path, basepath):
+
+# search terms of a streamed page, one more pass over the file a block at a time
+def streamed_terms(from_path, title):
+    with open(from_path, 'r') as f:
+        read_front_matter(f)
+        return page_terms(title, iter_blocks(f))
+
+
+# with manifest given, pages whose source, template and basepath didn't change are skipped
+def generate_pages_recursive(dir_path_content, template_path, dest_dir_path, basepath, manifest=None, template=None,
+                             cache=None, site_index=None):
     if not os.path.exists(dir_path_content):
         raise ValueError(f'Content dir doesnt exists in generate_pages_recursive(): {dir_path_content}')
+    if template is None:
+        template = Template.from_file(template_path, basepath)
 
     if not os.path.exists(dest_dir_path):
         os.mkdir(dest_dir_path)
@@ -53,7 +249,151 @@ def generate_pages_recursive(dir_path_content, template_path, dest_dir_path, bas
         dest_path = os.path.join(dest_dir_path, file)
         if os.path.isfile(file_path):
             dest_path = dest_path.replace('.md', '.html')
-            generate_page(file_path, template_path, dest_path, basepath)
+            generate_page(file_path, template_path, dest_path, basepath, manifest, template, cache, site_index)
+        elif os.path.isdir(file_path):
+            generate_pages_recursive(file_path, template_path, dest_path, basepath, manifest, template, cache,
+                                     site_index)
+
+
+def dest_path_for(from_path, dir_path_content, dest_dir_path):
+    dest_path = os.path.join(dest_dir_path, os.path.relpath(from_path, dir_path_content))
+    return dest_path.replace('.md', '.html')
+
+
+# (source, destination) pairs of the whole content tree, sorted so parallel builds log in a stable order
+def collect_pages(dir_path_content, dest_dir_path):
+    pages = []
+    for file in sorted(os.listdir(dir_path_content)):
+        file_path = os.path.join(dir_path_content, file)
+        dest_path = os.path.join(dest_dir_path, file)
+        if os.path.isfile(file_path):
+            pages.append((file_path, dest_path.replace('.md', '.html')))
         elif os.path.isdir(file_path):
-            generate_pages_recursive(file_path, template_path, dest_path, basepath)
-        
\ No newline at end of file
+            pages.extend(collect_pages(file_path, dest_path))
+    return pages
+
+
+# render cache of the current worker process, made by init_worker()
+worker_cache = None
+worker_hides_drafts = True
+worker_indexes_search = False
+
+
+def init_worker(cache_settings, profile=False, hide_drafts=True, image_info=None, index_search=False):
+    global worker_cache, worker_hides_drafts, worker_indexes_search
+    if cache_settings is not None:
+        worker_cache = RenderCache(*cache_settings)
+    if profile:
+        PROFILER.enable()
+    worker_hides_drafts = hide_drafts
+    if image_info is not None:
+        use_image_info(image_info)
+    worker_indexes_search = index_search
+
+
+# runs in worker processes, everything except the template work which is cheap and stays in the parent,
+# title is None for drafts which aren't written, search terms are None unless the worker indexes them,
+# markdown_text is read here when the caller didn't read it already
+def convert_page(from_path, markdown_text=None):
+    try:
+        title = content_html = terms = None
+        with PROFILER.page(from_path):
+            if markdown_text is None:
+                with PROFILER.stage('read'):
+                    with open(from_path, 'r') as f:
+                        markdown_text = f.read()
+            counts = worker_cache.counts() if worker_cache is not None else None
+            metadata, body = split_front_matter(markdown_text)
+            if not (worker_hides_drafts and metadata.get('draft')):
+                document = Document(body)
+                title = page_title(metadata, document)
+                with PROFILER.stage('markdown_to_html'):
+                    if worker_cache is not None:
+                        content_html = document.to_html(worker_cache)
+                    else:
+                        content_node = document.html_node()
+                if worker_cache is None:
+                    with PROFILER.stage('to_html'):
+                        content_html = content_node.to_html()
+                if worker_indexes_search:
+                    with PROFILER.stage('search_terms'):
+                        terms = page_terms(title, document.blocks, document.block_types)
+        # cache counters and profiler stats live in the worker, the parent adds them up
+        if worker_cache is not None:
+            counts = worker_cache.counts_since(counts)
+        page_stats = PROFILER.pop_page(from_path)
+        return title, content_html, text_hash(markdown_text), metadata, terms, counts, page_stats
+    except Exception as e:
+        raise ValueError(f'Failed to generate page from {from_path}: {e}') from e
+
+
+# pages of collect_pages() that have to be generated, fresh ones are skipped here
+def stale_pages(pages, manifest, site_index):
+    if manifest is None:
+        return pages
+    stale = []
+    for from_path, dest_path in pages:
+        if is_fresh_page(from_path, dest_path, manifest, site_index):
+            skip_page(from_path, manifest, site_index)
+        else:
+            stale.append((from_path, dest_path))
+    return stale
+
+
+# big pages would be sent back from workers as whole strings, they are streamed here instead,
+# returns the pages left for the workers
+def stream_large_pages(pages, template_path, basepath, manifest, template, cache, site_index):
+    small_pages = []
+    for from_path, dest_path in pages:
+        if os.path.getsize(from_path) >= STREAM_THRESHOLD:
+            generate_page(from_path, template_path, dest_path, basepath, manifest, template, cache, site_index)
+        else:
+            small_pages.append((from_path, dest_path))
+    return small_pages
+
+
+# every worker gets its own cache with the same settings (and the same disk store)
+def worker_initargs(cache, site_index):
+    cache_settings = cache.settings if cache is not None else None
+    return (cache_settings, PROFILER.enabled, site_index is None or not site_index.drafts, current_image_info(),
+            indexes_search(site_index))
+
+
+def generate_pages_parallel(dir_path_content, template_path, dest_dir_path, basepath, workers=None, manifest=None,
+                            cache=None, site_index=None, template=None):
+    if not os.path.exists(dir_path_content):
+        raise ValueError(f'Content dir doesnt exists in generate_pages_parallel(): {dir_path_content}')
+
+    pages = stale_pages(collect_pages(dir_path_content, dest_dir_path), manifest, site_index)
+    if not os.path.exists(dest_dir_path):
+        os.mkdir(dest_dir_path)
+    if not pages:
+        return
+
+    if template is None:
+        template = Template.from_file(template_path, basepath)
+    pages = stream_large_pages(pages, template_path, basepath, manifest, template, cache, site_index)
+    if not pages:
+        return
+
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(pages) // (workers * 4))
+    initargs = worker_initargs(cache, site_index)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=initargs) as executor:
+        # map() yields in submission order, so logs and failures are the same on every run
+        results = executor.map(convert_page, [from_path for from_path, _ in pages], chunksize=chunksize)
+        for (from_path, dest_path), result in zip(pages, results):
+            title, content_html, content_hash, metadata, terms, counts, page_stats = result
+            print(f'Generating page from {from_path} to {dest_path} using {template_path}')
+            if counts is not None:
+                cache.add_counts(counts)
+            if title is None:
+                skip_draft(from_path, site_index)
+                continue
+            PROFILER.merge_page(from_path, page_stats)
+            with PROFILER.page(from_path):
+                write_page(dest_path, template, Title=title, Content=content_html)
+            if manifest is not None:
+                manifest.record(from_path, dest_path, content_hash)
+            if site_index is not None:
+                site_index.record(from_path, dest_path, title, metadata, terms)
@@ -0,0 +1,221 @@
+import os
+import json
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from copy_dir import file_digest, place_file
+from files import write_json
+from assets import FINGERPRINT_LENGTH, url_for_path
+from inline import TEXT_NODE_RENDERERS, register_text_type
+from nodes import LeafNode, TextType
+
+# resized webp variants need Pillow, without it images only get their dimensions
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+DEFAULT_WIDTHS = (480, 960)
+WEBP_QUALITY = 80
+
+# {url: {'width', 'height', 'srcset': [[url, width], ...]}} the IMAGE renderer reads, set by use_image_info()
+IMAGE_INFO = {}
+DEFAULT_IMAGE_RENDERER = TEXT_NODE_RENDERERS[TextType.IMAGE]
+
+
+# (width, height) read from the file header, enough for png and gif without Pillow
+def image_dimensions(path):
+    with open(path, 'rb') as f:
+        header = f.read(26)
+    if header[:8] == b'\x89PNG\r\n\x1a\n' and header[12:16] == b'IHDR':
+        return struct.unpack('>II', header[16:24])
+    if header[:6] in (b'GIF87a', b'GIF89a'):
+        return struct.unpack('<HH', header[6:10])
+    if Image is not None:
+        with Image.open(path) as image:
+            return image.size
+    return None
+
+
+# runs in worker processes, resized webp copies land in variants_dir named after the source hash,
+# so they're made once per image content no matter how many builds or output dirs use them
+def process_image(source_file, digest, widths, variants_dir):
+    dimensions = image_dimensions(source_file)
+    if dimensions is None or Image is None:
+        return dimensions, []
+
+    width, height = dimensions
+    variant_widths = sorted({w for w in widths if w < width} | {width})
+    variants = []
+    for variant_width in variant_widths:
+        cached_path = os.path.join(variants_dir, f'{digest}-{variant_width}.webp')
+        if not os.path.exists(cached_path):
+            os.makedirs(variants_dir, exist_ok=True)
+            with Image.open(source_file) as image:
+                image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+                if variant_width != width:
+                    image = image.resize((variant_width, max(1, round(height * variant_width / width))),
+                                         Image.LANCZOS)
+                tmp_path = f'{cached_path}.{os.getpid()}.tmp'
+                image.save(tmp_path, 'WEBP', quality=WEBP_QUALITY)
+                os.replace(tmp_path, cached_path)
+        variants.append((cached_path, variant_width))
+    return dimensions, variants
+
+
+def variant_path(rel_path, digest, width):
+    root, _ = os.path.splitext(rel_path)
+    return f'{root}.{digest[:FINGERPRINT_LENGTH]}.{width}w.webp'
+
+
+class ImagePipeline:
+    # dimensions and resized webp variants of every image in static_dir, variants are placed into dest_dir,
+    # results are kept in state_path and only redone for images whose size/mtime changed
+    def __init__(self, static_dir, dest_dir, state_path, variants_dir, widths=DEFAULT_WIDTHS, workers=1,
+                 link_mode='copy'):
+        self.static_dir = static_dir
+        self.dest_dir = dest_dir
+        self.state_path = state_path
+        self.variants_dir = variants_dir
+        self.widths = list(widths)
+        self.workers = workers
+        self.link_mode = link_mode
+        self.files = {}
+        self.processed = 0
+        self.placed = 0
+        self.removed = 0
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.state_path):
+            return
+        with open(self.state_path, 'r') as f:
+            data = json.load(f)
+        # other widths or Pillow (un)installed, every image is processed again
+        if data.get('settings') == self.settings():
+            self.files = data.get('files', {})
+
+    def settings(self):
+        return {'widths': self.widths, 'pillow': Image is not None}
+
+    def collect_images(self):
+        images = []
+        if not os.path.isdir(self.static_dir):
+            return images
+        for dir_path, _, file_names in os.walk(self.static_dir):
+            for file in sorted(file_names):
+                if file.lower().endswith(IMAGE_EXTENSIONS):
+                    source_file = os.path.join(dir_path, file)
+                    images.append((os.path.relpath(source_file, self.static_dir), source_file))
+        return sorted(images)
+
+    def is_fresh(self, rel_path, source_file):
+        entry = self.files.get(rel_path)
+        if entry is None:
+            return False
+        stat = os.stat(source_file)
+        if entry['size'] != stat.st_size or entry['mtime'] != stat.st_mtime_ns:
+            return False
+        # variants live in a cache dir that may have been cleared
+        return all(os.path.exists(os.path.join(self.variants_dir, f'{entry["hash"]}-{width}.webp'))
+                   for _, width in entry['variants'])
+
+    def run(self):
+        images = self.collect_images()
+        stale = [(rel_path, source_file) for rel_path, source_file in images if not self.is_fresh(rel_path, source_file)]
+        digests = [file_digest(source_file) for _, source_file in stale]
+        args = ([source_file for _, source_file in stale], digests, [self.widths] * len(stale),
+                [self.variants_dir] * len(stale))
+        if self.workers == 1 or len(stale) < 2:
+            results = list(map(process_image, *args))
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers or None) as executor:
+                results = list(executor.map(process_image, *args))
+
+        for (rel_path, source_file), digest, (dimensions, variants) in zip(stale, digests, results):
+            self.remove_variants(self.files.get(rel_path))
+            stat = os.stat(source_file)
+            self.files[rel_path] = {
+                'size': stat.st_size,
+                'mtime': stat.st_mtime_ns,
+                'hash': digest,
+                'dimensions': list(dimensions) if dimensions else None,
+                'variants': [[variant_path(rel_path, digest, width), width] for _, width in variants],
+            }
+            self.processed += 1
+
+        seen = {rel_path for rel_path, _ in images}
+        for rel_path in list(self.files):
+            if rel_path not in seen:
+                self.remove_variants(self.files.pop(rel_path))
+        self.place_variants()
+        return self.image_info()
+
+    # variants are copied out of the cache dir when the output dir doesn't have them (fresh or cleared)
+    def place_variants(self):
+        for entry in self.files.values():
+            for rel_path, width in entry['variants']:
+                destination_file = os.path.join(self.dest_dir, rel_path)
+                if not os.path.exists(destination_file):
+                    os.makedirs(os.path.dirname(destination_file), exist_ok=True)
+                    place_file(os.path.join(self.variants_dir, f'{entry["hash"]}-{width}.webp'), destination_file,
+                               self.link_mode)
+                    self.placed += 1
+
+    def remove_variants(self, entry):
+        if entry is None:
+            return
+        for rel_path, _ in entry['variants']:
+            destination_file = os.path.join(self.dest_dir, rel_path)
+            if os.path.exists(destination_file):
+                os.remove(destination_file)
+                self.removed += 1
+
+    def image_info(self):
+        info = {}
+        for rel_path, entry in sorted(self.files.items()):
+            if entry['dimensions'] is None:
+                continue
+            info[url_for_path(rel_path)] = {
+                'width': entry['dimensions'][0],
+                'height': entry['dimensions'][1],
+                'srcset': [[url_for_path(variant), width] for variant, width in entry['variants']],
+            }
+        return info
+
+    def save(self):
+        write_json(self.state_path, {'settings': self.settings(), 'files': self.files})
+
+    def summary(self):
+        return (f'Images: {len(self.files)} known, processed {self.processed}, placed {self.placed} variants, '
+                f'removed {self.removed}' + ('' if Image is not None else ' (no Pillow, dimensions only)'))
+
+
+# img tags get width/height against layout shift, loading="lazy" and a srcset of the webp variants
+def render_image(text_node):
+    props = {'src': text_node.url, 'alt': text_node.text}
+    info = IMAGE_INFO.get(text_node.url)
+    if info is not None:
+        props['width'] = info['width']
+        props['height'] = info['height']
+        if info['srcset']:
+            props['srcset'] = ', '.join(f'{url} {width}w' for url, width in info['srcset'])
+    props['loading'] = 'lazy'
+    return LeafNode('img', text_node.text, props)
+
+
+# image_info None brings the plain <img src alt> back
+def use_image_info(image_info):
+    IMAGE_INFO.clear()
+    if image_info is None:
+        register_text_type(TextType.IMAGE, DEFAULT_IMAGE_RENDERER)
+        return
+    IMAGE_INFO.update(image_info)
+    register_text_type(TextType.IMAGE, render_image)
+
+
+# what use_image_info() set, None while images render the plain way, worker processes get it from the parent
+def current_image_info():
+    if TEXT_NODE_RENDERERS.get(TextType.IMAGE) is not render_image:
+        return None
+    return dict(IMAGE_INFO)
@@ -1,21 +1,62 @@
 from __future__ import annotations
 import re
-from nodes import TextType, TextNode, LeafNode
+import string
+import unicodedata
+from nodes import TextType, TextNode, LeafNode, ParentNode
+from profiling import profiled
 
 
+# text type -> function turning a TextNode into an html node
+TEXT_NODE_RENDERERS = {
+    TextType.TEXT: lambda text_node: LeafNode(tag=None, value=text_node.text, props=None),
+    TextType.BOLD: lambda text_node: LeafNode('b', text_node.text),
+    TextType.ITALIC: lambda text_node: LeafNode('i', text_node.text),
+    TextType.CODE: lambda text_node: LeafNode('code', text_node.text),
+    TextType.LINK: lambda text_node: LeafNode('a', text_node.text, {'href': text_node.url}),
+    TextType.IMAGE: lambda text_node: LeafNode('img', text_node.text, {'src': text_node.url, 'alt': text_node.text}),
+}
+
+
+# text_type can be anything hashable, registering an existing one replaces its renderer
+def register_text_type(text_type, renderer):
+    TEXT_NODE_RENDERERS[text_type] = renderer
+
+
+def text_node_to_leaf_node(text_node):
+    renderer = TEXT_NODE_RENDERERS.get(text_node.text_type)
+    if renderer is None:
+        raise ValueError(f'Invalid TextType in text_node_to_html_node(): {text_node.text_type}')
+    return renderer(text_node)
+
+
+# a text node with children becomes a ParentNode with the tag and props its renderer gives,
+# nested spans are converted with an explicit stack since odd input can nest them thousands deep
 def text_node_to_html_node(text_node):
-    if text_node.text_type == TextType.TEXT:
-        return LeafNode(tag=None, value=text_node.text, props=None)
-    elif text_node.text_type == TextType.BOLD:
-        return LeafNode('b', text_node.text)
-    elif text_node.text_type == TextType.ITALIC:
-        return LeafNode('i', text_node.text)
-    elif text_node.text_type == TextType.CODE:
-        return LeafNode('code', text_node.text)
-    elif text_node.text_type == TextType.LINK:
-        return LeafNode('a', text_node.text, {'href': text_node.url})
-    elif text_node.text_type == TextType.IMAGE:
-        return LeafNode('img', text_node.text, {'src': text_node.url, 'alt': text_node.text})
+    html_node = text_node_to_leaf_node(text_node)
+    if not text_node.children:
+        return html_node
+    root = ParentNode(html_node.tag, [], html_node.props)
+    stack = [(text_node.children, root)]
+    while stack:
+        children, parent = stack.pop()
+        for child in children:
+            child_html = text_node_to_leaf_node(child)
+            if child.children:
+                child_html = ParentNode(child_html.tag, [], child_html.props)
+                stack.append((child.children, child_html))
+            parent.children.append(child_html)
+    return root
+
+
+# plain text of nodes, nested ones included, in document order
+def iter_plain_text(text_nodes):
+    stack = list(reversed(text_nodes))
+    while stack:
+        text_node = stack.pop()
+        if text_node.children:
+            stack.extend(reversed(text_node.children))
+        elif text_node.text:
+            yield text_node.text
 
 
 def split_nodes_delimiter(old_nodes: List[TextNode], delimiter: str, text_type: TextType):
@@ -41,133 +82,73 @@ def split_nodes_delimiter(old_nodes: List[TextNode], delimiter: str, text_type:
     return splitted_nodes
 
 
-def extract_markdown_images(text):
-    markdown_image_pattern = r'\!{1}\[[a-zA-Z0-9."\'\-\_ ]+\]\((?:https?:\/\/|\/)[a-zA-Z0-9./@\'"\-\_]+\)'
-    images = re.findall(markdown_image_pattern, text)
-    text_url_tuples = []
-    for img in images:
-        txt, url = img.split(']')
-        txt = txt[2:]
-        url = url[1:-1]
-        text_url_tuples.append((txt, url))
+# link text: anything but brackets and new lines, plus one level of balanced [] inside (like [array[0]](/docs)),
+# the two alternatives start with different characters, so there is nothing to backtrack into
+MARKDOWN_LINK_TEXT = r'((?:[^\[\]\n]|\[[^\[\]\n]*\])+)'
+# url: absolute, root-relative or fragment, with query strings and fragments, up to the closing parenthesis
+MARKDOWN_URL = r'((?:https?://|/|#)[^\s()<>"]*)'
+MARKDOWN_IMAGE_PATTERN = r'!\[' + MARKDOWN_LINK_TEXT + r'\]\(' + MARKDOWN_URL + r'\)'
+# without negative lookbehind seems impossible
+MARKDOWN_LINK_PATTERN = r'(?<!!)\[' + MARKDOWN_LINK_TEXT + r'\]\(' + MARKDOWN_URL + r'\)'
 
-    return text_url_tuples
+# compiled once for the whole module, for image and link group 1 is the text and group 2 the url
+INLINE_PATTERNS = {
+    'image': re.compile(MARKDOWN_IMAGE_PATTERN),
+    'link': re.compile(MARKDOWN_LINK_PATTERN),
+    # everything scan_inline() has to stop at, the rest is copied as plain text
+    'marker': re.compile(r'\*\*|[_`!\[]'),
+    # same for parse_inline(), delimiter and backtick runs are taken whole; the lookahead lets the regex
+    # engine skip plain text by first character instead of trying every alternative at each position
+    'token': re.compile(r'(?=[*_`!\[])(?:\*+|_+|`+|!?\[)'),
+    'span_marker': re.compile(r'[*_`]'),
+    'backticks': re.compile(r'`+'),
+}
+
+
+def extract_markdown_images(text):
+    return INLINE_PATTERNS['image'].findall(text)
 
 
-# without negative lookbehind seems impossible
 def extract_markdown_links(text):
-    markdown_link_pattern = r'(?<!!)\[[a-zA-Z0-9."\'\-\_ ]+\]\((?:https?:\/\/|\/)[a-zA-Z0-9./@\'"\-\_]+\)'
-    links = re.findall(markdown_link_pattern, text)
-    text_link_tuples = []
-    for link_ in links:
-        txt, link = link_.split(']')
-        txt = txt[1:]
-        link = link[1:-1]
-        text_link_tuples.append((txt, link))
-    
-    return text_link_tuples
-
-
-# helpers for split_nodes_image() and split_nodes_link()
-def flatten_list(lst):
-    flatten = []
-    for e in lst:
-        if type(e) == list:
-            for item in e:
-                flatten.append(item)
-        else:
-            flatten.append(e)
-    return flatten
+    return INLINE_PATTERNS['link'].findall(text)
 
 
-def split_nodes_image(old_nodes):
+# helper for split_nodes_image() and split_nodes_link(): one finditer() pass, text between
+# match spans becomes TEXT nodes, so the work is linear in text length however many links there are
+def split_nodes_regex(old_nodes, regex, text_type):
     new_nodes = []
     for node in old_nodes:
         if node.text_type != TextType.TEXT:
             new_nodes.append(node)
             continue
-        
-        matched_images = extract_markdown_images(node.text)
-        if not matched_images:
+
+        pos = 0
+        matched = False
+        for match in regex.finditer(node.text):
+            matched = True
+            if match.start() > pos:
+                new_nodes.append(TextNode(node.text[pos:match.start()], TextType.TEXT))
+            new_nodes.append(TextNode(match.group(1), text_type, match.group(2)))
+            pos = match.end()
+
+        if not matched:
             new_nodes.append(node)
-            continue
-        splitted_text = []
-        delimiters = []
-        for img in matched_images:
-            delimiter = f'![{img[0]}]({img[1]})'
-            delimiters.append(delimiter)
-            if not splitted_text:
-                splt_texts = node.text.split(delimiter, 1)
-                splt_texts.insert(1, delimiter)
-                splitted_text.extend(splt_texts)
-            else:
-                for i, text in enumerate(splitted_text):
-                    if not delimiter in text:
-                        continue
-                    splt_texts = text.split(delimiter, 1)
-                    splt_texts.insert(1, delimiter)
-                    splitted_text[i] = splt_texts
-                    splitted_text = flatten_list(splitted_text)
-        
-        curr_img_idx = 0
-        for text in splitted_text:
-            if not text: 
-                continue
-            if text in delimiters:
-                img_text = matched_images[curr_img_idx][0]
-                img_url = matched_images[curr_img_idx][1]
-                new_nodes.append(TextNode(img_text, TextType.IMAGE, img_url))
-                curr_img_idx += 1
-            else:
-                new_nodes.append(TextNode(text, TextType.TEXT))
+        elif pos < len(node.text):
+            new_nodes.append(TextNode(node.text[pos:], TextType.TEXT))
 
     return new_nodes
 
 
-def split_nodes_link(old_nodes):
-    new_nodes = []
-    for node in old_nodes:
-        if node.text_type != TextType.TEXT:
-            new_nodes.append(node)
-            continue
-        matched_links = extract_markdown_links(node.text)
-        if not matched_links:
-            new_nodes.append(node)
-            continue
-        splitted_text = []
-        delimiters = []
-        for link in matched_links:
-            delimiter = f'[{link[0]}]({link[1]})'
-            delimiters.append(delimiter)
-            if not splitted_text:
-                splt_texts = node.text.split(delimiter, 1)
-                splt_texts.insert(1, delimiter)
-                splitted_text.extend(splt_texts)
-            else:
-                for i, text in enumerate(splitted_text):
-                    if not delimiter in text:
-                        continue
-                    splt_texts = text.split(delimiter, 1)
-                    splt_texts.insert(1, delimiter)
-                    splitted_text[i] = splt_texts
-                    splitted_text = flatten_list(splitted_text)
-        
-        curr_link_idx = 0
-        for text in splitted_text:
-            if not text: 
-                continue
-            if text in delimiters:
-                link_text = matched_links[curr_link_idx][0]
-                link_url = matched_links[curr_link_idx][1]
-                new_nodes.append(TextNode(link_text, TextType.LINK, link_url))
-                curr_link_idx += 1
-            else:
-                new_nodes.append(TextNode(text, TextType.TEXT))
+def split_nodes_image(old_nodes):
+    return split_nodes_regex(old_nodes, INLINE_PATTERNS['image'], TextType.IMAGE)
 
-    return new_nodes
+
+def split_nodes_link(old_nodes):
+    return split_nodes_regex(old_nodes, INLINE_PATTERNS['link'], TextType.LINK)
 
 
-def text_to_textnodes(text):
+# old path: one full pass over all nodes per delimiter, kept for comparison with scan_inline()
+def text_to_textnodes_chained(text):
     start_node = TextNode(text, TextType.TEXT)
     new_nodes = split_nodes_delimiter([start_node], '**', TextType.BOLD)
     new_nodes = split_nodes_delimiter(new_nodes, '_', TextType.ITALIC)
@@ -177,3 +158,265 @@ def text_to_textnodes(text):
 
     return new_nodes
 
+
+INLINE_DELIMITERS = {'**': TextType.BOLD, '_': TextType.ITALIC, '`': TextType.CODE}
+
+
+def scan_inline(text):
+    # single left-to-right walk producing the same nodes as the chained splits,
+    # contents of delimited spans, images and links are taken as is (so `_code_` stays code)
+    if not text:
+        return [TextNode(text, TextType.TEXT)]
+    new_nodes = []
+    plain_start = 0
+    pos = 0
+    while True:
+        marker_match = INLINE_PATTERNS['marker'].search(text, pos)
+        if marker_match is None:
+            break
+        marker = marker_match.group(0)
+        start = marker_match.start()
+
+        if marker in INLINE_DELIMITERS:
+            inner_start = start + len(marker)
+            end = text.find(marker, inner_start)
+            if end == -1:
+                raise ValueError(f'Wrong amount of delimiters: {marker} in {text}')
+            if start > plain_start:
+                new_nodes.append(TextNode(text[plain_start:start], TextType.TEXT))
+            if end > inner_start:
+                new_nodes.append(TextNode(text[inner_start:end], INLINE_DELIMITERS[marker]))
+            pos = plain_start = end + len(marker)
+            continue
+
+        if marker == '!':
+            text_type, node_match = TextType.IMAGE, INLINE_PATTERNS['image'].match(text, start)
+        else:
+            text_type, node_match = TextType.LINK, INLINE_PATTERNS['link'].match(text, start)
+        if node_match is None:
+            pos = start + 1
+            continue
+        if start > plain_start:
+            new_nodes.append(TextNode(text[plain_start:start], TextType.TEXT))
+        new_nodes.append(TextNode(node_match.group(1), text_type, node_match.group(2)))
+        pos = plain_start = node_match.end()
+
+    if plain_start < len(text):
+        new_nodes.append(TextNode(text[plain_start:], TextType.TEXT))
+    return new_nodes
+
+
+ASCII_PUNCTUATION = frozenset(string.punctuation)
+# one character of a matched run emphasizes, two strongly
+EMPHASIS_TYPES = {1: TextType.ITALIC, 2: TextType.BOLD}
+
+
+def is_punctuation(char):
+    return char in ASCII_PUNCTUATION or (not char.isascii() and unicodedata.category(char)[0] in 'PS')
+
+
+class Delimiter:
+    # run of * or _ that can open and/or close emphasis, index is where its text node is in the node list
+    __slots__ = ('index', 'char', 'count', 'length', 'can_open', 'can_close')
+
+    def __init__(self, char, length, can_open, can_close):
+        self.index = None
+        self.char = char
+        self.count = length
+        self.length = length
+        self.can_open = can_open
+        self.can_close = can_close
+
+
+# (can_open, can_close) of the run text[start:end], CommonMark flanking rules, start and end of text count as spaces,
+# an _ inside a word (snake_case) can do neither
+def delimiter_flanking(text, start, end):
+    before = text[start - 1] if start > 0 else ' '
+    after = text[end] if end < len(text) else ' '
+    left = not after.isspace() and (not is_punctuation(after) or before.isspace() or is_punctuation(before))
+    right = not before.isspace() and (not is_punctuation(before) or after.isspace() or is_punctuation(after))
+    if text[start] == '*':
+        return left, right
+    return left and (not right or is_punctuation(before)), right and (not left or is_punctuation(after))
+
+
+# adjacent TEXT nodes become one, pieces of unmatched delimiter runs are TEXT nodes of their own until here
+def merge_text_nodes(text_nodes):
+    merged = []
+    texts = []
+    for text_node in text_nodes:
+        if text_node.text_type == TextType.TEXT:
+            texts.append(text_node.text)
+            continue
+        if texts:
+            merged.append(TextNode(''.join(texts), TextType.TEXT))
+            texts = []
+        merged.append(text_node)
+    if texts:
+        merged.append(TextNode(''.join(texts), TextType.TEXT))
+    return merged
+
+
+# a span of only plain text stays a flat TextNode like before, anything else gets children
+def span_node(children, text_type, url=None):
+    children = merge_text_nodes(children)
+    if len(children) == 1 and children[0].text_type == TextType.TEXT:
+        return TextNode(children[0].text, text_type, url)
+    return TextNode(None, text_type, url, children)
+
+
+class BacktickRuns:
+    # start positions of every backtick run of text by run length, a code span closes at the next run
+    # of the same length, lookups only move forward, so all of them together are linear
+    def __init__(self, text):
+        self.runs = {}
+        for match in INLINE_PATTERNS['backticks'].finditer(text):
+            self.runs.setdefault(len(match.group(0)), []).append(match.start())
+        self.positions = {length: 0 for length in self.runs}
+
+    def closing(self, length, after):
+        runs = self.runs[length]
+        i = self.positions[length]
+        while i < len(runs) and runs[i] < after:
+            i += 1
+        self.positions[length] = i
+        return runs[i] if i < len(runs) else -1
+
+
+def parse_inline(text):
+    # CommonMark style inline parsing in one left-to-right walk: code spans, images and links are taken as
+    # they come, runs of * and _ that can open go on a delimiter stack and every run that can close is paired
+    # with an opener below it right away (close_emphasis()), runs that don't pair stay text, so any input
+    # parses and the work is linear in its length
+    if not text:
+        return [TextNode(text, TextType.TEXT)]
+    nodes = []
+    openers = []
+    openers_bottom = {}
+    backtick_runs = None
+    has_delimiters = False
+    plain_start = 0
+    pos = 0
+    while True:
+        token_match = INLINE_PATTERNS['token'].search(text, pos)
+        if token_match is None:
+            break
+        token = token_match.group(0)
+        start, end = token_match.span()
+        char = token[0]
+
+        if char in '*_':
+            can_open, can_close = delimiter_flanking(text, start, end)
+            pos = end
+            if not (can_open or can_close):
+                continue
+            if start > plain_start:
+                nodes.append(TextNode(text[plain_start:start], TextType.TEXT))
+            plain_start = end
+            has_delimiters = True
+            delimiter = Delimiter(char, len(token), can_open, can_close)
+            if can_close and openers:
+                close_emphasis(nodes, openers, openers_bottom, delimiter)
+            if delimiter.count:
+                delimiter.index = len(nodes)
+                nodes.append(TextNode(char * delimiter.count, TextType.TEXT))
+                if can_open:
+                    openers.append(delimiter)
+            continue
+
+        if char == '`':
+            if backtick_runs is None:
+                backtick_runs = BacktickRuns(text)
+            close = backtick_runs.closing(len(token), end)
+            # without a closing run of the same length the backticks are text
+            if close == -1:
+                pos = end
+                continue
+            if start > plain_start:
+                nodes.append(TextNode(text[plain_start:start], TextType.TEXT))
+            nodes.append(TextNode(text[end:close], TextType.CODE))
+            pos = plain_start = close + len(token)
+            continue
+
+        if token == '![':
+            text_type, node_match = TextType.IMAGE, INLINE_PATTERNS['image'].match(text, start)
+        else:
+            text_type, node_match = TextType.LINK, INLINE_PATTERNS['link'].match(text, start)
+        # links can't hold links (CommonMark), the inner one wins and the outer brackets stay text
+        if node_match is None or (text_type == TextType.LINK and INLINE_PATTERNS['link'].search(node_match.group(1))):
+            pos = start + 1
+            continue
+        if start > plain_start:
+            nodes.append(TextNode(text[plain_start:start], TextType.TEXT))
+        link_text = node_match.group(1)
+        if text_type == TextType.LINK and INLINE_PATTERNS['span_marker'].search(link_text):
+            # the link text has no link in it, so this nests one level at most
+            nodes.append(span_node(parse_inline(link_text), text_type, node_match.group(2)))
+        else:
+            nodes.append(TextNode(link_text, text_type, node_match.group(2)))
+        pos = plain_start = node_match.end()
+
+    if plain_start < len(text):
+        nodes.append(TextNode(text[plain_start:], TextType.TEXT))
+    # pieces of unpaired runs are text nodes of their own until here
+    return merge_text_nodes(nodes) if has_delimiters else nodes
+
+
+# CommonMark's rule of 3: with a run that can both open and close, lengths adding up to a multiple of 3
+# don't pair (so *foo**bar* stays one emphasis) unless both are multiples of 3
+def is_odd_match(opener, closer):
+    if not (opener.can_close or closer.can_open):
+        return False
+    return (opener.length + closer.length) % 3 == 0 and not (opener.length % 3 == 0 and closer.length % 3 == 0)
+
+
+# pairs the closer with the nearest matching opener, every node after the opener becomes a child of the new
+# span, openers above it are text inside the span now; openers only ever come off the top of the stack,
+# and openers_bottom keeps the stack height below which a kind of closer already found nothing,
+# so no opener is looked at twice for it
+def close_emphasis(nodes, openers, openers_bottom, closer):
+    while closer.count:
+        key = (closer.char, closer.can_open, closer.length % 3)
+        i = len(openers) - 1
+        bottom = openers_bottom.get(key, 0)
+        while i >= bottom:
+            opener = openers[i]
+            if opener.char == closer.char and not is_odd_match(opener, closer):
+                break
+            i -= 1
+        else:
+            openers_bottom[key] = len(openers)
+            return
+
+        # the characters next to the span are used, what is left of a run stays on its outer side
+        use = 2 if opener.count >= 2 and closer.count >= 2 else 1
+        opener.count -= use
+        closer.count -= use
+        children = nodes[opener.index + 1:]
+        del nodes[opener.index + 1:]
+        del openers[i + 1:]
+        if opener.count:
+            nodes[opener.index] = TextNode(opener.char * opener.count, TextType.TEXT)
+        else:
+            nodes.pop()
+            openers.pop()
+        nodes.append(span_node(children, EMPHASIS_TYPES[use]))
+        for other_key, height in openers_bottom.items():
+            if height > len(openers):
+                openers_bottom[other_key] = len(openers)
+
+
+# delimiter_stack: nested emphasis, never raises; scan and chained: flat spans only, unbalanced delimiters raise
+INLINE_PARSERS = {
+    'delimiter_stack': parse_inline,
+    'scan': scan_inline,
+    'chained': text_to_textnodes_chained,
+}
+
+
+@profiled('text_to_textnodes')
+def text_to_textnodes(text, parser='delimiter_stack'):
+    parse = INLINE_PARSERS.get(parser)
+    if parse is None:
+        raise ValueError(f'Invalid parser in text_to_textnodes(): {parser}')
+    return parse(text)
@@ -0,0 +1,173 @@
+import os
+import shutil
+from html import escape
+from nodes import LeafNode, ParentNode
+
+# number of newest posts in a feed
+FEED_SIZE = 20
+
+
+def section_entries(site_index, section):
+    prefix = f'/{section}/'
+    return [entry for entry in site_index.entries() if entry['url'].startswith(prefix) and entry['url'] != prefix]
+
+
+def paginate(entries, per_page):
+    return [entries[i:i + per_page] for i in range(0, len(entries), per_page)]
+
+
+# first page is the section's own index, the rest go to /section/page/<n>/
+def listing_url(section, page_number):
+    if page_number == 1:
+        return f'/{section}/'
+    return f'/{section}/page/{page_number}/'
+
+
+def listing_path(dest_dir, section, page_number):
+    return os.path.join(dest_dir, *listing_url(section, page_number).strip('/').split('/'), 'index.html')
+
+
+def listing_html(title, entries, section, page_number, page_count):
+    items = []
+    for entry in entries:
+        children = [LeafNode('a', escape(entry['title']), {'href': entry['url']})]
+        if entry['date']:
+            children.append(LeafNode(None, ' '))
+            children.append(LeafNode('time', entry['date'], {'datetime': entry['date']}))
+        items.append(ParentNode('li', children))
+
+    div_children = [LeafNode('h1', escape(title)), ParentNode('ul', items)]
+    nav_links = []
+    if page_number > 1:
+        nav_links.append(LeafNode('a', 'Newer posts', {'href': listing_url(section, page_number - 1)}))
+    if page_number < page_count:
+        nav_links.append(LeafNode('a', 'Older posts', {'href': listing_url(section, page_number + 1)}))
+    if nav_links:
+        div_children.append(ParentNode('nav', nav_links))
+    return ParentNode('div', div_children).to_html()
+
+
+# feed urls have to be absolute, base_url is the site url with basepath (no template rewrites the feed)
+def atom_feed(title, entries, base_url, section):
+    section_url = f'{base_url}/{section}/'
+    updated = max(entry_updated(entry) for entry in entries)
+    lines = [
+        '<?xml version="1.0" encoding="utf-8"?>',
+        '<feed xmlns="http://www.w3.org/2005/Atom">',
+        f'  <title>{escape(title)}</title>',
+        f'  <id>{escape(section_url)}</id>',
+        f'  <link href="{escape(section_url)}"/>',
+        f'  <link rel="self" href="{escape(section_url)}atom.xml"/>',
+        f'  <updated>{updated}T00:00:00Z</updated>',
+    ]
+    for entry in entries:
+        entry_url = base_url + entry['url']
+        lines.extend([
+            '  <entry>',
+            f'    <title>{escape(entry["title"])}</title>',
+            f'    <id>{escape(entry_url)}</id>',
+            f'    <link href="{escape(entry_url)}"/>',
+            f'    <updated>{entry_updated(entry)}T00:00:00Z</updated>',
+        ])
+        for tag in entry['tags']:
+            lines.append(f'    <category term="{escape(tag)}"/>')
+        lines.append('  </entry>')
+    lines.append('</feed>')
+    return '\n'.join(lines) + '\n'
+
+
+def entry_updated(entry):
+    return entry['date'] or entry['updated'] or '1970-01-01'
+
+
+# listings are cheap to render but rewriting them touches every listing on each build,
+# so a file is only written when its content changed, returns whether it was
+def write_if_changed(path, text):
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            if f.read() == text:
+                return False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+    return True
+
+
+class Listings:
+    # paginated index pages and an atom feed for every section (content/<section>/*),
+    # made from the SiteIndex filled during page generation, so posts are never read again;
+    # atom needs absolute urls, without a site_url there are no feeds
+    def __init__(self, sections, template, dest_dir, per_page=10, site_url='', basepath=''):
+        if per_page < 1:
+            raise ValueError(f'Invalid per_page in Listings(): {per_page}')
+        if site_url and not site_url.startswith(('http://', 'https://')):
+            raise ValueError(f'Invalid site_url in Listings(), it needs a scheme and host: {site_url}')
+        self.sections = sections
+        self.template = template
+        self.dest_dir = dest_dir
+        self.per_page = per_page
+        self.site_url = site_url.rstrip('/')
+        self.basepath = basepath
+        self.written = 0
+        self.unchanged = 0
+        self.removed = 0
+        # sections with a content page of their own at /section/, which always wins over the listing
+        self.skipped = set()
+
+    def generate(self, site_index):
+        for section in self.sections:
+            self.generate_section(site_index, section)
+
+    def generate_section(self, site_index, section):
+        if f'/{section}/' in [entry['url'] for entry in site_index.pages.values()]:
+            self.skipped.add(section)
+            return
+        self.skipped.discard(section)
+        entries = section_entries(site_index, section)
+        pages = paginate(entries, self.per_page)
+        section_title = section.replace('-', ' ').replace('_', ' ').capitalize()
+        for page_number, page_entries in enumerate(pages, 1):
+            title = section_title if page_number == 1 else f'{section_title}, page {page_number}'
+            content = listing_html(title, page_entries, section, page_number, len(pages))
+            html = self.template.render(Title=title, Content=content)
+            self.count(write_if_changed(listing_path(self.dest_dir, section, page_number), html))
+        self.remove_stale_pages(section, len(pages))
+
+        feed_path = os.path.join(self.dest_dir, section, 'atom.xml')
+        if entries and self.site_url:
+            feed = atom_feed(section_title, entries[:FEED_SIZE], f'{self.site_url}{self.basepath}', section)
+            self.count(write_if_changed(feed_path, feed))
+        else:
+            # feed of a build that had posts or a site url
+            self.remove_file(feed_path)
+
+    def count(self, written):
+        if written:
+            self.written += 1
+        else:
+            self.unchanged += 1
+
+    # pages left over from a build that had more posts, the first one too when there are none left
+    def remove_stale_pages(self, section, page_count):
+        if page_count == 0:
+            self.remove_file(listing_path(self.dest_dir, section, 1))
+        pages_dir = os.path.join(self.dest_dir, section, 'page')
+        if not os.path.isdir(pages_dir):
+            return
+        for name in os.listdir(pages_dir):
+            if name.isdigit() and not 1 < int(name) <= page_count:
+                shutil.rmtree(os.path.join(pages_dir, name))
+                self.removed += 1
+
+    def remove_file(self, path):
+        if os.path.exists(path):
+            os.remove(path)
+            self.removed += 1
+
+    def summary(self):
+        summary = f'Listings: wrote {self.written} files, {self.unchanged} unchanged, removed {self.removed}'
+        if self.skipped:
+            summary += f', skipped {", ".join(sorted(self.skipped))} (they have their own index page)'
+        if not self.site_url:
+            summary += ', no feeds without --site-url'
+        return summary
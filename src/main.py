@@ -1,28 +1,212 @@
 import os
 import sys
+import json
+import argparse
 from nodes import TextNode, TextType
-from copy_dir import copy_source_dir_to_destination
-from gen import generate_pages_recursive
+from copy_dir import copy_source_dir_to_destination, sync_source_dir_to_destination, sync_summary
+from gen import generate_pages_recursive, generate_pages_parallel
+from pipeline import AsyncPipeline
+from site_index import SiteIndex
+from search import SearchIndex
+from listing import Listings
+from postprocess import PostProcessor
+from assets import AssetPipeline
+from images import ImagePipeline, use_image_info
+from manifest import BuildManifest, text_hash
+from template import Template
+from cache import RenderCache
+from profiling import PROFILER
+from watch import SiteWatcher, serve
 from root import ROOT_DIR
 
 
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='generates static html site from .md files')
+    parser.add_argument('basepath', nargs='?', default=None,
+                        help='prefix for href/src paths, builds into docs/ when given')
+    parser.add_argument('--incremental', action='store_true',
+                        help='skip pages that did not change since the last build')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of processes generating pages, 0 uses every core')
+    parser.add_argument('--async-io', action='store_true',
+                        help='overlap reading, rendering (on --workers processes) and writing of pages, '
+                             'helps on slow or network filesystems')
+    parser.add_argument('--sync', action='store_true',
+                        help='copy only new or changed static files instead of clearing the output dir')
+    parser.add_argument('--checksum', action='store_true',
+                        help='compare static files by content hash instead of size/mtime')
+    parser.add_argument('--link', choices=['copy', 'hardlink', 'reflink'], default='copy',
+                        help='how synced static files are placed in the output dir')
+    parser.add_argument('--cache', choices=['memory', 'disk'], default=None,
+                        help='reuse html of identical blocks and pages, disk also keeps it between builds')
+    parser.add_argument('--cache-size', type=int, default=64,
+                        help='megabytes of rendered html kept in memory by --cache')
+    parser.add_argument('--profile', action='store_true',
+                        help='time every build stage, writes a json report and prints the slowest pages')
+    parser.add_argument('--profile-top', type=int, default=10,
+                        help='number of slowest pages printed by --profile')
+    parser.add_argument('--watch', action='store_true',
+                        help='keep rebuilding changed pages and serve the output dir with live reload')
+    parser.add_argument('--port', type=int, default=8888,
+                        help='port of the --watch dev server')
+    parser.add_argument('--drafts', action='store_true',
+                        help='also generate pages marked draft: true in their front matter')
+    parser.add_argument('--listing', default='',
+                        help='comma separated content sections that get paginated index pages and an atom feed '
+                             '(the feed only with --site-url), none by default')
+    parser.add_argument('--per-page', type=int, default=10,
+                        help='posts on every listing page')
+    parser.add_argument('--site-url', default='',
+                        help='scheme and host of the deployed site (like https://example.com), feeds need '
+                             'absolute urls')
+    parser.add_argument('--minify', action='store_true',
+                        help='minify generated html and css of the output dir (not in --watch rebuilds)')
+    parser.add_argument('--compress', action='store_true',
+                        help='write .gz (and .br when brotli is installed) next to text files of the output dir')
+    parser.add_argument('--fingerprint', action='store_true',
+                        help='also place static files under content hashed names and point href/src at them')
+    parser.add_argument('--images', action='store_true',
+                        help='give img tags width/height, loading="lazy" and a srcset of resized webp variants '
+                             '(variants need Pillow)')
+    parser.add_argument('--image-widths', default='480,960',
+                        help='comma separated widths of the --images variants')
+    parser.add_argument('--search', action='store_true',
+                        help='write a client side search index of every page into search/ of the output dir')
+    args = parser.parse_args(argv)
+    if args.fingerprint and args.watch:
+        parser.error('--fingerprint can not be used with --watch')
+    if args.site_url and not args.site_url.startswith(('http://', 'https://')):
+        parser.error(f'--site-url needs a scheme and host, like https://example.com: {args.site_url}')
+    return args
+
+
 def main():
+    args = parse_args(sys.argv[1:])
+    if args.profile:
+        PROFILER.enable()
     basepath = ''
     dest_dir = 'public'
-    if len(sys.argv) > 1: 
-        basepath = sys.argv[1]
+    if args.basepath is not None:
+        basepath = args.basepath
         dest_dir = 'docs'
 
     source = os.path.join(ROOT_DIR, 'static')
     destination = os.path.join(ROOT_DIR, dest_dir)
-    # clears destination before copying
-    copy_source_dir_to_destination(source, destination)
+    cache_dir = os.path.join(ROOT_DIR, '.build_cache', dest_dir)
+    # watch mode keeps reusing the output dir, same as incremental builds
+    incremental = args.incremental or args.watch
+    with PROFILER.stage('copy_source_dir_to_destination'):
+        if args.sync or incremental:
+            # previous pages are going to be reused, so destination isn't cleared
+            state_path = os.path.join(cache_dir, 'static.json')
+            stats = sync_source_dir_to_destination(source, destination, state_path, args.checksum, args.link)
+            print(sync_summary(stats))
+        else:
+            # clears destination before copying
+            copy_source_dir_to_destination(source, destination)
+
+    assets = None
+    if args.fingerprint:
+        asset_pipeline = AssetPipeline(source, destination, os.path.join(cache_dir, 'assets.json'), args.link)
+        with PROFILER.stage('fingerprint_assets'):
+            assets = asset_pipeline.run()
+        asset_pipeline.save(os.path.join(destination, 'asset-manifest.json'))
+        print(asset_pipeline.summary())
+
+    image_info = None
+    if args.images:
+        widths = [int(width) for width in args.image_widths.split(',') if width.strip()]
+        # variants depend only on the image content, so every output dir shares them
+        image_pipeline = ImagePipeline(source, destination, os.path.join(cache_dir, 'images.json'),
+                                       os.path.join(ROOT_DIR, '.build_cache', 'images'), widths, args.workers,
+                                       args.link)
+        with PROFILER.stage('images'):
+            image_info = image_pipeline.run()
+        image_pipeline.save()
+        use_image_info(image_info)
+        print(image_pipeline.summary())
 
     from_path = os.path.join(ROOT_DIR, 'content')
     html_template_path = os.path.join(ROOT_DIR, 'template.html')
     dest_path = os.path.join(ROOT_DIR, dest_dir)
+    template = Template.from_file(html_template_path, basepath, assets)
+
+    manifest = None
+    if incremental:
+        manifest_path = os.path.join(cache_dir, 'manifest.json')
+        manifest = BuildManifest(manifest_path, html_template_path, basepath, assets, image_info, args.drafts)
+
+    search_index = None
+    if args.search:
+        search_index = SearchIndex(os.path.join(cache_dir, 'search.json'), dest_path, basepath)
+    # metadata of every page, kept between builds since incremental builds don't read fresh pages
+    site_index = SiteIndex(os.path.join(cache_dir, 'site_index.json'), dest_path, args.drafts, search_index)
+
+    cache = None
+    if args.cache is not None:
+        # rendered html doesn't depend on basepath or the output dir, so the disk store is shared
+        disk_dir = os.path.join(ROOT_DIR, '.build_cache', 'render') if args.cache == 'disk' else None
+        # img tags rendered with other image info mustn't come back from the cache
+        namespace = f'images:{text_hash(json.dumps(image_info, sort_keys=True))}' if image_info is not None else ''
+        cache = RenderCache(args.cache_size * 1024 * 1024, disk_dir, namespace)
+
     # generates pages to dist, creates dist dir if it doesnt exist
-    generate_pages_recursive(from_path, html_template_path, dest_path, basepath)
+    if args.async_io:
+        pipeline = AsyncPipeline(html_template_path, basepath, args.workers or None, manifest, cache, site_index,
+                                 template)
+        pipeline.run(from_path, dest_path)
+        print(pipeline.summary())
+    elif args.workers == 1:
+        generate_pages_recursive(from_path, html_template_path, dest_path, basepath, manifest, template, cache,
+                                 site_index)
+    else:
+        generate_pages_parallel(from_path, html_template_path, dest_path, basepath, args.workers or None, manifest,
+                                cache, site_index, template)
+    site_index.prune()
+    site_index.save()
+    print(site_index.summary())
+    if search_index is not None:
+        with PROFILER.stage('search_index'):
+            search_index.write()
+        search_index.save()
+        print(search_index.summary())
+
+    listings = None
+    sections = [section.strip('/ ') for section in args.listing.split(',') if section.strip('/ ')]
+    if sections:
+        listings = Listings(sections, template, dest_path, args.per_page, args.site_url, basepath)
+        with PROFILER.stage('listings'):
+            listings.generate(site_index)
+        print(listings.summary())
+
+    if args.minify or args.compress:
+        post_processor = PostProcessor(dest_path, os.path.join(cache_dir, 'postprocess.json'), args.minify,
+                                       args.compress, args.workers)
+        with PROFILER.stage('postprocess'):
+            post_processor.run()
+        post_processor.save()
+        print(post_processor.summary())
+
+    if manifest is not None:
+        manifest.prune()
+        manifest.save()
+        print(manifest.summary())
+    if cache is not None:
+        print(cache.summary())
+    if args.profile:
+        report_path = os.path.join(cache_dir, 'profile.json')
+        PROFILER.write_report(report_path)
+        print(PROFILER.table(args.profile_top))
+        print(f'Profile report written to {report_path}')
+
+    if args.watch:
+        watcher = SiteWatcher(from_path, source, html_template_path, dest_path, basepath, manifest, site_index,
+                              listings)
+        serve(watcher, args.port)
+        try:
+            watcher.run()
+        except KeyboardInterrupt:
+            pass
 
 
 if __name__ == '__main__':
@@ -0,0 +1,108 @@
+import os
+import json
+import hashlib
+from cache import CACHE_VERSION
+from files import write_json
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+# same digest as text_hash() of the whole file, read in chunks so big files aren't held in memory
+def file_text_hash(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'r') as f:
+        for chunk in iter(lambda: f.read(chunk_size), ''):
+            digest.update(chunk.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class BuildManifest:
+    # remembers what every generated page was built from, so unchanged pages can be skipped,
+    # assets is the fingerprinted url mapping pages were rewritten with, images what their img tags were made from,
+    # drafts whether pages marked draft: true were generated
+    def __init__(self, path, template_path, basepath, assets=None, images=None, drafts=False):
+        self.path = path
+        self.template_hash = file_text_hash(template_path)
+        self.basepath = basepath
+        self.drafts = drafts
+        self.assets_hash = None
+        if assets or images is not None:
+            self.assets_hash = text_hash(json.dumps([assets, images], sort_keys=True))
+        self.pages = {}
+        self.seen = set()
+        self.invalidated = False
+        self.rebuilt = 0
+        self.skipped = 0
+        self.pruned = 0
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r') as f:
+            data = json.load(f)
+        self.pages = data.get('pages', {})
+        # template, basepath, asset, drafts or renderer change means every page has to be rebuilt,
+        # old entries are still kept to know which html to prune (drafts hidden now are pruned that way)
+        if (data.get('template_hash') != self.template_hash or data.get('basepath') != self.basepath
+                or data.get('assets_hash') != self.assets_hash or data.get('drafts', False) != self.drafts
+                or data.get('cache_version') != CACHE_VERSION):
+            self.invalidated = True
+
+    # template edited while the manifest is in use (watch mode), every page is stale again
+    def update_template(self, template_path):
+        self.template_hash = file_text_hash(template_path)
+        self.invalidated = True
+
+    def is_fresh(self, from_path, dest_path):
+        entry = self.pages.get(from_path)
+        if self.invalidated or entry is None or entry['dest'] != dest_path:
+            return False
+        if not os.path.exists(dest_path):
+            return False
+
+        stat = os.stat(from_path)
+        if entry['size'] != stat.st_size:
+            return False
+        if entry['mtime'] == stat.st_mtime_ns:
+            return True
+        # touched but maybe not changed (git checkout, copying), compare content
+        if file_text_hash(from_path) == entry['hash']:
+            entry['mtime'] = stat.st_mtime_ns
+            return True
+        return False
+
+    def skip(self, from_path):
+        self.seen.add(from_path)
+        self.skipped += 1
+
+    def record(self, from_path, dest_path, content_hash):
+        stat = os.stat(from_path)
+        self.pages[from_path] = {
+            'dest': dest_path,
+            'mtime': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'hash': content_hash,
+        }
+        self.seen.add(from_path)
+        self.rebuilt += 1
+
+    # removes html of pages whose sources weren't seen during this build
+    def prune(self):
+        for from_path in list(self.pages):
+            if from_path in self.seen:
+                continue
+            dest_path = self.pages.pop(from_path)['dest']
+            if os.path.exists(dest_path):
+                os.remove(dest_path)
+            self.pruned += 1
+
+    def save(self):
+        write_json(self.path, {'template_hash': self.template_hash, 'basepath': self.basepath,
+                               'assets_hash': self.assets_hash, 'drafts': self.drafts, 'cache_version': CACHE_VERSION,
+                               'pages': self.pages})
+
+    def summary(self):
+        return f'Rebuilt {self.rebuilt} pages, skipped {self.skipped}, pruned {self.pruned}'
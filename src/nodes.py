@@ -12,20 +12,34 @@ class TextType(Enum):
 
 
 class TextNode:
-    def __init__(self, text, text_type: TextType, url=None):
+    # pages create tens of thousands of nodes, slots drop the per-instance __dict__
+    __slots__ = ('text', 'text_type', 'url', 'children')
+
+    # spans holding more than plain text (bold inside italic, a link inside bold) have children instead of text
+    def __init__(self, text, text_type: TextType, url=None, children=None):
         self.text = text
         self.text_type = text_type
         self.url = url
+        self.children = children
     
     def __eq__(self, other: TextNode):
         return (self.text == other.text and self.text_type == other.text_type 
-                and self.url == other.url)
-    
+                and self.url == other.url and self.children == other.children)
+
+    def __hash__(self):
+        return hash((self.text, self.text_type, self.url))
+
     def __repr__(self):
-        return f'TextNode({self.text}, {self.text_type.value}, {self.url})'
+        # registered text types don't have to be TextType members
+        text_type = self.text_type.value if isinstance(self.text_type, TextType) else self.text_type
+        if self.children:
+            return f'TextNode({self.text}, {text_type}, {self.url}, {self.children})'
+        return f'TextNode({self.text}, {text_type}, {self.url})'
 
 
 class HTMLNode:
+    __slots__ = ('tag', 'value', 'children', 'props')
+
     def __init__(self, tag=None, value=None, children=None, props=None):
         self.tag = tag
         self.value = value
@@ -44,11 +58,32 @@ class HTMLNode:
         html_props = self.props_to_html()
         return f'<{self.tag} {html_props}>{self.value}</{self.tag}>'
 
+    # same html as to_html() but as a stream of chunks, the tree is walked with an explicit stack,
+    # so nothing is concatenated per nesting level and deep trees don't hit the recursion limit
+    def iter_html(self):
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, str):
+                yield node
+            elif isinstance(node, ParentNode):
+                node.check()
+                yield f'<{node.tag}{node.props_to_html()}>'
+                stack.append(f'</{node.tag}>')
+                stack.extend(reversed(node.children))
+            else:
+                yield node.to_html()
+
+    def write_html(self, f):
+        f.writelines(self.iter_html())
+
     def __repr__(self):
         return f'HTMLNode({self.tag}, {self.value}, {self.children}, {self.props})'
 
 
 class LeafNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag, value, props=None):
         super().__init__(tag, value, props=props)
 
@@ -67,15 +102,17 @@ class LeafNode(HTMLNode):
     
 
 class ParentNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag, children, props=None):
         super().__init__(tag, None, children, props)
     
-    def to_html(self):
+    def check(self):
         if not self.tag:
             raise ValueError('empty tag in ParentNode')
         if not self.children:
             raise ValueError('empty children in ParentNode')
 
-        children_html = ''.join([child.to_html() for child in self.children])
-        return f'<{self.tag}>{children_html}</{self.tag}>'
+    def to_html(self):
+        return ''.join(self.iter_html())
     
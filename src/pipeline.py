@@ -0,0 +1,152 @@
+import os
+import time
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from gen import (collect_pages, stale_pages, stream_large_pages, worker_initargs, init_worker, convert_page,
+                 skip_draft, write_page)
+from profiling import PROFILER
+from template import Template
+
+DEFAULT_READERS = 8
+DEFAULT_WRITERS = 8
+# pages waiting between two stages, a full queue stops the stage in front of it
+DEFAULT_QUEUE_SIZE = 32
+# most pages sent to a worker in one call, small pages cost less to render than the round trip
+RENDER_BATCH_SIZE = 8
+
+
+def read_text(path):
+    with open(path, 'r') as f:
+        return f.read()
+
+
+# runs in worker processes
+def convert_batch(pages):
+    return [convert_page(from_path, markdown_text) for from_path, markdown_text in pages]
+
+
+class AsyncPipeline:
+    # builds pages with reads, rendering and writes overlapping: reader tasks read sources on threads into
+    # a bounded queue, render tasks send them to a process pool, writer tasks fill the template and write
+    # the output with write_page() on threads; the page list, fresh page skipping and big page streaming are
+    # the same as in generate_pages_parallel(), manifest/site_index are only touched from the event loop
+    def __init__(self, template_path, basepath, workers=None, manifest=None, cache=None, site_index=None,
+                 template=None, readers=DEFAULT_READERS, writers=DEFAULT_WRITERS, queue_size=DEFAULT_QUEUE_SIZE):
+        self.template_path = template_path
+        self.basepath = basepath
+        self.workers = workers or os.cpu_count() or 1
+        self.manifest = manifest
+        self.cache = cache
+        self.site_index = site_index
+        self.template = template
+        self.readers = readers
+        self.writers = writers
+        self.queue_size = queue_size
+        self.pages = 0
+        self.seconds = 0.0
+        # name -> [samples, total depth, max depth], sampled every time a page is put into the queue
+        self.depths = {'read': [0, 0, 0], 'render': [0, 0, 0]}
+
+    def run(self, dir_path_content, dest_dir_path):
+        if not os.path.exists(dir_path_content):
+            raise ValueError(f'Content dir doesnt exists in AsyncPipeline.run(): {dir_path_content}')
+        pages = stale_pages(collect_pages(dir_path_content, dest_dir_path), self.manifest, self.site_index)
+        if not os.path.exists(dest_dir_path):
+            os.mkdir(dest_dir_path)
+        if not pages:
+            return
+        if self.template is None:
+            self.template = Template.from_file(self.template_path, self.basepath)
+
+        pages = stream_large_pages(pages, self.template_path, self.basepath, self.manifest, self.template,
+                                   self.cache, self.site_index)
+        if not pages:
+            return
+        start = time.perf_counter()
+        asyncio.run(self.build(pages))
+        self.seconds += time.perf_counter() - start
+
+    async def build(self, pages):
+        read_queue = asyncio.Queue(self.queue_size)
+        render_queue = asyncio.Queue(self.queue_size)
+        page_iter = iter(pages)
+        initargs = worker_initargs(self.cache, self.site_index)
+        # enough renders in flight to keep every worker busy while results travel back
+        renderers = self.workers * 2
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker, initargs=initargs) as executor:
+            stages = [
+                self.run_stage([self.read(page_iter, read_queue) for _ in range(self.readers)], read_queue,
+                               renderers),
+                self.run_stage([self.render(executor, read_queue, render_queue) for _ in range(renderers)],
+                               render_queue, self.writers),
+                self.run_stage([self.write(render_queue) for _ in range(self.writers)]),
+            ]
+            tasks = [asyncio.create_task(stage) for stage in stages]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                # a failed page stops the build, the other stages mustn't wait on it forever
+                for task in tasks:
+                    task.cancel()
+                raise
+
+    # runs the tasks of one stage, then tells every task of the next stage there is nothing more coming
+    async def run_stage(self, coroutines, queue=None, consumers=0):
+        await asyncio.gather(*coroutines)
+        for _ in range(consumers):
+            await queue.put(None)
+
+    async def put(self, name, queue, item):
+        await queue.put(item)
+        stats = self.depths[name]
+        stats[0] += 1
+        stats[1] += queue.qsize()
+        stats[2] = max(stats[2], queue.qsize())
+
+    async def read(self, page_iter, read_queue):
+        for from_path, dest_path in page_iter:
+            with PROFILER.stage('read'):
+                markdown_text = await asyncio.to_thread(read_text, from_path)
+            await self.put('read', read_queue, (from_path, dest_path, markdown_text))
+
+    async def render(self, executor, read_queue, render_queue):
+        loop = asyncio.get_running_loop()
+        done = False
+        while not done:
+            # whatever is already read goes along with the first page, nothing is waited for
+            batch = [await read_queue.get()]
+            while batch[-1] is not None and len(batch) < RENDER_BATCH_SIZE and not read_queue.empty():
+                batch.append(read_queue.get_nowait())
+            if batch[-1] is None:
+                batch.pop()
+                done = True
+            if not batch:
+                continue
+            results = await loop.run_in_executor(executor, convert_batch,
+                                                 [(from_path, markdown_text) for from_path, _, markdown_text in batch])
+            for (from_path, dest_path, _), result in zip(batch, results):
+                await self.put('render', render_queue, (from_path, dest_path, result))
+
+    async def write(self, render_queue):
+        while (page := await render_queue.get()) is not None:
+            from_path, dest_path, result = page
+            title, content_html, content_hash, metadata, terms, counts, page_stats = result
+            print(f'Generating page from {from_path} to {dest_path} using {self.template_path}')
+            if counts is not None:
+                self.cache.add_counts(counts)
+            if title is None:
+                skip_draft(from_path, self.site_index)
+                continue
+            PROFILER.merge_page(from_path, page_stats)
+            await asyncio.to_thread(write_page, dest_path, self.template, Title=title, Content=content_html)
+            if self.manifest is not None:
+                self.manifest.record(from_path, dest_path, content_hash)
+            if self.site_index is not None:
+                self.site_index.record(from_path, dest_path, title, metadata, terms)
+            self.pages += 1
+
+    def summary(self):
+        pages_per_second = self.pages / self.seconds if self.seconds else 0.0
+        depths = ', '.join(f'{name} queue avg {samples and total / samples:.1f} max {max_depth}/{self.queue_size}'
+                           for name, (samples, total, max_depth) in self.depths.items())
+        return f'Async pipeline: {self.pages} pages in {self.seconds:.2f} s, {pages_per_second:.1f} pages/s, {depths}'
@@ -0,0 +1,191 @@
+import os
+import re
+import gzip
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from files import write_json
+
+# .br siblings are only written when brotli is installed
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSED_EXTENSIONS = ('.html', '.css', '.js', '.xml', '.svg', '.json', '.txt')
+# whitespace inside these is content
+PRESERVED_HTML_PATTERN = re.compile(r'(<(pre|textarea|script|style)\b[^>]*>.*?</\2\s*>)', re.DOTALL | re.IGNORECASE)
+HTML_COMMENT_PATTERN = re.compile(r'<!--(?!\[).*?-->', re.DOTALL)
+# whitespace next to these tags doesn't render, around inline tags like <a> or <b> it does
+BLOCK_TAG_PATTERN = re.compile(r'\s*(</?(?:html|head|body|meta|link|title|base|div|p|ul|ol|li|h[1-6]|blockquote|article|'
+                               r'section|nav|header|footer|main|aside|table|thead|tbody|tr|td|th|pre|hr|br|!doctype)\b'
+                               r'[^>]*>)\s*', re.IGNORECASE)
+CSS_STRING_PATTERN = re.compile(r'("(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\')')
+CSS_COMMENT_PATTERN = re.compile(r'/\*.*?\*/', re.DOTALL)
+CSS_PUNCTUATION_PATTERN = re.compile(r'\s*([{};,>])\s*')
+
+
+def minify_html(html):
+    parts = PRESERVED_HTML_PATTERN.split(html)
+    minified = []
+    # split() puts every preserved element at i % 3 == 1 and its tag name right after it
+    for i, part in enumerate(parts):
+        if i % 3 == 2:
+            continue
+        if i % 3 == 1:
+            minified.append(part)
+            continue
+        part = HTML_COMMENT_PATTERN.sub('', part)
+        part = re.sub(r'\s+', ' ', part)
+        minified.append(BLOCK_TAG_PATTERN.sub(r'\1', part))
+    return ''.join(minified).strip()
+
+
+def minify_css(css):
+    parts = CSS_STRING_PATTERN.split(css)
+    minified = []
+    for i, part in enumerate(parts):
+        if i % 2:
+            minified.append(part)
+            continue
+        part = CSS_COMMENT_PATTERN.sub('', part)
+        part = re.sub(r'\s+', ' ', part)
+        part = CSS_PUNCTUATION_PATTERN.sub(r'\1', part)
+        # space after a property name's colon, "a :hover" before a selector's colon means something
+        part = re.sub(r'([{;][\w-]+):\s+', r'\1:', part)
+        minified.append(part.replace(';}', '}'))
+    return ''.join(minified).strip()
+
+
+MINIFIERS = {
+    '.html': minify_html,
+    '.css': minify_css,
+}
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def write_bytes(path, data):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def sibling_paths(path, compress):
+    if not compress or not path.endswith(COMPRESSED_EXTENSIONS):
+        return []
+    paths = [path + '.gz']
+    if brotli is not None:
+        paths.append(path + '.br')
+    return paths
+
+
+# minifies one output file in place and writes its compressed siblings, entry is what the last run recorded,
+# returns (path, new entry, whether anything was written)
+def process_file(path, minify, compress, entry):
+    with open(path, 'rb') as f:
+        data = f.read()
+    siblings = sibling_paths(path, compress)
+    siblings_exist = all(os.path.exists(sibling) for sibling in siblings)
+    if entry is not None and content_hash(data) == entry['output'] and siblings_exist:
+        return path, entry, False
+
+    output = data
+    minifier = MINIFIERS.get(os.path.splitext(path)[1]) if minify else None
+    if minifier is not None:
+        output = minifier(data.decode('utf-8')).encode('utf-8')
+    output_hash = content_hash(output)
+    if output != data:
+        write_bytes(path, output)
+    # page regenerated with the same content, minified again but the same siblings are still there
+    if entry is not None and output_hash == entry['output'] and siblings_exist:
+        return path, entry, True
+
+    for sibling in siblings:
+        if sibling.endswith('.gz'):
+            # mtime=0 keeps .gz bytes the same for the same content
+            write_bytes(sibling, gzip.compress(output, 9, mtime=0))
+        else:
+            write_bytes(sibling, brotli.compress(output))
+    return path, {'output': output_hash}, True
+
+
+class PostProcessor:
+    # minifies html/css of the output dir and writes .gz/.br next to text files,
+    # files whose content didn't change since the last run (kept in state_path) are left alone
+    def __init__(self, dest_dir, state_path=None, minify=True, compress=True, workers=1):
+        self.dest_dir = dest_dir
+        self.state_path = state_path
+        self.minify = minify
+        self.compress = compress
+        self.workers = workers
+        self.files = {}
+        self.processed = 0
+        self.skipped = 0
+        self.removed = 0
+        self.load()
+
+    def load(self):
+        if self.state_path is None or not os.path.exists(self.state_path):
+            return
+        with open(self.state_path, 'r') as f:
+            data = json.load(f)
+        # a run with other settings wrote different files
+        if data.get('settings') == self.settings():
+            self.files = data.get('files', {})
+
+    def settings(self):
+        return {'minify': self.minify, 'compress': self.compress, 'brotli': brotli is not None}
+
+    def collect_files(self):
+        paths = []
+        for dir_path, _, file_names in os.walk(self.dest_dir):
+            for file in sorted(file_names):
+                if file.endswith(('.gz', '.br', '.tmp')):
+                    continue
+                path = os.path.join(dir_path, file)
+                if (self.minify and file.endswith(tuple(MINIFIERS))) or sibling_paths(path, self.compress):
+                    paths.append(path)
+        return sorted(paths)
+
+    def run(self):
+        paths = self.collect_files()
+        entries = [self.files.get(os.path.relpath(path, self.dest_dir)) for path in paths]
+        args = (paths, [self.minify] * len(paths), [self.compress] * len(paths), entries)
+        if self.workers == 1:
+            results = map(process_file, *args)
+            self.record(results)
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers or None) as executor:
+                self.record(executor.map(process_file, *args, chunksize=max(1, len(paths) // 64)))
+        self.prune(paths)
+
+    def record(self, results):
+        for path, entry, written in results:
+            self.files[os.path.relpath(path, self.dest_dir)] = entry
+            if written:
+                self.processed += 1
+            else:
+                self.skipped += 1
+
+    # siblings of files that are gone from the output dir
+    def prune(self, paths):
+        present = {os.path.relpath(path, self.dest_dir) for path in paths}
+        for rel_path in list(self.files):
+            if rel_path in present:
+                continue
+            del self.files[rel_path]
+            for suffix in ('.gz', '.br'):
+                sibling = os.path.join(self.dest_dir, rel_path + suffix)
+                if os.path.exists(sibling):
+                    os.remove(sibling)
+                    self.removed += 1
+
+    def save(self):
+        write_json(self.state_path, {'settings': self.settings(), 'files': self.files})
+
+    def summary(self):
+        return f'Post-processed {self.processed} files, skipped {self.skipped}, removed {self.removed} stale siblings'
@@ -0,0 +1,118 @@
+import time
+import functools
+import threading
+from contextlib import contextmanager
+from files import write_json
+
+
+class Profiler:
+    # wall time and call counts per build stage, for the whole build and per page;
+    # stages nest (markdown_to_html runs text_to_textnodes), so their times overlap
+    def __init__(self):
+        self.enabled = False
+        self.stages = {}
+        self.pages = {}
+        self.current_page = None
+        self.start_time = None
+        # stages can end on other threads (writers of the async pipeline)
+        self.lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+        self.start_time = time.perf_counter()
+
+    def add(self, name, seconds):
+        with self.lock:
+            stats = self.stages.setdefault(name, [0, 0.0])
+            stats[0] += 1
+            stats[1] += seconds
+            if self.current_page is not None:
+                page_stats = self.pages[self.current_page]['stages'].setdefault(name, [0, 0.0])
+                page_stats[0] += 1
+                page_stats[1] += seconds
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    @contextmanager
+    def page(self, page):
+        if not self.enabled:
+            yield
+            return
+        self.pages.setdefault(page, {'seconds': 0.0, 'stages': {}})
+        self.current_page = page
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.pages[page]['seconds'] += time.perf_counter() - start
+            self.current_page = None
+
+    # stats of a page profiled in a worker process, added to this profiler by merge_page()
+    def pop_page(self, page):
+        return self.pages.pop(page, None)
+
+    def merge_page(self, page, page_stats):
+        if page_stats is None:
+            return
+        own_stats = self.pages.setdefault(page, {'seconds': 0.0, 'stages': {}})
+        own_stats['seconds'] += page_stats['seconds']
+        for name, (calls, seconds) in page_stats['stages'].items():
+            for stages in (self.stages, own_stats['stages']):
+                stats = stages.setdefault(name, [0, 0.0])
+                stats[0] += calls
+                stats[1] += seconds
+
+    def slowest_pages(self, n=10):
+        return sorted(self.pages.items(), key=lambda item: item[1]['seconds'], reverse=True)[:n]
+
+    def report(self):
+        return {
+            'total_seconds': time.perf_counter() - self.start_time if self.start_time else 0.0,
+            'stages': {name: {'calls': calls, 'seconds': seconds} for name, (calls, seconds) in self.stages.items()},
+            'pages': {page: {'seconds': stats['seconds'],
+                             'stages': {name: {'calls': calls, 'seconds': seconds}
+                                        for name, (calls, seconds) in stats['stages'].items()}}
+                      for page, stats in self.pages.items()},
+        }
+
+    def write_report(self, path):
+        write_json(path, self.report(), indent=2)
+
+    def table(self, n=10):
+        lines = [f'{"stage":<32}{"calls":>10}{"seconds":>12}']
+        for name, (calls, seconds) in sorted(self.stages.items(), key=lambda item: item[1][1], reverse=True):
+            lines.append(f'{name:<32}{calls:>10}{seconds:>12.4f}')
+        lines.append('')
+        lines.append(f'{"slowest pages":<60}{"seconds":>12}')
+        for page, stats in self.slowest_pages(n):
+            lines.append(f'{page[-60:]:<60}{stats["seconds"]:>12.4f}')
+        return '\n'.join(lines)
+
+
+# shared by the whole process, off unless main.py --profile turns it on
+PROFILER = Profiler()
+
+
+# times every call of the decorated function as stage name, costs a single check when profiling is off
+def profiled(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                PROFILER.add(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
@@ -0,0 +1,88 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from block import markdown_to_blocks, markdown_to_html, markdown_to_html_node, iter_blocks_html
+from cache import RenderCache
+
+# string: the html, node: the ParentNode tree, chunks: an iterator of html pieces
+OUTPUTS = ('string', 'node', 'chunks')
+EXECUTORS = ('thread', 'process')
+
+
+def render_markdown(markdown, output='string', cache=None):
+    if output == 'string':
+        return markdown_to_html(markdown, cache)
+    if output == 'node':
+        return markdown_to_html_node(markdown, cache)
+    if output == 'chunks':
+        return iter_blocks_html(markdown_to_blocks(markdown), cache)
+    raise ValueError(f'Invalid output in render_markdown(): {output}')
+
+
+# renderer of the current worker process, made by init_worker()
+worker_renderer = None
+
+
+def init_worker(cache_settings):
+    global worker_renderer
+    worker_renderer = Renderer(RenderCache(*cache_settings) if cache_settings is not None else None)
+
+
+# runs in worker processes, chunk iterators can't be sent back so the node tree is and the parent iterates it
+def render_in_worker(markdown, output):
+    return worker_renderer.render(markdown, 'node' if output == 'chunks' else output)
+
+
+class Renderer:
+    # markdown -> html for callers rendering many documents in one process (a web service for example),
+    # the cache and the worker pool are made once and reused by every render()/render_many() call,
+    # with a cache given nodes of blocks rendered before are leaves holding their html
+    def __init__(self, cache=None, workers=1, executor='thread'):
+        if executor not in EXECUTORS:
+            raise ValueError(f'Invalid executor in Renderer(): {executor}')
+        self.cache = cache
+        self.workers = workers
+        self.executor = executor
+        self.pool = None
+
+    def render(self, markdown, output='string'):
+        return render_markdown(markdown, output, self.cache)
+
+    def get_pool(self):
+        if self.pool is None:
+            if self.executor == 'thread':
+                self.pool = ThreadPoolExecutor(max_workers=self.workers or None)
+            else:
+                # every worker gets its own cache with the same settings (and the same disk store)
+                cache_settings = self.cache.settings if self.cache is not None else None
+                self.pool = ProcessPoolExecutor(max_workers=self.workers or None, initializer=init_worker,
+                                                initargs=(cache_settings,))
+        return self.pool
+
+    # results come back in the order of markdowns, workers=1 renders in the calling thread
+    def render_many(self, markdowns, output='string'):
+        if output not in OUTPUTS:
+            raise ValueError(f'Invalid output in Renderer.render_many(): {output}')
+        if self.workers == 1:
+            return [self.render(markdown, output) for markdown in markdowns]
+
+        markdowns = list(markdowns)
+        if self.executor == 'thread':
+            return list(self.get_pool().map(self.render, markdowns, [output] * len(markdowns)))
+        # small documents are sent in batches, one round trip per document would cost more than rendering it
+        chunksize = max(1, len(markdowns) // ((self.workers or os.cpu_count() or 1) * 4))
+        results = list(self.get_pool().map(render_in_worker, markdowns, [output] * len(markdowns),
+                                           chunksize=chunksize))
+        if output == 'chunks':
+            return [node.iter_html() for node in results]
+        return results
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
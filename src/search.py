@@ -0,0 +1,179 @@
+import os
+import re
+import json
+from collections import Counter
+from block import BlockType, block_to_block_type
+from inline import text_to_textnodes, iter_plain_text
+from files import write_json
+
+# one character tokens match nothing worth searching for
+TOKEN_PATTERN = re.compile(r'\w\w+')
+# a term's shard is picked by its first characters, browsers only fetch shards of the terms they look up
+PREFIX_LENGTH = 2
+TITLE_WEIGHT = 10
+HEADING_WEIGHT = 3
+STOP_WORDS = frozenset(('the', 'and', 'of', 'to', 'in', 'is', 'it', 'that', 'for', 'on', 'as', 'with', 'was', 'be',
+                        'by', 'an', 'at', 'or', 'this', 'are', 'from', 'but', 'not', 'his', 'her', 'he', 'she'))
+
+
+def add_terms(terms, text, weight):
+    # Counter counts in C, the loop only runs once per distinct token
+    for token, count in Counter(TOKEN_PATTERN.findall(text.lower())).items():
+        terms[token] = terms.get(token, 0) + count * weight
+    # dropped afterwards, cheaper than checking every token
+    for stop_word in STOP_WORDS.intersection(terms):
+        del terms[stop_word]
+
+
+# {term: score} of a page, text comes from the same TextNodes the page is rendered from, code blocks are left out
+def page_terms(title, blocks, block_types=None):
+    terms = {}
+    add_terms(terms, title, TITLE_WEIGHT)
+    for i, block in enumerate(blocks):
+        block_type = block_types[i] if block_types is not None else block_to_block_type(block)
+        if block_type == BlockType.CODE:
+            continue
+        weight = HEADING_WEIGHT if block_type == BlockType.HEADING else 1
+        # one tokenizer pass per block, node texts are joined so words of two nodes don't run together
+        add_terms(terms, ' '.join(iter_plain_text(text_to_textnodes(block))), weight)
+    return terms
+
+
+# shard file name, prefixes that aren't plain ascii are hex encoded
+def shard_name(prefix):
+    if prefix.isascii() and prefix.isalnum():
+        return f'{prefix}.json'
+    return f'x{prefix.encode("utf-8").hex()}.json'
+
+
+class SearchIndex:
+    # inverted index of every page, written into dest_dir/search as docs.json, one json shard per term prefix
+    # and index.json listing the shards; terms of every page are kept in state_path so a build that changes
+    # some pages only rewrites the shards holding their old or new terms; urls in docs.json get basepath
+    # in front like every link of the pages does
+    def __init__(self, state_path, dest_dir, basepath=''):
+        self.state_path = state_path
+        self.search_dir = os.path.join(dest_dir, 'search')
+        self.basepath = basepath
+        self.pages = {}
+        self.next_id = 0
+        self.postings = {}
+        self.seen = set()
+        self.dirty = set()
+        self.docs_changed = False
+        self.written = 0
+        self.load()
+
+    def load(self):
+        if self.state_path is None or not os.path.exists(self.state_path):
+            return
+        with open(self.state_path, 'r') as f:
+            data = json.load(f)
+        self.pages = data.get('pages', {})
+        self.next_id = data.get('next_id', 0)
+        # every url in docs.json changes with the basepath
+        self.docs_changed = data.get('basepath', '') != self.basepath
+        for page in self.pages.values():
+            self.add_postings(page)
+
+    def add_postings(self, page):
+        for term, score in page['terms'].items():
+            self.postings.setdefault(term, {})[page['id']] = score
+
+    def remove_postings(self, page, terms):
+        for term in terms:
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(page['id'], None)
+            if not postings:
+                del self.postings[term]
+            self.dirty.add(term[:PREFIX_LENGTH])
+
+    def record(self, from_path, url, title, terms):
+        old_page = self.pages.get(from_path)
+        self.seen.add(from_path)
+        if old_page is None:
+            page = {'id': self.next_id, 'url': url, 'title': title, 'terms': terms}
+            self.next_id += 1
+            self.pages[from_path] = page
+            self.add_postings(page)
+            self.dirty.update(term[:PREFIX_LENGTH] for term in terms)
+            self.docs_changed = True
+            return
+
+        # only shards of terms whose score changed are touched, an edited page keeps most of its terms
+        old_terms = old_page['terms']
+        self.remove_postings(old_page, [term for term in old_terms if term not in terms])
+        for term, score in terms.items():
+            if old_terms.get(term) != score:
+                self.postings.setdefault(term, {})[old_page['id']] = score
+                self.dirty.add(term[:PREFIX_LENGTH])
+        if (old_page['url'], old_page['title']) != (url, title):
+            self.docs_changed = True
+        old_page.update(url=url, title=title, terms=terms)
+
+    def keep(self, from_path):
+        self.seen.add(from_path)
+
+    def remove(self, from_path):
+        page = self.pages.pop(from_path, None)
+        self.seen.discard(from_path)
+        if page is not None:
+            self.remove_postings(page, page['terms'])
+            self.docs_changed = True
+
+    def prune(self):
+        for from_path in list(self.pages):
+            if from_path not in self.seen:
+                self.remove(from_path)
+
+    def shards(self):
+        shards = {}
+        for term in self.postings:
+            shards.setdefault(term[:PREFIX_LENGTH], []).append(term)
+        return shards
+
+    # {term: [id, score, id, score, ...]}, best match first
+    def shard_data(self, terms):
+        data = {}
+        for term in sorted(terms):
+            postings = sorted(self.postings[term].items(), key=lambda posting: (-posting[1], posting[0]))
+            data[term] = [value for posting in postings for value in posting]
+        return data
+
+    def write_json(self, name, data):
+        write_json(os.path.join(self.search_dir, name), data, separators=(',', ':'), ensure_ascii=False)
+        self.written += 1
+
+    def write(self):
+        os.makedirs(self.search_dir, exist_ok=True)
+        shards = self.shards()
+        # a cleared output dir needs everything again
+        rewrite_all = not os.path.exists(os.path.join(self.search_dir, 'index.json'))
+        shards_changed = False
+        for prefix, terms in shards.items():
+            exists = os.path.exists(os.path.join(self.search_dir, shard_name(prefix)))
+            if rewrite_all or prefix in self.dirty or not exists:
+                self.write_json(shard_name(prefix), self.shard_data(terms))
+            shards_changed = shards_changed or not exists
+        for prefix in self.dirty.difference(shards):
+            path = os.path.join(self.search_dir, shard_name(prefix))
+            if os.path.exists(path):
+                os.remove(path)
+                shards_changed = True
+
+        if rewrite_all or self.docs_changed:
+            docs = {page['id']: [self.basepath + page['url'], page['title']] for page in self.pages.values()}
+            self.write_json('docs.json', dict(sorted(docs.items())))
+        if rewrite_all or shards_changed:
+            shard_files = {prefix: shard_name(prefix) for prefix in sorted(shards)}
+            self.write_json('index.json', {'prefix_length': PREFIX_LENGTH, 'docs': 'docs.json', 'shards': shard_files})
+        self.dirty = set()
+        self.docs_changed = False
+
+    def save(self):
+        write_json(self.state_path, {'basepath': self.basepath, 'next_id': self.next_id, 'pages': self.pages})
+
+    def summary(self):
+        return f'Search index: {len(self.pages)} pages, {len(self.postings)} terms, wrote {self.written} files'
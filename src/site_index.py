@@ -0,0 +1,125 @@
+import os
+import json
+from datetime import date, datetime, timezone
+from files import write_json
+
+
+def url_for(dest_path, dest_dir):
+    url = '/' + os.path.relpath(dest_path, dest_dir).replace(os.sep, '/')
+    if url.endswith('/index.html'):
+        url = url[:-len('index.html')]
+    return url
+
+
+def normalize_date(value):
+    if value is None:
+        return None
+    try:
+        # a time after the date is allowed and dropped, listings only need the day
+        return date.fromisoformat(str(value)[:10]).isoformat()
+    except ValueError:
+        raise ValueError(f'Invalid date in normalize_date(): {value}')
+
+
+# day the source was last changed, feeds use it for pages without a date
+def modified_date(from_path):
+    if not os.path.exists(from_path):
+        return None
+    return datetime.fromtimestamp(os.path.getmtime(from_path), timezone.utc).date().isoformat()
+
+
+def normalize_tags(value):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split(',')
+    return [str(tag).strip() for tag in value if str(tag).strip()]
+
+
+class SiteIndex:
+    # title, url and front matter of every page, filled in while pages are generated and kept on disk,
+    # so listings, archives and sitemaps don't need the markdown read again (incremental builds skip it),
+    # with a search.SearchIndex given the terms of every page are kept in it along the same way
+    def __init__(self, path, dest_dir, drafts=False, search=None):
+        self.path = path
+        self.dest_dir = dest_dir
+        self.drafts = drafts
+        self.search = search
+        self.pages = {}
+        self.seen = set()
+        self.load()
+
+    def load(self):
+        if self.path is None or not os.path.exists(self.path):
+            return
+        with open(self.path, 'r') as f:
+            self.pages = json.load(f).get('pages', {})
+
+    def record(self, from_path, dest_path, title, metadata, terms=None):
+        url = url_for(dest_path, self.dest_dir)
+        page_date = normalize_date(metadata.get('date'))
+        self.pages[from_path] = {
+            'url': url,
+            'slug': str(metadata.get('slug') or url.strip('/').split('/')[-1] or 'index'),
+            'title': title,
+            'date': page_date,
+            'updated': normalize_date(metadata.get('updated')) or page_date or modified_date(from_path),
+            'tags': normalize_tags(metadata.get('tags')),
+            'draft': bool(metadata.get('draft', False)),
+            'meta': metadata,
+        }
+        self.seen.add(from_path)
+        if self.search is not None and terms is not None:
+            self.search.record(from_path, url, title, terms)
+
+    # pages whose entry is missing have to be generated again even when their html is fresh
+    def has_page(self, from_path):
+        return from_path in self.pages and (self.search is None or from_path in self.search.pages)
+
+    # page skipped by an incremental build, its entry from the last build is still right
+    def keep(self, from_path):
+        self.seen.add(from_path)
+        if self.search is not None:
+            self.search.keep(from_path)
+
+    def remove(self, from_path):
+        self.pages.pop(from_path, None)
+        self.seen.discard(from_path)
+        if self.search is not None:
+            self.search.remove(from_path)
+
+    # forgets pages whose sources weren't seen during this build
+    def prune(self):
+        for from_path in list(self.pages):
+            if from_path not in self.seen:
+                del self.pages[from_path]
+        if self.search is not None:
+            self.search.prune()
+
+    def save(self):
+        write_json(self.path, {'pages': self.pages})
+
+    # published pages, newest first, undated pages last ordered by url
+    def entries(self):
+        entries = [entry for entry in self.pages.values() if self.drafts or not entry['draft']]
+        entries.sort(key=lambda entry: entry['url'])
+        entries.sort(key=lambda entry: entry['date'] or '', reverse=True)
+        return entries
+
+    def tags(self):
+        tags = {}
+        for entry in self.entries():
+            for tag in entry['tags']:
+                tags.setdefault(tag, []).append(entry)
+        return dict(sorted(tags.items()))
+
+    # {year: entries}, newest year first, undated pages aren't in the archive
+    def archive(self):
+        years = {}
+        for entry in self.entries():
+            if entry['date'] is not None:
+                years.setdefault(entry['date'][:4], []).append(entry)
+        return years
+
+    def summary(self):
+        return f'Indexed {len(self.entries())} pages, {len(self.tags())} tags'
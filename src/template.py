@@ -0,0 +1,84 @@
+import re
+
+PLACEHOLDER_PATTERN = re.compile(r'\{\{ (\w+) \}\}')
+PATH_ATTRIBUTE_PATTERN = re.compile(r'(href|src)="([^"?#]*)')
+SRCSET_PATTERN = re.compile(r'srcset="([^"]*)"')
+
+
+# every candidate of a srcset gets the basepath, not only the first one
+def rewrite_srcset(html, basepath, assets=None):
+    def rewrite(match):
+        candidates = []
+        for candidate in match.group(1).split(','):
+            url, _, descriptor = candidate.strip().partition(' ')
+            if assets:
+                url = assets.get(url, url)
+            candidates.append(f'{basepath}{url} {descriptor}'.strip())
+        return f'srcset="{", ".join(candidates)}"'
+    return SRCSET_PATTERN.sub(rewrite, html)
+
+
+# fixing paths for native deploying, with assets ({url: fingerprinted url}) given
+# static files are swapped for their fingerprinted names in the same pass
+def rewrite_paths(html, basepath, assets=None):
+    if (basepath or assets) and 'srcset="' in html:
+        html = rewrite_srcset(html, basepath, assets)
+    if assets:
+        return PATH_ATTRIBUTE_PATTERN.sub(
+            lambda match: f'{match.group(1)}="{basepath}{assets.get(match.group(2), match.group(2))}', html)
+    if basepath:
+        html = html.replace('href="', f'href="{basepath}')
+        html = html.replace('src="', f'src="{basepath}')
+    return html
+
+
+class Template:
+    # template is split once into static segments and {{ Name }} slots,
+    # so rendering a page is a single join instead of several passes over the whole html
+    def __init__(self, html_template, basepath='', assets=None):
+        self.basepath = basepath
+        self.assets = assets
+        # static parts get the basepath once here, only substituted values are rewritten per page
+        html_template = rewrite_paths(html_template, basepath, assets)
+        self.segments = []
+        self.slots = {}
+        pos = 0
+        for match in PLACEHOLDER_PATTERN.finditer(html_template):
+            self.segments.append(html_template[pos:match.start()])
+            self.slots.setdefault(match.group(1), []).append(len(self.segments))
+            # placeholders without a value are left as they are
+            self.segments.append(match.group(0))
+            pos = match.end()
+        self.segments.append(html_template[pos:])
+
+    @classmethod
+    def from_file(cls, template_path, basepath='', assets=None):
+        with open(template_path, 'r') as f:
+            return cls(f.read(), basepath, assets)
+
+    def render(self, **values):
+        parts = self.segments.copy()
+        for name, value in values.items():
+            if name not in self.slots:
+                continue
+            value = rewrite_paths(value, self.basepath, self.assets)
+            for i in self.slots[name]:
+                parts[i] = value
+        return ''.join(parts)
+
+    # like render(), but writes into f, values can also be iterables of chunks (HTMLNode.iter_html())
+    # which are streamed without ever joining them, such a value can only fill a single slot
+    def render_to(self, f, **values):
+        filled = {}
+        for name, value in values.items():
+            for i in self.slots.get(name, ()):
+                filled[i] = value
+        for i, segment in enumerate(self.segments):
+            if i not in filled:
+                f.write(segment)
+            elif isinstance(filled[i], str):
+                f.write(rewrite_paths(filled[i], self.basepath, self.assets))
+            else:
+                # html chunks always hold whole tags, so a href=" never gets split between two of them
+                for chunk in filled[i]:
+                    f.write(rewrite_paths(chunk, self.basepath, self.assets))
@@ -0,0 +1,65 @@
+import os
+import json
+import tempfile
+import unittest
+from assets import AssetPipeline, fingerprinted_path
+
+
+class TestAssetPipeline(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.static = os.path.join(self.tmp.name, 'static')
+        self.dest = os.path.join(self.tmp.name, 'public')
+        self.state = os.path.join(self.tmp.name, 'cache', 'assets.json')
+        os.makedirs(os.path.join(self.static, 'images'))
+        self.write('index.css', 'body { color: red; }')
+        self.write(os.path.join('images', 'tom.png'), 'not really a png')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, text):
+        with open(os.path.join(self.static, name), 'w') as f:
+            f.write(text)
+
+    def run_pipeline(self):
+        pipeline = AssetPipeline(self.static, self.dest, self.state)
+        assets = pipeline.run()
+        pipeline.save(os.path.join(self.tmp.name, 'asset-manifest.json'))
+        return pipeline, assets
+
+    def test_fingerprinted_path(self):
+        self.assertEqual(os.path.join('images', 'tom.0123456789.png'),
+                         fingerprinted_path(os.path.join('images', 'tom.png'), '0123456789abcdef'))
+
+    def test_files_placed_and_mapped(self):
+        _, assets = self.run_pipeline()
+        self.assertEqual(['/images/tom.png', '/index.css'], sorted(assets))
+        fingerprinted_css = os.path.join(self.dest, assets['/index.css'].lstrip('/'))
+        with open(fingerprinted_css) as f:
+            self.assertEqual('body { color: red; }', f.read())
+        with open(os.path.join(self.tmp.name, 'asset-manifest.json')) as f:
+            self.assertEqual(assets, json.load(f))
+
+    def test_only_changed_files_rehashed(self):
+        _, old_assets = self.run_pipeline()
+        pipeline, _ = self.run_pipeline()
+        self.assertEqual((0, 0), (pipeline.hashed, pipeline.placed))
+
+        self.write('index.css', 'body { color: blue; }')
+        pipeline, assets = self.run_pipeline()
+        self.assertEqual((1, 1, 1), (pipeline.hashed, pipeline.placed, pipeline.removed))
+        self.assertNotEqual(old_assets['/index.css'], assets['/index.css'])
+        self.assertFalse(os.path.exists(os.path.join(self.dest, old_assets['/index.css'].lstrip('/'))))
+
+    def test_removed_source(self):
+        _, old_assets = self.run_pipeline()
+        os.remove(os.path.join(self.static, 'index.css'))
+        pipeline, assets = self.run_pipeline()
+        self.assertNotIn('/index.css', assets)
+        self.assertEqual(1, pipeline.removed)
+        self.assertFalse(os.path.exists(os.path.join(self.dest, old_assets['/index.css'].lstrip('/'))))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,8 @@
+import io
 import unittest
-from block import BlockType, markdown_to_blocks, block_to_block_type, markdown_to_html
+from nodes import LeafNode, ParentNode
+from block import (BlockType, markdown_to_blocks, block_to_block_type, markdown_to_html, iter_blocks, markdown_file_to_html,
+    register_block_type, BLOCK_RENDERERS, BLOCK_DETECTORS)
 
 
 class TestTextToHtml(unittest.TestCase):
@@ -131,3 +134,43 @@ code block nice bro I'm somewhat of a coder myself```
             BlockType.QUOTE, BlockType.CODE, BlockType.ORDERED_LIST]
         self.assertEqual(expected_blocks_types, real_blocks_types)
 
+
+class TestBlockStreaming(unittest.TestCase):
+    def test_code_block_with_blank_lines(self):
+        text = 'before\n\n```\nfirst = 1\n\n\nsecond = 2\n```\n\nafter'
+        expected_blocks = ['before', '```\nfirst = 1\n\n\nsecond = 2\n```', 'after']
+        self.assertEqual(expected_blocks, markdown_to_blocks(text))
+        self.assertEqual(expected_blocks, list(iter_blocks(io.StringIO(text))))
+        self.assertEqual(BlockType.CODE, block_to_block_type(expected_blocks[1]))
+
+    def test_inline_fences_dont_open_code_block(self):
+        text = 'write ```code``` inline\n\nnext'
+        self.assertEqual(['write ```code``` inline', 'next'], list(iter_blocks(io.StringIO(text))))
+
+    def test_same_blocks_as_split(self):
+        text = '\n\n# title  \n\n\n\nfirst line\nsecond line\n\n\n- one\n- two\n \n> quote\n\n'
+        self.assertEqual(markdown_to_blocks(text), list(iter_blocks(io.StringIO(text))))
+
+    def test_file_to_html(self):
+        text = '# title\n\nsome **bold** text\n\n```\ncode\n\nmore code```\n\n1. one\n2. two'
+        self.assertEqual(markdown_to_html(text), ''.join(markdown_file_to_html(io.StringIO(text))))
+
+    def test_blocks_are_lazy(self):
+        lines = iter(['first\n', '\n', 'second\n'])
+        blocks = iter_blocks(lines)
+        self.assertEqual('first', next(blocks))
+        self.assertEqual(['second\n'], list(lines))
+
+
+class TestBlockRegistry(unittest.TestCase):
+    def tearDown(self):
+        BLOCK_RENDERERS.pop('admonition', None)
+        BLOCK_DETECTORS[:] = [entry for entry in BLOCK_DETECTORS if entry[1] != 'admonition']
+
+    def test_register_block_type(self):
+        register_block_type('admonition', lambda block: ParentNode('aside', [LeafNode(None, block[4:])]),
+                            detector=lambda block: block.startswith('!!! '))
+        real_html = markdown_to_html('# title\n\n!!! watch out\n\ntext')
+        self.assertEqual('<div><h1>title</h1><aside>watch out</aside><p>text</p></div>', real_html)
+        self.assertEqual('admonition', block_to_block_type('!!! note'))
+
@@ -0,0 +1,42 @@
+import tempfile
+import unittest
+from unittest.mock import patch
+from block import markdown_to_html
+from cache import RenderCache
+
+
+class TestRenderCache(unittest.TestCase):
+    def test_same_html_and_counters(self):
+        cache = RenderCache()
+        text = '# title\n\nsome **bold** footer\n\nsome **bold** footer'
+        self.assertEqual(markdown_to_html(text), markdown_to_html(text, cache))
+        self.assertEqual({'block': (1, 2), 'document': (0, 1)}, cache.counts())
+        self.assertEqual(markdown_to_html(text), markdown_to_html(text, cache))
+        self.assertEqual((1, 1), cache.counts()['document'])
+
+    def test_lru_bound(self):
+        cache = RenderCache(max_size=10)
+        cache.put('block', 'a', '12345')
+        cache.put('block', 'b', '12345')
+        cache.get('block', 'a')
+        cache.put('block', 'c', '12345')
+        self.assertIsNone(cache.get('block', 'b'))
+        self.assertEqual('12345', cache.get('block', 'a'))
+        self.assertEqual(10, cache.size)
+
+    def test_disk_store_survives(self):
+        with tempfile.TemporaryDirectory() as disk_dir:
+            RenderCache(disk_dir=disk_dir).put('document', '# hi', '<div><h1>hi</h1></div>')
+            cache = RenderCache(disk_dir=disk_dir)
+            self.assertEqual('<div><h1>hi</h1></div>', cache.get('document', '# hi'))
+            self.assertIsNone(RenderCache(disk_dir=disk_dir, namespace='tables').get('document', '# hi'))
+
+    def test_older_version_not_reused(self):
+        with tempfile.TemporaryDirectory() as disk_dir:
+            with patch('cache.CACHE_VERSION', 1):
+                RenderCache(disk_dir=disk_dir).put('block', 'a *b* c', '<p>a *b* c</p>')
+            self.assertIsNone(RenderCache(disk_dir=disk_dir).get('block', 'a *b* c'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import tempfile
+import unittest
+from copy_dir import sync_source_dir_to_destination
+
+
+class TestSyncStatic(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.tmp.name, 'static')
+        self.destination = os.path.join(self.tmp.name, 'public')
+        self.state_path = os.path.join(self.tmp.name, 'cache', 'static.json')
+        os.makedirs(os.path.join(self.source, 'images'))
+        self.write(os.path.join(self.source, 'index.css'), 'body {}')
+        self.write(os.path.join(self.source, 'images', 'a.png'), 'png bytes')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, path, text):
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def sync(self, **kwargs):
+        return sync_source_dir_to_destination(self.source, self.destination, self.state_path, **kwargs)
+
+    def test_unchanged_files_skipped(self):
+        first = self.sync()
+        self.assertEqual((2, 16, 0), (first['copied'], first['copied_bytes'], first['skipped']))
+        second = self.sync()
+        self.assertEqual((0, 2, 16), (second['copied'], second['skipped'], second['skipped_bytes']))
+
+    def test_changed_file_copied(self):
+        self.sync()
+        self.write(os.path.join(self.source, 'index.css'), 'body { color: red }')
+        stats = self.sync(checksum=True)
+        self.assertEqual((1, 1), (stats['copied'], stats['skipped']))
+        with open(os.path.join(self.destination, 'index.css')) as f:
+            self.assertEqual('body { color: red }', f.read())
+
+    def test_removed_file_deleted_generated_kept(self):
+        self.sync()
+        self.write(os.path.join(self.destination, 'index.html'), '<p>generated</p>')
+        os.remove(os.path.join(self.source, 'images', 'a.png'))
+        stats = self.sync()
+        self.assertEqual(1, stats['removed'])
+        self.assertFalse(os.path.exists(os.path.join(self.destination, 'images', 'a.png')))
+        self.assertTrue(os.path.exists(os.path.join(self.destination, 'index.html')))
+
+    def test_hardlink(self):
+        self.sync(link_mode='hardlink')
+        source_stat = os.stat(os.path.join(self.source, 'index.css'))
+        destination_stat = os.stat(os.path.join(self.destination, 'index.css'))
+        self.assertEqual(source_stat.st_ino, destination_stat.st_ino)
+        self.assertEqual(2, self.sync(link_mode='hardlink')['skipped'])
+
+
+if __name__ == '__main__':
+    unittest.main()
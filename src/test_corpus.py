@@ -0,0 +1,28 @@
+import os
+import tempfile
+import unittest
+from block import markdown_to_blocks, block_to_block_type, markdown_to_html, BlockType
+from corpus import CorpusGenerator
+
+
+class TestCorpusGenerator(unittest.TestCase):
+    def test_same_seed_same_page(self):
+        self.assertEqual(CorpusGenerator(seed=3).page('t'), CorpusGenerator(seed=3).page('t'))
+
+    def test_page_renders_every_block_kind(self):
+        markdown = CorpusGenerator(link_density=0.2, seed=1).page('title', page_size=20000)
+        block_types = {block_to_block_type(block) for block in markdown_to_blocks(markdown)}
+        self.assertEqual(set(BlockType), block_types)
+        html = markdown_to_html(markdown)
+        self.assertIn('<a href="https://example.com/docs/', html)
+        self.assertIn('<img src="/images/', html)
+
+    def test_write_tree(self):
+        with tempfile.TemporaryDirectory() as root:
+            paths = CorpusGenerator(seed=2).write_tree(root, pages=10, depth=3, page_size=500)
+            self.assertEqual(10, len(paths))
+            self.assertTrue(all(os.path.exists(path) for path in paths))
+
+
+if __name__ == '__main__':
+    unittest.main()
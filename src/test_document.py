@@ -0,0 +1,69 @@
+import unittest
+from unittest.mock import patch
+import block
+from block import BlockType, markdown_to_html
+from cache import RenderCache
+from document import Document
+
+MARKDOWN = '''## Not yet
+
+# Tolkien Fan Club
+
+![JRR Tolkien sitting](/images/tolkien.png)
+
+Here's the deal, **I like Tolkien**, read [the books](https://example.com/books) and [more](/more).
+
+```
+[not a link](/code) and # not a heading
+```
+
+### Glorfindel'''
+
+
+class TestDocument(unittest.TestCase):
+    def test_title(self):
+        self.assertEqual('Tolkien Fan Club', Document(MARKDOWN).title)
+
+    def test_no_title(self):
+        self.assertEqual('', Document('## only h2\n\nparagraph').title)
+
+    def test_headings(self):
+        expected_headings = [(2, 'Not yet'), (1, 'Tolkien Fan Club'), (3, 'Glorfindel')]
+        self.assertEqual(expected_headings, Document(MARKDOWN).headings)
+
+    def test_links_skip_code(self):
+        expected_links = [('the books', 'https://example.com/books'), ('more', '/more')]
+        self.assertEqual(expected_links, Document(MARKDOWN).links)
+
+    def test_images(self):
+        expected_images = [('JRR Tolkien sitting', '/images/tolkien.png')]
+        self.assertEqual(expected_images, Document(MARKDOWN).images)
+
+    def test_block_types(self):
+        document = Document(MARKDOWN)
+        self.assertEqual(BlockType.CODE, document.block_types[4])
+        self.assertEqual(len(document.blocks), len(document.block_types))
+
+    def test_to_html_matches_markdown_to_html(self):
+        document = Document(MARKDOWN)
+        self.assertEqual(markdown_to_html(MARKDOWN), document.to_html())
+        self.assertEqual(markdown_to_html(MARKDOWN), ''.join(document.html_node().iter_html()))
+
+    def test_to_html_with_cache(self):
+        cache = RenderCache()
+        self.assertEqual(markdown_to_html(MARKDOWN), Document(MARKDOWN).to_html(cache))
+        self.assertEqual(markdown_to_html(MARKDOWN), Document(MARKDOWN).to_html(cache))
+        self.assertEqual((1, 1), cache.counts()['document'])
+
+    def test_blocks_split_once(self):
+        with patch('document.markdown_to_blocks', wraps=block.markdown_to_blocks) as split:
+            document = Document(MARKDOWN)
+            document.title
+            document.headings
+            document.links
+            document.to_html()
+        self.assertEqual(1, split.call_count)
+
+
+if __name__ == '__main__':
+    unittest.main()
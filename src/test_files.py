@@ -0,0 +1,20 @@
+import os
+import json
+import tempfile
+import unittest
+from files import write_json
+
+
+class TestWriteJson(unittest.TestCase):
+    def test_write_json(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, 'cache', 'state.json')
+            write_json(path, {'pages': [1, 2]})
+            write_json(path, {'pages': [3]}, indent=2)
+            with open(path) as f:
+                self.assertEqual({'pages': [3]}, json.load(f))
+            self.assertEqual(['state.json'], os.listdir(os.path.dirname(path)))
+
+
+if __name__ == '__main__':
+    unittest.main()
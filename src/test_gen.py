@@ -1,5 +1,12 @@
+import io
+import os
 import unittest
-from gen import extract_title
+from unittest.mock import patch
+import gen
+from gen import (extract_title, generate_pages_recursive, generate_pages_parallel, split_front_matter,
+    read_front_matter)
+from manifest import BuildManifest
+from build_fixture import BuildTestCase
 
 
 class TestHtmlGen(unittest.TestCase):
@@ -18,3 +25,156 @@ class TestHtmlGen(unittest.TestCase):
     def test_generate_page(self):
         pass
 
+
+class TestFrontMatter(unittest.TestCase):
+    def test_split_front_matter(self):
+        text = '---\ntitle: "Tom: the Bombadil"\ndate: 2024-03-01\ndraft: false\nweight: 3\ntags: [tolkien, lore]\n---\n# Tom\n\nbody'
+        metadata, body = split_front_matter(text)
+        expected_metadata = {'title': 'Tom: the Bombadil', 'date': '2024-03-01', 'draft': False, 'weight': 3,
+                             'tags': ['tolkien', 'lore']}
+        self.assertEqual(expected_metadata, metadata)
+        self.assertEqual('# Tom\n\nbody', body)
+
+    def test_block_list(self):
+        text = '---\n# comment\ntags:\n  - elves\n  - "rivendell"\nslug: glorfindel\n---\n# Glorfindel'
+        metadata, _ = split_front_matter(text)
+        self.assertEqual({'tags': ['elves', 'rivendell'], 'slug': 'glorfindel'}, metadata)
+
+    def test_no_front_matter(self):
+        text = '# title\n\n---\n\nnot front matter'
+        self.assertEqual(({}, text), split_front_matter(text))
+
+    def test_invalid_front_matter(self):
+        with self.assertRaises(ValueError):
+            split_front_matter('---\ntitle: x\n# never closed')
+        with self.assertRaises(ValueError):
+            split_front_matter('---\nno colon here\n---\n# x')
+
+    def test_read_front_matter(self):
+        f = io.StringIO('---\nslug: tom\n---\n# Tom')
+        self.assertEqual({'slug': 'tom'}, read_front_matter(f))
+        self.assertEqual('# Tom', f.read())
+        f = io.StringIO('# Tom')
+        self.assertEqual({}, read_front_matter(f))
+        self.assertEqual('# Tom', f.read())
+
+
+class TestIncrementalBuild(BuildTestCase):
+    def setUp(self):
+        super().setUp()
+        self.manifest_path = os.path.join(self.cache, 'manifest.json')
+        self.write('index.md', '# home\n\nhello')
+        self.write(os.path.join('blog', 'post.md'), '# post\n\n**bold** text')
+
+    def build(self, basepath=''):
+        manifest = BuildManifest(self.manifest_path, self.template, basepath)
+        generate_pages_recursive(self.content, self.template, self.dest, basepath, manifest)
+        manifest.prune()
+        manifest.save()
+        return manifest
+
+    def test_unchanged_pages_skipped(self):
+        first = self.build()
+        self.assertEqual((2, 0), (first.rebuilt, first.skipped))
+        second = self.build()
+        self.assertEqual((0, 2), (second.rebuilt, second.skipped))
+
+    def test_changed_page_rebuilt(self):
+        self.build()
+        self.write('index.md', '# home\n\nhello again')
+        manifest = self.build()
+        self.assertEqual((1, 1), (manifest.rebuilt, manifest.skipped))
+        self.assertIn('hello again', self.read('index.html'))
+
+    def test_template_and_basepath_invalidate(self):
+        self.build()
+        self.write(self.template, '<h1>{{ Title }}</h1>{{ Content }}')
+        self.assertEqual(2, self.build().rebuilt)
+        self.assertEqual(2, self.build('/site').rebuilt)
+        self.assertEqual(0, self.build('/site').rebuilt)
+
+    def test_assets_invalidate(self):
+        self.build()
+        manifest = BuildManifest(self.manifest_path, self.template, '', {'/index.css': '/index.abc.css'})
+        self.assertTrue(manifest.invalidated)
+
+    def test_renderer_version_invalidates(self):
+        self.build()
+        with patch('manifest.CACHE_VERSION', -1):
+            self.assertTrue(BuildManifest(self.manifest_path, self.template, '').invalidated)
+        self.assertFalse(BuildManifest(self.manifest_path, self.template, '').invalidated)
+
+    def test_deleted_source_pruned(self):
+        self.build()
+        os.remove(os.path.join(self.content, 'blog', 'post.md'))
+        manifest = self.build()
+        self.assertEqual(1, manifest.pruned)
+        self.assertFalse(os.path.exists(os.path.join(self.dest, 'blog', 'post.html')))
+
+
+class TestParallelBuild(BuildTestCase):
+    template_html = '<title>{{ Title }}</title><link href="/index.css"><body>{{ Content }}</body>'
+
+    def setUp(self):
+        super().setUp()
+        self.write_posts(6)
+
+    def test_same_output_as_serial(self):
+        serial = os.path.join(self.root, 'serial')
+        parallel = os.path.join(self.root, 'parallel')
+        generate_pages_recursive(self.content, self.template, serial, '/base')
+        generate_pages_parallel(self.content, self.template, parallel, '/base', workers=2)
+        self.assertEqual(self.read_tree(serial), self.read_tree(parallel))
+
+    def test_error_names_source(self):
+        broken = os.path.join(self.content, 'blog', 'broken.md')
+        self.write(broken, 'no title here')
+        with self.assertRaises(ValueError) as cm:
+            generate_pages_parallel(self.content, self.template, self.dest, '', workers=2)
+        self.assertIn(broken, str(cm.exception))
+
+
+class TestStreamedBuild(BuildTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write('changelog.md',
+                   'intro [home](/index.html)\n\n# Changelog\n\n```\nfixed\n\nthings```\n\n- one\n- two')
+
+    def build(self, name, threshold, **kwargs):
+        dest = os.path.join(self.root, name)
+        with patch.object(gen, 'STREAM_THRESHOLD', threshold):
+            if kwargs:
+                generate_pages_parallel(self.content, self.template, dest, '/base', **kwargs)
+            else:
+                generate_pages_recursive(self.content, self.template, dest, '/base')
+        with open(os.path.join(dest, 'changelog.html')) as f:
+            return f.read()
+
+    def test_same_output_as_in_memory(self):
+        expected_html = self.build('memory', 1 << 30)
+        self.assertIn('<title>Changelog</title>', expected_html)
+        self.assertEqual(expected_html, self.build('streamed', 0))
+        self.assertEqual(expected_html, self.build('parallel', 0, workers=2))
+
+    def test_missing_title(self):
+        self.write('changelog.md', '## no h1 here')
+        with self.assertRaises(ValueError):
+            self.build('streamed', 0)
+
+    def test_render_error_keeps_page(self):
+        expected_html = self.build('streamed', 0)
+        with open(os.path.join(self.content, 'changelog.md'), 'a') as f:
+            f.write('\n\n1. one\n2. ')
+        with self.assertRaises(ValueError):
+            self.build('streamed', 0)
+        dest = os.path.join(self.root, 'streamed')
+        self.assertEqual(['changelog.html'], os.listdir(dest))
+        with open(os.path.join(dest, 'changelog.html')) as f:
+            self.assertEqual(expected_html, f.read())
+
+    def test_front_matter(self):
+        self.write('changelog.md', '---\ntitle: Release notes\n---\n# Changelog\n\n- one')
+        expected_html = self.build('memory', 1 << 30)
+        self.assertIn('<title>Release notes</title>', expected_html)
+        self.assertNotIn('---', expected_html)
+        self.assertEqual(expected_html, self.build('streamed', 0))
@@ -0,0 +1,95 @@
+import os
+import struct
+import tempfile
+import unittest
+import images
+from images import ImagePipeline, image_dimensions, use_image_info, current_image_info
+from nodes import TextNode, TextType
+from inline import text_node_to_html_node
+
+
+def png_header(width, height):
+    return b'\x89PNG\r\n\x1a\n' + struct.pack('>I', 13) + b'IHDR' + struct.pack('>II', width, height) + b'\x08\x06\x00\x00\x00'
+
+
+class TestImageRendering(unittest.TestCase):
+    def tearDown(self):
+        use_image_info(None)
+
+    def test_plain_by_default(self):
+        node = text_node_to_html_node(TextNode('tom', TextType.IMAGE, '/images/tom.png'))
+        self.assertEqual('<img src="/images/tom.png" alt="tom">tom</img>', node.to_html())
+        self.assertIsNone(current_image_info())
+
+    def test_dimensions_srcset_and_lazy(self):
+        use_image_info({'/images/tom.png': {'width': 1200, 'height': 600, 'srcset': [
+            ['/images/tom.abc.480w.webp', 480], ['/images/tom.abc.1200w.webp', 1200]]}})
+        node = text_node_to_html_node(TextNode('tom', TextType.IMAGE, '/images/tom.png'))
+        expected_html = ('<img src="/images/tom.png" alt="tom" width="1200" height="600" '
+                         'srcset="/images/tom.abc.480w.webp 480w, /images/tom.abc.1200w.webp 1200w" loading="lazy">'
+                         'tom</img>')
+        self.assertEqual(expected_html, node.to_html())
+
+    def test_unknown_image_still_lazy(self):
+        use_image_info({})
+        node = text_node_to_html_node(TextNode('x', TextType.IMAGE, 'https://example.com/x.png'))
+        self.assertEqual('<img src="https://example.com/x.png" alt="x" loading="lazy">x</img>', node.to_html())
+        self.assertEqual({}, current_image_info())
+
+
+class TestImagePipeline(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        self.static = os.path.join(root, 'static')
+        self.dest = os.path.join(root, 'public')
+        self.state = os.path.join(root, 'cache', 'images.json')
+        self.variants = os.path.join(root, 'variants')
+        os.makedirs(os.path.join(self.static, 'images'))
+        with open(os.path.join(self.static, 'images', 'tom.png'), 'wb') as f:
+            f.write(png_header(1026, 388))
+        with open(os.path.join(self.static, 'images', 'anim.gif'), 'wb') as f:
+            f.write(b'GIF89a' + struct.pack('<HH', 64, 32))
+        with open(os.path.join(self.static, 'index.css'), 'w') as f:
+            f.write('body {}')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_pipeline(self):
+        pipeline = ImagePipeline(self.static, self.dest, self.state, self.variants)
+        info = pipeline.run()
+        pipeline.save()
+        return pipeline, info
+
+    def test_header_dimensions(self):
+        self.assertEqual((1026, 388), image_dimensions(os.path.join(self.static, 'images', 'tom.png')))
+        self.assertEqual((64, 32), image_dimensions(os.path.join(self.static, 'images', 'anim.gif')))
+        self.assertIsNone(image_dimensions(os.path.join(self.static, 'index.css')))
+
+    @unittest.skipIf(images.Image is not None, 'variants are made when Pillow is installed')
+    def test_dimensions_without_pillow(self):
+        _, info = self.run_pipeline()
+        self.assertEqual({'/images/anim.gif': {'width': 64, 'height': 32, 'srcset': []},
+                          '/images/tom.png': {'width': 1026, 'height': 388, 'srcset': []}}, info)
+
+    def test_unchanged_images_skipped(self):
+        self.run_pipeline()
+        pipeline, _ = self.run_pipeline()
+        self.assertEqual(0, pipeline.processed)
+        os.remove(os.path.join(self.static, 'images', 'anim.gif'))
+        _, info = self.run_pipeline()
+        self.assertEqual(['/images/tom.png'], list(info))
+
+    @unittest.skipIf(images.Image is None, 'needs Pillow')
+    def test_webp_variants(self):
+        images.Image.new('RGB', (1200, 600)).save(os.path.join(self.static, 'images', 'tom.png'))
+        _, info = self.run_pipeline()
+        srcset = info['/images/tom.png']['srcset']
+        self.assertEqual([480, 960, 1200], [width for _, width in srcset])
+        for url, _ in srcset:
+            self.assertTrue(os.path.exists(os.path.join(self.dest, url.lstrip('/'))))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,9 @@
+import random
 import unittest
 from nodes import TextType, TextNode, LeafNode
-from inline import (text_node_to_html_node, split_nodes_delimiter, extract_markdown_images, extract_markdown_links,
-    split_nodes_image, split_nodes_link, text_to_textnodes)
+from inline import (TEXT_NODE_RENDERERS, register_text_type, text_node_to_html_node, split_nodes_delimiter, extract_markdown_images, extract_markdown_links,
+    split_nodes_image, split_nodes_link, text_to_textnodes, text_to_textnodes_chained, scan_inline, parse_inline,
+    iter_plain_text)
 
 
 class TestTextNodeToHtmlNode(unittest.TestCase):
@@ -17,6 +19,18 @@ class TestTextNodeToHtmlNode(unittest.TestCase):
         leaf_node_html = leaf_node.to_html()
         self.assertEqual(leaf_node_html, f'<img src="{node.url}" alt="{node.text}">{node.text}</img>')
 
+    def test_registered_text_type(self):
+        register_text_type('strike', lambda text_node: LeafNode('s', text_node.text))
+        try:
+            leaf_node = text_node_to_html_node(TextNode('old', 'strike'))
+        finally:
+            TEXT_NODE_RENDERERS.pop('strike')
+        self.assertEqual('<s>old</s>', leaf_node.to_html())
+
+    def test_unknown_text_type(self):
+        with self.assertRaises(ValueError):
+            text_node_to_html_node(TextNode('old', 'strike'))
+
 
 class TestSplitNodesDelimiter(unittest.TestCase):
     def test_center_delimiter(self):
@@ -66,6 +80,16 @@ class TextRegexExtraction(unittest.TestCase):
         images = [("image", "https://i.imgur.com/zjjcJKZ.png")]
         self.assertListEqual(images + links, matches)
 
+    def test_extract_bracket_in_text(self):
+        matches = extract_markdown_links('see [array[0]](/docs/arrays) and [< Back Home](/)')
+        self.assertListEqual([('array[0]', '/docs/arrays'), ('< Back Home', '/')], matches)
+
+    def test_extract_unicode_query_fragment(self):
+        matches = extract_markdown_links('[Glorfindel — Эльф](https://example.com/search?q=elf&page=2#top) [up](#intro)')
+        self.assertListEqual([('Glorfindel — Эльф', 'https://example.com/search?q=elf&page=2#top'), ('up', '#intro')], matches)
+        images = extract_markdown_images('![снимок экрана](/images/shot.png?v=3)')
+        self.assertListEqual([('снимок экрана', '/images/shot.png?v=3')], images)
+
 
 class TestSplitNodesImage(unittest.TestCase):
     def test_split_two_images(self):
@@ -149,6 +173,13 @@ class TestSplitNodesLink(unittest.TestCase):
             TextNode(' and image ', TextType.TEXT), TextNode('to youtube', TextType.IMAGE, 'https://www.youtube.com/@bootdotdev')]
         self.assertEqual(expected_new_nodes, real_new_nodes)
 
+    def test_many_links_with_duplicates(self):
+        text = ''.join(f'x[link {i % 10}](https://a.com/{i % 10})' for i in range(500))
+        real_new_nodes = split_nodes_link([TextNode(text, TextType.TEXT)])
+        self.assertEqual(1000, len(real_new_nodes))
+        self.assertEqual(TextNode('link 7', TextType.LINK, 'https://a.com/7'), real_new_nodes[-5])
+        self.assertEqual(TextNode('x', TextType.TEXT), real_new_nodes[-6])
+
 
 class TestTextToNodesWrapper(unittest.TestCase):
     def test_consecutive_types(self):
@@ -168,3 +199,114 @@ class TestTextToNodesWrapper(unittest.TestCase):
             TextNode(' and an ', TextType.TEXT), TextNode('obi wan image', TextType.IMAGE, 'https://i.imgur.com/fJRm4Vk.jpeg'),
             TextNode(' ', TextType.TEXT), TextNode('just for fun i guess', TextType.ITALIC),]
         self.assertEqual(expected_nodes, real_nodes)
+
+
+class TestScanInline(unittest.TestCase):
+    def test_same_as_chained(self):
+        texts = [
+            "This is **text** with an _italic_ word and a `code block` and an ![obi wan image](https://i.imgur.com/fJRm4Vk.jpeg) and a [link](https://boot.dev)",
+            "**bold** at start, ![image](/images/tom.png) and [< back](/) **more** [home](/index.html)",
+            "***strong*** text, ****, `` and trailing _italic_",
+            "plain text without anything [ ] ! * special",
+            "",
+        ]
+        for text in texts:
+            self.assertEqual(text_to_textnodes_chained(text), scan_inline(text))
+
+    def test_code_protects_delimiters(self):
+        real_nodes = scan_inline('call `my_func(**kwargs)` here')
+        expected_nodes = [TextNode('call ', TextType.TEXT), TextNode('my_func(**kwargs)', TextType.CODE),
+            TextNode(' here', TextType.TEXT)]
+        self.assertEqual(expected_nodes, real_nodes)
+
+    def test_unbalanced_raises(self):
+        with self.assertRaises(ValueError):
+            scan_inline('an **unclosed bold')
+
+    def test_parser_selectable(self):
+        text = 'some **bold** and [link](https://boot.dev)'
+        self.assertEqual(text_to_textnodes_chained(text), text_to_textnodes(text, parser='chained'))
+        self.assertEqual(scan_inline(text), text_to_textnodes(text, parser='scan'))
+        self.assertEqual(parse_inline(text), text_to_textnodes(text))
+        with self.assertRaises(ValueError):
+            text_to_textnodes(text, parser='regex')
+
+
+# CommonMark emphasis examples with <i>/<b> for <em>/<strong>, plus the dialect's code spans and links
+CONFORMANCE = [
+    ('*foo bar*', '<i>foo bar</i>'),
+    ('a * foo bar*', 'a * foo bar*'),
+    ('foo*bar*', 'foo<i>bar</i>'),
+    ('_foo bar_', '<i>foo bar</i>'),
+    ('snake_case_name', 'snake_case_name'),
+    ('foo_bar_', 'foo_bar_'),
+    ('_foo_bar', '_foo_bar'),
+    ('пример_слова_тут', 'пример_слова_тут'),
+    ('*foo*bar', '<i>foo</i>bar'),
+    ('**foo bar**', '<b>foo bar</b>'),
+    ('__foo bar__', '<b>foo bar</b>'),
+    ('*foo **bar** baz*', '<i>foo <b>bar</b> baz</i>'),
+    ('_foo __bar__ baz_', '<i>foo <b>bar</b> baz</i>'),
+    ('*foo _bar_ baz*', '<i>foo <i>bar</i> baz</i>'),
+    ('***foo***', '<i><b>foo</b></i>'),
+    ('*foo**bar**baz*', '<i>foo<b>bar</b>baz</i>'),
+    ('*foo**bar*', '<i>foo**bar</i>'),
+    ('**foo*bar*baz**', '<b>foo<i>bar</i>baz</b>'),
+    ('*(*foo*)*', '<i>(<i>foo</i>)</i>'),
+    ('_(_foo_)_', '<i>(<i>foo</i>)</i>'),
+    ('**foo "*bar*" foo**', '<b>foo "<i>bar</i>" foo</b>'),
+    ('*foo**', '<i>foo</i>*'),
+    ('**foo*', '*<i>foo</i>'),
+    ('**foo', '**foo'),
+    ('foo**', 'foo**'),
+    ('****', '****'),
+    ('_a **b_ c**', '<i>a **b</i> c**'),
+    ('**foo [bar](/url)**', '<b>foo <a href="/url">bar</a></b>'),
+    ('[**bold** link](/url)', '<a href="/url"><b>bold</b> link</a>'),
+    ('[**a** [b](/c)](/d)', '[<b>a</b> <a href="/c">b</a>](/d)'),
+    ('[foo [bar](/uri)](/uri)', '[foo <a href="/uri">bar</a>](/uri)'),
+    ('`code **not bold**`', '<code>code **not bold**</code>'),
+    ('`` a ` b ``', '<code> a ` b </code>'),
+    ('`unclosed', '`unclosed'),
+    ('an **unclosed bold', 'an **unclosed bold'),
+]
+
+
+def inline_html(text):
+    return ''.join(text_node_to_html_node(text_node).to_html() for text_node in text_to_textnodes(text))
+
+
+class TestParseInline(unittest.TestCase):
+    def test_conformance(self):
+        for text, expected_html in CONFORMANCE:
+            with self.subTest(text=text):
+                self.assertEqual(expected_html, inline_html(text))
+
+    def test_flat_spans_unchanged(self):
+        text = "**bold** at start, ![image](/images/tom.png) and [< back](/) _more_ [home](/index.html) `code`"
+        self.assertEqual(scan_inline(text), parse_inline(text))
+
+    def test_nested_nodes(self):
+        expected_nodes = [TextNode(None, TextType.BOLD, children=[
+            TextNode('see ', TextType.TEXT),
+            TextNode(None, TextType.LINK, '/x', [TextNode('the ', TextType.TEXT), TextNode('docs', TextType.ITALIC)]),
+        ])]
+        self.assertEqual(expected_nodes, parse_inline('**see [the _docs_](/x)**'))
+        self.assertEqual(['see ', 'the ', 'docs'], list(iter_plain_text(parse_inline('**see [the _docs_](/x)**'))))
+
+    def test_never_raises(self):
+        rng = random.Random(0)
+        for _ in range(500):
+            text = ''.join(rng.choice('*_`[]()! a') for _ in range(rng.randint(1, 40)))
+            with self.subTest(text=text):
+                # spans only drop delimiters and link markup, nothing is made up
+                plain_text = ''.join(iter_plain_text(text_to_textnodes(text)))
+                self.assertLessEqual(len(plain_text), len(text))
+                inline_html(text)
+
+    def test_deep_nesting(self):
+        depth = 5000
+        html = inline_html('*a ' * depth + 'b' + ' a*' * depth)
+        self.assertEqual(depth, html.count('<i>'))
+        self.assertTrue(html.startswith('<i>a <i>a '))
+
@@ -0,0 +1,117 @@
+import os
+import tempfile
+import unittest
+from xml.etree import ElementTree
+from listing import Listings, paginate, listing_path, atom_feed
+from site_index import SiteIndex
+from template import Template
+
+
+class TestListings(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dest = os.path.join(self.tmp.name, 'public')
+        self.index = SiteIndex(None, self.dest)
+        for i in range(5):
+            self.add_post(i, f'Post {i}', f'2024-01-0{i + 1}')
+        self.index.record('about.md', os.path.join(self.dest, 'about', 'index.html'), 'About', {})
+        self.template = Template('<title>{{ Title }}</title><body>{{ Content }}</body>', '/base')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def add_post(self, i, title, date):
+        self.index.record(f'post{i}.md', os.path.join(self.dest, 'blog', f'post{i}', 'index.html'), title,
+                          {'date': date, 'tags': ['lore']})
+
+    def listings(self, per_page=2):
+        return Listings(['blog'], self.template, self.dest, per_page, 'https://example.com', '/base')
+
+    def read(self, page_number):
+        with open(listing_path(self.dest, 'blog', page_number)) as f:
+            return f.read()
+
+    def test_paginate(self):
+        self.assertEqual([[1, 2], [3, 4], [5]], paginate([1, 2, 3, 4, 5], 2))
+        self.assertEqual([], paginate([], 2))
+
+    def test_pages_and_feed(self):
+        self.listings().generate(self.index)
+        first_page = self.read(1)
+        self.assertIn('<title>Blog</title>', first_page)
+        self.assertIn('<a href="/base/blog/post4/">Post 4</a> <time datetime="2024-01-05">2024-01-05</time>', first_page)
+        self.assertIn('<nav><a href="/base/blog/page/2/">Older posts</a></nav>', first_page)
+        self.assertNotIn('About', first_page)
+        last_page = self.read(3)
+        self.assertIn('<title>Blog, page 3</title>', last_page)
+        self.assertIn('Post 0', last_page)
+        self.assertIn('<nav><a href="/base/blog/page/2/">Newer posts</a></nav>', last_page)
+
+        with open(os.path.join(self.dest, 'blog', 'atom.xml')) as f:
+            feed = ElementTree.fromstring(f.read())
+        namespace = {'atom': 'http://www.w3.org/2005/Atom'}
+        ids = [element.text for element in feed.findall('atom:entry/atom:id', namespace)]
+        self.assertEqual('https://example.com/base/blog/post4/', ids[0])
+        self.assertEqual(5, len(ids))
+        self.assertEqual('2024-01-05T00:00:00Z', feed.find('atom:updated', namespace).text)
+
+    def test_only_changed_pages_written(self):
+        self.listings().generate(self.index)
+        self.add_post(1, 'Post 1 renamed', '2024-01-02')
+        listings = self.listings()
+        listings.generate(self.index)
+        # only the second page and the feed list post 1
+        self.assertEqual((2, 2), (listings.written, listings.unchanged))
+        self.assertIn('Post 1 renamed', self.read(2))
+
+    def test_stale_pages_removed(self):
+        self.listings().generate(self.index)
+        listings = self.listings(per_page=10)
+        listings.generate(self.index)
+        self.assertEqual(2, listings.removed)
+        self.assertFalse(os.path.exists(listing_path(self.dest, 'blog', 2)))
+
+    def test_emptied_section_removed(self):
+        self.listings().generate(self.index)
+        for i in range(5):
+            self.index.remove(f'post{i}.md')
+        listings = self.listings()
+        listings.generate(self.index)
+        self.assertEqual((0, 4), (listings.written, listings.removed))
+        self.assertFalse(os.path.exists(listing_path(self.dest, 'blog', 1)))
+        self.assertFalse(os.path.exists(os.path.join(self.dest, 'blog', 'atom.xml')))
+
+    def test_feed_removed_without_site_url(self):
+        self.listings().generate(self.index)
+        listings = Listings(['blog'], self.template, self.dest, 2)
+        listings.generate(self.index)
+        self.assertEqual(1, listings.removed)
+        self.assertTrue(os.path.exists(listing_path(self.dest, 'blog', 1)))
+        self.assertFalse(os.path.exists(os.path.join(self.dest, 'blog', 'atom.xml')))
+
+    def test_content_page_conflict(self):
+        self.index.record('blog.md', os.path.join(self.dest, 'blog', 'index.html'), 'Blog', {})
+        listings = self.listings()
+        listings.generate(self.index)
+        self.assertEqual({'blog'}, listings.skipped)
+        self.assertEqual(0, listings.written)
+        self.assertFalse(os.path.exists(self.dest))
+        self.assertIn('skipped blog', listings.summary())
+
+    def test_no_feed_without_site_url(self):
+        listings = Listings(['blog'], self.template, self.dest, 2)
+        listings.generate(self.index)
+        self.assertEqual(3, listings.written)
+        self.assertFalse(os.path.exists(os.path.join(self.dest, 'blog', 'atom.xml')))
+        with self.assertRaises(ValueError):
+            Listings(['blog'], self.template, self.dest, 2, 'example.com')
+
+    def test_escaping(self):
+        feed = atom_feed('Blog', [{'title': 'Tom & "Goldberry"', 'url': '/blog/tom/', 'date': None,
+                                   'updated': '2024-02-02', 'tags': []}], '', 'blog')
+        self.assertIn('<title>Tom &amp; &quot;Goldberry&quot;</title>', feed)
+        ElementTree.fromstring(feed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,4 @@
+import io
 import unittest
 from nodes import (TextNode, TextType, HTMLNode, 
     LeafNode, ParentNode)
@@ -24,6 +25,16 @@ class TestTextNode(unittest.TestCase):
         node2 = TextNode("This is a image node", TextType.IMAGE, url='/test/url')
         self.assertNotEqual(node, node2)
 
+    def test_hash_consistent_with_eq(self):
+        node = TextNode("This is a image node", TextType.IMAGE, url='/test/url')
+        node2 = TextNode("This is a image node", TextType.IMAGE, url='/test/url')
+        self.assertEqual(hash(node), hash(node2))
+        self.assertEqual(1, len({node, node2}))
+
+    def test_no_instance_dict(self):
+        self.assertFalse(hasattr(TextNode('a', TextType.TEXT), '__dict__'))
+        self.assertFalse(hasattr(ParentNode('p', [LeafNode(None, 'a')]), '__dict__'))
+
 
 class TestHTMLNode(unittest.TestCase):
     def test_props_to_html_first(self):
@@ -90,6 +101,31 @@ class TestParentNode(unittest.TestCase):
         self.assertEqual(expected_html, real_html)
 
 
+    def test_iter_html_same_as_to_html(self):
+        another_child = LeafNode("a", "dum dum dum", props={'href': 'https://lmao.com'})
+        parent_node = ParentNode("div", [ParentNode("span", [LeafNode("b", "grandchild")]), ParentNode('i', [another_child])])
+        chunks = list(parent_node.iter_html())
+        self.assertEqual(parent_node.to_html(), ''.join(chunks))
+        self.assertIn('<a href="https://lmao.com">dum dum dum</a>', chunks)
+
+    def test_props(self):
+        parent_node = ParentNode('a', [LeafNode('b', 'bold'), LeafNode(None, ' link')], {'href': '/docs'})
+        self.assertEqual('<a href="/docs"><b>bold</b> link</a>', parent_node.to_html())
+
+    def test_very_deep_tree(self):
+        node = LeafNode('b', 'deep')
+        for _ in range(5000):
+            node = ParentNode('span', [node])
+        html = node.to_html()
+        self.assertTrue(html.startswith('<span>' * 5000 + '<b>deep</b>'))
+
+    def test_write_html(self):
+        node = ParentNode('p', [LeafNode(None, 'text '), LeafNode('code', 'x = 1')])
+        f = io.StringIO()
+        node.write_html(f)
+        self.assertEqual('<p>text <code>x = 1</code></p>', f.getvalue())
+
+
 if __name__ == '__main__':
     unittest.main()
 
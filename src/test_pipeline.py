@@ -0,0 +1,68 @@
+import os
+import unittest
+from gen import generate_pages_recursive
+from manifest import BuildManifest
+from site_index import SiteIndex
+from pipeline import AsyncPipeline
+from template import Template
+from build_fixture import BuildTestCase
+
+
+class TestAsyncPipeline(BuildTestCase):
+    template_html = '<title>{{ Title }}</title><link href="/index.css"><body>{{ Content }}</body>'
+
+    def setUp(self):
+        super().setUp()
+        self.write_posts(12)
+        self.write(os.path.join('blog', 'draft.md'), '---\ndraft: true\n---\n# draft')
+
+    def test_same_output_as_serial(self):
+        serial = os.path.join(self.root, 'serial')
+        piped = os.path.join(self.root, 'piped')
+        generate_pages_recursive(self.content, self.template, serial, '/base', site_index=SiteIndex(None, serial))
+        # small queues and few tasks so stages have to wait on each other
+        pipeline = AsyncPipeline(self.template, '/base', workers=2, site_index=SiteIndex(None, piped), readers=2,
+                                 writers=1, queue_size=2)
+        pipeline.run(self.content, piped)
+        self.assertEqual(self.read_tree(serial), self.read_tree(piped))
+        self.assertEqual(12, pipeline.pages)
+        self.assertLessEqual(pipeline.depths['read'][2], 2)
+        self.assertIn('12 pages', pipeline.summary())
+
+    def test_incremental(self):
+        manifest_path = os.path.join(self.cache, 'manifest.json')
+        manifest = BuildManifest(manifest_path, self.template, '')
+        AsyncPipeline(self.template, '', workers=1, manifest=manifest).run(self.content, self.dest)
+        manifest.save()
+        self.write(os.path.join('blog', 'post3.md'), '# post 3\n\nchanged')
+        pipeline = AsyncPipeline(self.template, '', workers=1, manifest=BuildManifest(manifest_path, self.template, ''))
+        pipeline.run(self.content, self.dest)
+        self.assertEqual(1, pipeline.pages)
+
+    def test_error_names_source(self):
+        broken = os.path.join(self.content, 'blog', 'broken.md')
+        self.write(broken, 'no title here')
+        with self.assertRaises(ValueError) as cm:
+            AsyncPipeline(self.template, '', workers=2, queue_size=1).run(self.content, self.dest)
+        self.assertIn(broken, str(cm.exception))
+
+    def test_failed_write_keeps_page(self):
+        AsyncPipeline(self.template, '', workers=1).run(self.content, self.dest)
+        expected_tree = self.read_tree(self.dest)
+        with self.assertRaises(ValueError):
+            AsyncPipeline(self.template, '', workers=1, template=BrokenTemplate('<body>{{ Content }}</body>')).run(
+                self.content, self.dest)
+        self.assertEqual(expected_tree, self.read_tree(self.dest))
+        leftovers = [name for name in os.listdir(os.path.join(self.dest, 'blog')) if not name.endswith('.html')]
+        self.assertEqual([], leftovers)
+
+
+# fails after writing the start of the page
+class BrokenTemplate(Template):
+    def render_to(self, f, **values):
+        f.write('<body>')
+        raise ValueError('render failed')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import gzip
+import tempfile
+import unittest
+from postprocess import PostProcessor, minify_html, minify_css
+
+
+class TestMinify(unittest.TestCase):
+    def test_minify_html(self):
+        html = ('<!doctype html>\n<html>\n  <head>\n    <title> Tom </title>\n  </head>\n  <!-- note -->\n'
+                '  <body>\n    <p>Old   Tom <b>Bombadil</b> <i>sings</i></p>\n  </body>\n</html>\n')
+        expected_html = ('<!doctype html><html><head><title>Tom</title></head><body>'
+                         '<p>Old Tom <b>Bombadil</b> <i>sings</i></p></body></html>')
+        self.assertEqual(expected_html, minify_html(html))
+
+    def test_minify_html_keeps_pre(self):
+        html = '<div>\n  <pre><code>\nfirst  line\n\n  second</code></pre>\n</div>'
+        self.assertEqual('<div><pre><code>\nfirst  line\n\n  second</code></pre></div>', minify_html(html))
+
+    def test_minify_css(self):
+        css = '/* theme */\nbody {\n  color: #fff;\n  font-family: "Old  Tom", serif;\n}\n\na :hover,\nb > i {\n  margin: 0 auto;\n}\n'
+        expected_css = 'body{color:#fff;font-family:"Old  Tom",serif}a :hover,b>i{margin:0 auto}'
+        self.assertEqual(expected_css, minify_css(css))
+
+
+class TestPostProcessor(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dest = os.path.join(self.tmp.name, 'public')
+        self.state = os.path.join(self.tmp.name, 'cache', 'postprocess.json')
+        os.makedirs(os.path.join(self.dest, 'images'))
+        self.write('index.html', '<html>\n  <body>\n    <p>hello</p>\n  </body>\n</html>\n')
+        self.write('index.css', 'body {\n  color: red;\n}\n')
+        self.write(os.path.join('images', 'tom.png'), '\x89PNG not really')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, text):
+        with open(os.path.join(self.dest, name), 'w') as f:
+            f.write(text)
+
+    def read(self, name):
+        with open(os.path.join(self.dest, name), 'rb') as f:
+            return f.read()
+
+    def run_processor(self, workers=1):
+        processor = PostProcessor(self.dest, self.state, workers=workers)
+        processor.run()
+        processor.save()
+        return processor
+
+    def test_minified_and_compressed(self):
+        processor = self.run_processor()
+        self.assertEqual(2, processor.processed)
+        self.assertEqual(b'<html><body><p>hello</p></body></html>', self.read('index.html'))
+        self.assertEqual(self.read('index.html'), gzip.decompress(self.read('index.html.gz')))
+        self.assertEqual(b'body{color:red}', gzip.decompress(self.read('index.css.gz')))
+        self.assertFalse(os.path.exists(os.path.join(self.dest, 'images', 'tom.png.gz')))
+
+    def test_unchanged_files_skipped(self):
+        self.run_processor()
+        processor = self.run_processor()
+        self.assertEqual((0, 2), (processor.processed, processor.skipped))
+        self.write('index.css', 'body {\n  color: blue;\n}\n')
+        processor = self.run_processor(workers=2)
+        self.assertEqual((1, 1), (processor.processed, processor.skipped))
+        self.assertEqual(b'body{color:blue}', gzip.decompress(self.read('index.css.gz')))
+
+    def test_stale_siblings_removed(self):
+        self.run_processor()
+        os.remove(os.path.join(self.dest, 'index.css'))
+        self.assertEqual(1, self.run_processor().removed)
+        self.assertFalse(os.path.exists(os.path.join(self.dest, 'index.css.gz')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+from profiling import Profiler, PROFILER, profiled
+from block import markdown_to_html
+
+
+class TestProfiler(unittest.TestCase):
+    def test_stages_and_pages(self):
+        profiler = Profiler()
+        profiler.enable()
+        with profiler.page('a.md'):
+            with profiler.stage('read'):
+                pass
+            with profiler.stage('read'):
+                pass
+        with profiler.page('b.md'):
+            with profiler.stage('write'):
+                pass
+        report = profiler.report()
+        self.assertEqual(2, report['stages']['read']['calls'])
+        self.assertEqual(2, report['pages']['a.md']['stages']['read']['calls'])
+        self.assertNotIn('read', report['pages']['b.md']['stages'])
+        self.assertEqual(2, len(profiler.slowest_pages(5)))
+
+    def test_merge_worker_page(self):
+        worker = Profiler()
+        worker.enable()
+        with worker.page('a.md'):
+            with worker.stage('to_html'):
+                pass
+        parent = Profiler()
+        parent.merge_page('a.md', worker.pop_page('a.md'))
+        self.assertEqual(1, parent.stages['to_html'][0])
+        self.assertEqual({}, worker.pages)
+
+    def test_disabled_records_nothing(self):
+        @profiled('noop')
+        def noop():
+            return 1
+        self.assertEqual(1, noop())
+        self.assertFalse(PROFILER.enabled)
+        self.assertNotIn('noop', PROFILER.stages)
+
+    def test_global_profiler_counts_inline_calls(self):
+        PROFILER.enable()
+        try:
+            markdown_to_html('# title\n\ntext with **bold**')
+            self.assertEqual(2, PROFILER.stages['text_to_textnodes'][0])
+        finally:
+            PROFILER.enabled = False
+            PROFILER.stages.clear()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+from block import markdown_to_html
+from cache import RenderCache
+from renderer import Renderer, render_markdown
+
+
+class TestRenderer(unittest.TestCase):
+    def setUp(self):
+        self.markdowns = [f'# Doc {i}\n\nsome **bold** and a [link](/{i})\n\n- a\n- b' for i in range(20)]
+        self.expected = [markdown_to_html(markdown) for markdown in self.markdowns]
+
+    def test_outputs(self):
+        renderer = Renderer()
+        markdown = self.markdowns[0]
+        self.assertEqual(self.expected[0], renderer.render(markdown))
+        self.assertEqual(self.expected[0], renderer.render(markdown, 'node').to_html())
+        self.assertEqual(self.expected[0], ''.join(renderer.render(markdown, 'chunks')))
+        with self.assertRaises(ValueError):
+            render_markdown(markdown, 'pdf')
+
+    def test_render_many_serial(self):
+        self.assertEqual(self.expected, Renderer().render_many(iter(self.markdowns)))
+
+    def test_render_many_threads_share_cache(self):
+        cache = RenderCache()
+        with Renderer(cache, workers=4) as renderer:
+            self.assertEqual(self.expected, renderer.render_many(self.markdowns))
+            self.assertEqual(self.expected, renderer.render_many(self.markdowns * 2)[20:])
+        self.assertEqual((40, 20), cache.counts()['document'])
+
+    def test_render_many_processes(self):
+        with Renderer(RenderCache(), workers=2, executor='process') as renderer:
+            self.assertEqual(self.expected, renderer.render_many(self.markdowns))
+            nodes = renderer.render_many(self.markdowns, 'node')
+            self.assertEqual(self.expected, [node.to_html() for node in nodes])
+            chunks = renderer.render_many(self.markdowns, 'chunks')
+            self.assertEqual(self.expected, [''.join(chunk) for chunk in chunks])
+
+    def test_invalid_settings(self):
+        with self.assertRaises(ValueError):
+            Renderer(executor='fiber')
+        with self.assertRaises(ValueError):
+            Renderer().render_many(self.markdowns, 'pdf')
+
+
+if __name__ == '__main__':
+    unittest.main()
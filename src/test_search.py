@@ -0,0 +1,139 @@
+import os
+import json
+import tempfile
+import unittest
+from gen import generate_pages_recursive, generate_pages_parallel
+from manifest import BuildManifest
+from site_index import SiteIndex
+from build_fixture import BuildTestCase
+from search import SearchIndex, page_terms, add_terms, shard_name
+
+
+class TestPageTerms(unittest.TestCase):
+    def test_add_terms(self):
+        terms = {'tom': 1}
+        add_terms(terms, 'Old Tom Bombadil is a merry fellow, Tom!', 2)
+        self.assertEqual({'old': 2, 'tom': 5, 'bombadil': 2, 'merry': 2, 'fellow': 2}, terms)
+
+    def test_page_terms(self):
+        blocks = ['# Tom', '## River songs', 'Tom sings **loudly** by the [river](/river)', '```\nhidden code\n```']
+        terms = page_terms('Tom', blocks)
+        self.assertEqual({'tom': 14, 'river': 4, 'songs': 3, 'sings': 1, 'loudly': 1}, terms)
+
+    def test_shard_name(self):
+        self.assertEqual('to.json', shard_name('to'))
+        self.assertEqual('xc3a9c3a9.json', shard_name('éé'))
+
+
+class TestSearchIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dest = os.path.join(self.tmp.name, 'public')
+        self.state = os.path.join(self.tmp.name, 'cache', 'search.json')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read(self, name):
+        with open(os.path.join(self.dest, 'search', name), 'r') as f:
+            return json.load(f)
+
+    def test_shards(self):
+        index = SearchIndex(self.state, self.dest)
+        index.record('a.md', '/a.html', 'A', {'tom': 2, 'river': 1})
+        index.record('b.md', '/b.html', 'B', {'tom': 5, 'tree': 1})
+        index.write()
+        self.assertEqual({'tom': [1, 5, 0, 2]}, self.read('to.json'))
+        self.assertEqual({'river': [0, 1]}, self.read('ri.json'))
+        self.assertEqual({'0': ['/a.html', 'A'], '1': ['/b.html', 'B']}, self.read('docs.json'))
+        self.assertEqual(['ri', 'to', 'tr'], sorted(self.read('index.json')['shards']))
+
+    def test_basepath(self):
+        index = SearchIndex(self.state, self.dest, '/markdown_site_gen')
+        index.record('a.md', '/blog/tom/', 'Tom', {'tom': 2})
+        index.write()
+        index.save()
+        self.assertEqual({'0': ['/markdown_site_gen/blog/tom/', 'Tom']}, self.read('docs.json'))
+        # a build with another basepath rewrites docs.json though no page changed
+        index = SearchIndex(self.state, self.dest)
+        index.record('a.md', '/blog/tom/', 'Tom', {'tom': 2})
+        index.write()
+        self.assertEqual({'0': ['/blog/tom/', 'Tom']}, self.read('docs.json'))
+
+    def test_incremental_update(self):
+        index = SearchIndex(self.state, self.dest)
+        index.record('a.md', '/a.html', 'A', {'tom': 2, 'river': 1})
+        index.record('b.md', '/b.html', 'B', {'tree': 1})
+        index.write()
+        index.save()
+
+        index = SearchIndex(self.state, self.dest)
+        index.record('a.md', '/a.html', 'A', {'tom': 2, 'river': 1})
+        index.keep('b.md')
+        index.prune()
+        index.write()
+        self.assertEqual(0, index.written)
+
+        index = SearchIndex(self.state, self.dest)
+        index.record('a.md', '/a.html', 'A', {'tom': 2})
+        index.prune()
+        index.write()
+        # ri.json and tr.json lost their only terms, to.json kept its scores and isn't rewritten
+        self.assertFalse(os.path.exists(os.path.join(self.dest, 'search', 'ri.json')))
+        self.assertFalse(os.path.exists(os.path.join(self.dest, 'search', 'tr.json')))
+        self.assertEqual({'0': ['/a.html', 'A']}, self.read('docs.json'))
+        self.assertEqual(2, index.written)
+        self.assertEqual(['to'], list(self.read('index.json')['shards']))
+        index.save()
+
+        index = SearchIndex(self.state, self.dest)
+        index.record('a.md', '/a.html', 'A', {'tom': 3, 'willow': 1})
+        index.write()
+        self.assertEqual({'tom': [0, 3]}, self.read('to.json'))
+        self.assertEqual(['to', 'wi'], list(self.read('index.json')['shards']))
+        self.assertEqual(3, index.written)
+
+
+class TestSearchBuild(BuildTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write('index.md', '# Home\n\nWelcome to the river')
+        self.write(os.path.join('blog', 'tom.md'), '# Tom\n\nOld Tom sings by the river')
+        self.write(os.path.join('blog', 'draft.md'), '---\ndraft: true\n---\n# Secret\n\nhidden river')
+
+    # serial and parallel builds get their own cache, so neither skips pages of the other
+    def build(self, parallel=False):
+        cache = os.path.join(self.cache, 'parallel' if parallel else 'serial')
+        manifest = BuildManifest(os.path.join(cache, 'manifest.json'), self.template, '')
+        search = SearchIndex(os.path.join(cache, 'search.json'), self.dest)
+        site_index = SiteIndex(os.path.join(cache, 'site_index.json'), self.dest, search=search)
+        if parallel:
+            generate_pages_parallel(self.content, self.template, self.dest, '', 2, manifest, site_index=site_index)
+        else:
+            generate_pages_recursive(self.content, self.template, self.dest, '', manifest, site_index=site_index)
+        site_index.prune()
+        site_index.search.write()
+        site_index.search.save()
+        site_index.save()
+        manifest.save()
+        return site_index.search
+
+    def test_serial_and_parallel(self):
+        for parallel in (False, True):
+            search = self.build(parallel)
+            titles = {page['title']: page['terms'] for page in search.pages.values()}
+            self.assertEqual({'Home', 'Tom'}, set(titles))
+            self.assertEqual({'tom': 14, 'old': 1, 'sings': 1, 'river': 1}, titles['Tom'])
+
+    def test_incremental_build_keeps_pages(self):
+        self.build()
+        search = self.build()
+        self.assertEqual(0, search.written)
+        self.assertEqual(2, len(search.pages))
+        os.remove(os.path.join(self.content, 'index.md'))
+        search = self.build()
+        self.assertEqual(['/blog/tom.html'], [page['url'] for page in search.pages.values()])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import os
+import tempfile
+import unittest
+from gen import generate_pages_recursive, generate_pages_parallel
+from manifest import BuildManifest
+from build_fixture import BuildTestCase
+from site_index import SiteIndex, url_for, normalize_date
+
+
+class TestSiteIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dest = os.path.join(self.tmp.name, 'public')
+        self.path = os.path.join(self.tmp.name, 'cache', 'site_index.json')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_url_for(self):
+        self.assertEqual('/', url_for(os.path.join(self.dest, 'index.html'), self.dest))
+        self.assertEqual('/blog/tom/', url_for(os.path.join(self.dest, 'blog', 'tom', 'index.html'), self.dest))
+        self.assertEqual('/about.html', url_for(os.path.join(self.dest, 'about.html'), self.dest))
+
+    def test_normalize_date(self):
+        self.assertEqual('2024-03-01', normalize_date('2024-03-01T10:00:00'))
+        with self.assertRaises(ValueError):
+            normalize_date('yesterday')
+
+    def test_listings(self):
+        index = SiteIndex(self.path, self.dest)
+        index.record('a.md', os.path.join(self.dest, 'blog', 'a', 'index.html'), 'A',
+                     {'date': '2023-05-01', 'tags': 'lore, elves'})
+        index.record('b.md', os.path.join(self.dest, 'blog', 'b', 'index.html'), 'B',
+                     {'date': '2024-01-02', 'tags': ['lore'], 'slug': 'bee'})
+        index.record('c.md', os.path.join(self.dest, 'c.html'), 'C', {'draft': True})
+        index.record('d.md', os.path.join(self.dest, 'index.html'), 'D', {})
+        self.assertEqual(['B', 'A', 'D'], [entry['title'] for entry in index.entries()])
+        self.assertEqual(['bee', 'a', 'index'], [entry['slug'] for entry in index.entries()])
+        self.assertEqual({'elves': ['A'], 'lore': ['B', 'A']},
+                         {tag: [entry['title'] for entry in entries] for tag, entries in index.tags().items()})
+        self.assertEqual(['2024', '2023'], list(index.archive()))
+
+    def test_save_load_prune(self):
+        index = SiteIndex(self.path, self.dest)
+        index.record('a.md', os.path.join(self.dest, 'a.html'), 'A', {'tags': ['x']})
+        index.record('b.md', os.path.join(self.dest, 'b.html'), 'B', {})
+        index.save()
+        loaded = SiteIndex(self.path, self.dest)
+        self.assertEqual(index.pages, loaded.pages)
+        loaded.keep('a.md')
+        loaded.prune()
+        self.assertEqual(['a.md'], list(loaded.pages))
+
+
+class TestIndexedBuild(BuildTestCase):
+    def setUp(self):
+        super().setUp()
+        self.index_path = os.path.join(self.cache, 'site_index.json')
+        self.manifest_path = os.path.join(self.cache, 'manifest.json')
+        self.write('index.md', '# home\n\nhello')
+        self.write(os.path.join('blog', 'post.md'),
+                   '---\ntitle: Post title\ndate: 2024-02-03\ntags: [lore]\n---\n# post\n\ntext')
+        self.write(os.path.join('blog', 'draft.md'), '---\ndraft: true\n---\nno title yet')
+
+    def build(self, drafts=False, workers=1):
+        manifest = BuildManifest(self.manifest_path, self.template, '', drafts=drafts)
+        index = SiteIndex(self.index_path, self.dest, drafts)
+        if workers == 1:
+            generate_pages_recursive(self.content, self.template, self.dest, '', manifest, site_index=index)
+        else:
+            generate_pages_parallel(self.content, self.template, self.dest, '', workers, manifest, site_index=index)
+        manifest.prune()
+        manifest.save()
+        index.prune()
+        index.save()
+        return manifest, index
+
+    def test_front_matter_indexed_and_drafts_skipped(self):
+        for workers in (1, 2):
+            _, index = self.build(workers=workers)
+            self.assertEqual(['/blog/post.html', '/'], [entry['url'] for entry in index.entries()])
+            html = self.read('blog', 'post.html')
+            self.assertIn('<title>Post title</title>', html)
+            self.assertNotIn('tags', html)
+            self.assertFalse(os.path.exists(os.path.join(self.dest, 'blog', 'draft.html')))
+
+    def test_incremental_build_keeps_index(self):
+        self.build()
+        manifest, index = self.build()
+        self.assertEqual(0, manifest.rebuilt)
+        self.assertEqual(['Post title', 'home'], [entry['title'] for entry in index.entries()])
+
+    def test_lost_index_rebuilds_pages(self):
+        self.build()
+        os.remove(self.index_path)
+        manifest, index = self.build()
+        self.assertEqual(2, manifest.rebuilt)
+        self.assertEqual(2, len(index.entries()))
+
+    def test_drafts_included(self):
+        self.write(os.path.join('blog', 'draft.md'), '---\ndraft: true\n---\n# draft')
+        _, index = self.build(drafts=True)
+        self.assertEqual(3, len(index.entries()))
+        self.assertTrue(os.path.exists(os.path.join(self.dest, 'blog', 'draft.html')))
+
+    def test_drafts_switched_off(self):
+        self.write(os.path.join('blog', 'draft.md'), '---\ndraft: true\n---\n# draft')
+        for workers in (1, 2):
+            self.build(drafts=True, workers=workers)
+            manifest, index = self.build(workers=workers)
+            self.assertEqual(1, manifest.pruned)
+            self.assertEqual(2, len(index.entries()))
+            self.assertFalse(os.path.exists(os.path.join(self.dest, 'blog', 'draft.html')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import io
+import unittest
+from template import Template
+
+
+class TestTemplate(unittest.TestCase):
+    def test_render(self):
+        template = Template('<title>{{ Title }}</title><article>{{ Content }}</article>')
+        real_html = template.render(Title='hi', Content='<p>text</p>')
+        self.assertEqual('<title>hi</title><article><p>text</p></article>', real_html)
+
+    def test_repeated_and_extra_placeholders(self):
+        template = Template('{{ Title }}|{{ Date }}|{{ Title }}|{{ Missing }}')
+        real_html = template.render(Title='t', Date='2024-01-01', Unused='x')
+        self.assertEqual('t|2024-01-01|t|{{ Missing }}', real_html)
+
+    def test_basepath_same_as_replace(self):
+        html_template = '<link href="/index.css" /><title>{{ Title }}</title>{{ Content }}<img src="/a.png">'
+        content = '<a href="/blog">blog</a><img src="/images/tom.png" alt="tom">tom</img>'
+        expected_html = html_template.replace('{{ Title }}', 'title').replace('{{ Content }}', content)
+        expected_html = expected_html.replace('href="', 'href="/site').replace('src="', 'src="/site')
+        real_html = Template(html_template, '/site').render(Title='title', Content=content)
+        self.assertEqual(expected_html, real_html)
+
+    def test_render_to_streams_chunks(self):
+        template = Template('<title>{{ Title }}</title><link href="/index.css">{{ Content }}', '/site')
+        chunks = ['<p>', '<a href="/blog">blog</a>', '<img src="/a.png" alt="a">a</img>', '</p>']
+        f = io.StringIO()
+        template.render_to(f, Title='t', Content=iter(chunks))
+        self.assertEqual(template.render(Title='t', Content=''.join(chunks)), f.getvalue())
+
+    def test_assets_rewritten(self):
+        assets = {'/index.css': '/index.abc.css', '/images/tom.png': '/images/tom.def.png'}
+        template = Template('<link href="/index.css?v=2">{{ Content }}', '/site', assets)
+        content = '<img src="/images/tom.png" alt="tom">tom</img><a href="/images/other.png#top">other</a>'
+        expected_html = ('<link href="/site/index.abc.css?v=2"><img src="/site/images/tom.def.png" alt="tom">tom</img>'
+                         '<a href="/site/images/other.png#top">other</a>')
+        self.assertEqual(expected_html, template.render(Content=content))
+        f = io.StringIO()
+        template.render_to(f, Content=iter([content]))
+        self.assertEqual(expected_html, f.getvalue())
+
+    def test_srcset_candidates_rewritten(self):
+        template = Template('{{ Content }}', '/site', {'/a.png': '/a.1.png'})
+        content = '<img src="/a.png" srcset="/a.480w.webp 480w, /a.960w.webp 960w">a</img>'
+        expected_html = '<img src="/site/a.1.png" srcset="/site/a.480w.webp 480w, /site/a.960w.webp 960w">a</img>'
+        self.assertEqual(expected_html, template.render(Content=content))
+        self.assertIn('srcset="/site/a.480w.webp 480w, /site/a.960w.webp 960w"',
+                      Template('{{ Content }}', '/site').render(Content=content))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import os
+import unittest
+from gen import generate_pages_recursive
+from watch import SiteWatcher, diff_snapshots
+from build_fixture import BuildTestCase
+
+
+class TestDiffSnapshots(unittest.TestCase):
+    def test_changed_and_removed(self):
+        old = {'a': (1, 1), 'b': (1, 1), 'c': (1, 1)}
+        new = {'a': (1, 1), 'b': (2, 1), 'd': (1, 1)}
+        self.assertEqual((['b', 'd'], ['c']), diff_snapshots(old, new))
+
+
+class TestSiteWatcher(BuildTestCase):
+    def setUp(self):
+        super().setUp()
+        self.static = os.path.join(self.root, 'static')
+        os.makedirs(self.static)
+        self.write('index.md', '# home')
+        self.write(os.path.join('blog', 'post.md'), '# post')
+        generate_pages_recursive(self.content, self.template, self.dest, '')
+        self.watcher = SiteWatcher(self.content, self.static, self.template, self.dest, '')
+
+    def test_nothing_changed(self):
+        self.assertIsNone(self.watcher.poll())
+
+    def test_single_page_rebuilt(self):
+        self.write(os.path.join('blog', 'post.md'), '# edited post')
+        report = self.watcher.poll()
+        self.assertTrue(report.startswith('Rebuilt 1 pages'))
+        self.assertIn('edited post', self.read('blog', 'post.html'))
+        self.assertEqual(1, self.watcher.build_version)
+
+    def test_template_rebuilds_all(self):
+        self.write(self.template, '<h1>{{ Title }}</h1>')
+        self.assertTrue(self.watcher.poll().startswith('Rebuilt 2 pages'))
+        self.assertEqual('<h1>home</h1>', self.read('index.html'))
+
+    def test_static_and_removed_page(self):
+        self.write(os.path.join(self.static, 'index.css'), 'body {}')
+        os.remove(os.path.join(self.content, 'blog', 'post.md'))
+        self.watcher.poll()
+        self.assertEqual('body {}', self.read('index.css'))
+        self.assertFalse(os.path.exists(os.path.join(self.dest, 'blog', 'post.html')))
+
+
+if __name__ == '__main__':
+    unittest.main()
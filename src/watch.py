@@ -0,0 +1,195 @@
+import os
+import time
+import threading
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from gen import generate_page, dest_path_for
+from copy_dir import place_file
+from template import Template
+
+RELOAD_PATH = '/__reload'
+# polls the build version and reloads the page once it changes
+RELOAD_SCRIPT = b'''<script>
+(function () {
+  var version = null;
+  setInterval(function () {
+    fetch('/__reload').then(function (r) { return r.text(); }).then(function (v) {
+      if (version !== null && v !== version) { location.reload(); }
+      version = v;
+    }).catch(function () {});
+  }, 1000);
+})();
+</script>
+'''
+
+
+def snapshot(path):
+    # {file path: (mtime, size)} for a single file or every file under a dir
+    files = {}
+    if os.path.isfile(path):
+        stat = os.stat(path)
+        files[path] = (stat.st_mtime_ns, stat.st_size)
+        return files
+    for dir_path, _, file_names in os.walk(path):
+        for file in file_names:
+            file_path = os.path.join(dir_path, file)
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                continue
+            files[file_path] = (stat.st_mtime_ns, stat.st_size)
+    return files
+
+
+def diff_snapshots(old, new):
+    changed = sorted(path for path, stat in new.items() if old.get(path) != stat)
+    removed = sorted(path for path in old if path not in new)
+    return changed, removed
+
+
+class SiteWatcher:
+    # polls content/, static/ and the template and rebuilds only what a change affects
+    def __init__(self, content_dir, static_dir, template_path, dest_dir, basepath, manifest=None, site_index=None,
+                 listings=None):
+        self.content_dir = content_dir
+        self.static_dir = static_dir
+        self.template_path = template_path
+        self.dest_dir = dest_dir
+        self.basepath = basepath
+        self.manifest = manifest
+        self.site_index = site_index
+        # listings are regenerated from site_index, so they need one
+        self.listings = listings if site_index is not None else None
+        self.template = Template.from_file(template_path, basepath)
+        self.build_version = 0
+        self.snapshots = self.scan()
+
+    def scan(self):
+        return {
+            'content': snapshot(self.content_dir),
+            'static': snapshot(self.static_dir),
+            'template': snapshot(self.template_path),
+        }
+
+    def rebuild_pages(self, from_paths):
+        rebuilt = 0
+        for from_path in from_paths:
+            dest_path = dest_path_for(from_path, self.content_dir, self.dest_dir)
+            try:
+                generate_page(from_path, self.template_path, dest_path, self.basepath, self.manifest, self.template,
+                              site_index=self.site_index)
+                rebuilt += 1
+            except ValueError as e:
+                # a half written page shouldn't stop the watcher
+                print(f'Failed to generate page from {from_path}: {e}')
+        return rebuilt
+
+    def remove_pages(self, from_paths):
+        for from_path in from_paths:
+            dest_path = dest_path_for(from_path, self.content_dir, self.dest_dir)
+            if os.path.exists(dest_path):
+                os.remove(dest_path)
+            if self.manifest is not None:
+                self.manifest.pages.pop(from_path, None)
+            if self.site_index is not None:
+                self.site_index.remove(from_path)
+
+    def sync_static(self, changed, removed):
+        for source_file in changed:
+            destination_file = os.path.join(self.dest_dir, os.path.relpath(source_file, self.static_dir))
+            os.makedirs(os.path.dirname(destination_file), exist_ok=True)
+            place_file(source_file, destination_file)
+        for source_file in removed:
+            destination_file = os.path.join(self.dest_dir, os.path.relpath(source_file, self.static_dir))
+            if os.path.exists(destination_file):
+                os.remove(destination_file)
+
+    # checks for changes once, returns a short report of what was rebuilt or None when nothing changed
+    def poll(self):
+        start = time.perf_counter()
+        snapshots = self.scan()
+        content_changed, content_removed = diff_snapshots(self.snapshots['content'], snapshots['content'])
+        static_changed, static_removed = diff_snapshots(self.snapshots['static'], snapshots['static'])
+        template_changed, _ = diff_snapshots(self.snapshots['template'], snapshots['template'])
+        self.snapshots = snapshots
+        if not (content_changed or content_removed or static_changed or static_removed or template_changed):
+            return None
+
+        if template_changed:
+            # every page depends on the template
+            self.template = Template.from_file(self.template_path, self.basepath)
+            if self.listings is not None:
+                self.listings.template = self.template
+            if self.manifest is not None:
+                self.manifest.update_template(self.template_path)
+            content_changed = sorted(snapshots['content'])
+        rebuilt = self.rebuild_pages(content_changed)
+        self.remove_pages(content_removed)
+        self.sync_static(static_changed, static_removed)
+        if self.manifest is not None:
+            self.manifest.save()
+        if self.site_index is not None:
+            self.site_index.save()
+            if self.site_index.search is not None:
+                # only shards holding terms of the changed pages are rewritten
+                self.site_index.search.write()
+                self.site_index.search.save()
+        if self.listings is not None:
+            # only listing pages the change affects are rewritten
+            self.listings.generate(self.site_index)
+
+        self.build_version += 1
+        elapsed = time.perf_counter() - start
+        return (f'Rebuilt {rebuilt} pages, removed {len(content_removed)}, '
+                f'synced {len(static_changed) + len(static_removed)} static files in {elapsed * 1000:.0f} ms')
+
+    def run(self, interval=0.5):
+        while True:
+            report = self.poll()
+            if report:
+                print(report)
+            time.sleep(interval)
+
+
+class LiveReloadHandler(SimpleHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == RELOAD_PATH:
+            body = str(self.server.watcher.build_version).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('Cache-Control', 'no-store')
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        path = self.translate_path(self.path)
+        if os.path.isdir(path) and self.path.split('?', 1)[0].endswith('/'):
+            path = os.path.join(path, 'index.html')
+        if not (path.endswith('.html') and os.path.isfile(path)):
+            super().do_GET()
+            return
+
+        # pages get the reload script, files on disk stay as they are
+        with open(path, 'rb') as f:
+            body = f.read()
+        body = body.replace(b'</body>', RELOAD_SCRIPT + b'</body>', 1)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(watcher, port=8888):
+    handler = partial(LiveReloadHandler, directory=watcher.dest_dir)
+    server = ThreadingHTTPServer(('', port), handler)
+    server.watcher = watcher
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    print(f'Serving {watcher.dest_dir} at http://localhost:{port}/')
+    return server